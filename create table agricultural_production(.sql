@@ -1,6 +1,41 @@
-CREATE TABLE agricultural_production (
-    id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+-- Product dimension: one row per product, referenced by integer key.
+-- search_key is the case-folded name (db.product_search_key), so spellings
+-- differing only in case or spacing are the same product.
+CREATE TABLE products (
+    product_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
     product_name VARCHAR2(100) NOT NULL,
+    search_key VARCHAR2(100) NOT NULL,
+
+    CONSTRAINT uq_products_search_key UNIQUE (search_key)
+);
+
+-- Existing databases, where agricultural_production is still the original
+-- table with the product name in every row: after creating products, run the
+-- steps below instead of CREATE TABLE agricultural_production_base, then
+-- continue from the view. The key expression matches db.product_search_key
+-- (whitespace collapsed, upper case).
+--     ALTER TABLE agricultural_production RENAME TO agricultural_production_base;
+--     INSERT INTO products (product_name, search_key)
+--     SELECT MIN(TRIM(REGEXP_REPLACE(product_name, '[[:space:]]+', ' '))),
+--            UPPER(TRIM(REGEXP_REPLACE(product_name, '[[:space:]]+', ' ')))
+--       FROM agricultural_production_base
+--      GROUP BY UPPER(TRIM(REGEXP_REPLACE(product_name, '[[:space:]]+', ' ')));
+--     ALTER TABLE agricultural_production_base ADD product_id NUMBER;
+--     UPDATE agricultural_production_base f
+--        SET product_id = (SELECT p.product_id FROM products p
+--                           WHERE p.search_key = UPPER(TRIM(REGEXP_REPLACE(
+--                                 f.product_name, '[[:space:]]+', ' '))));
+--     ALTER TABLE agricultural_production_base MODIFY product_id NOT NULL;
+--     ALTER TABLE agricultural_production_base ADD CONSTRAINT fk_agri_prod_product
+--         FOREIGN KEY (product_id) REFERENCES products (product_id);
+--     ALTER TABLE agricultural_production_base DROP COLUMN product_name;
+--     ALTER TABLE agricultural_production_base
+--         MODIFY updated_at TIMESTAMP DEFAULT SYSTIMESTAMP;
+--     ALTER TABLE agricultural_production_base
+--         ADD farm_id VARCHAR2(30) DEFAULT 'default' NOT NULL;
+CREATE TABLE agricultural_production_base (
+    id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    product_id NUMBER NOT NULL,
     quantity NUMBER(10,2) NOT NULL,
     sale_price NUMBER(10,2) DEFAULT 0,
     cost_price NUMBER(10,2) DEFAULT 0,
@@ -8,9 +43,303 @@ CREATE TABLE agricultural_production (
     harvest_date DATE,
     production_status VARCHAR2(20) DEFAULT 'PLANTED',
     created_at DATE DEFAULT SYSDATE,
-    updated_at DATE DEFAULT SYSDATE,
+    -- Optimistic concurrency token (db.py compares it on update/delete): a
+    -- TIMESTAMP so two writes within the same second still differ
+    updated_at TIMESTAMP DEFAULT SYSTIMESTAMP,
+    -- Owning farm; db.FARM_SHARDS maps each farm to the database holding it
+    farm_id VARCHAR2(30) DEFAULT 'default' NOT NULL,
     
+    CONSTRAINT fk_agri_prod_product FOREIGN KEY (product_id) REFERENCES products (product_id),
     CONSTRAINT chk_quantity_positive CHECK (quantity > 0),
     CONSTRAINT chk_prices_non_negative CHECK (sale_price >= 0 AND cost_price >= 0),
     CONSTRAINT chk_production_status CHECK (production_status IN ('PLANTED', 'HARVESTED', 'SOLD'))
-);
\ No newline at end of file
+);
+
+-- Reads keep the original record shape (with product_name); writes go to the
+-- base table through db.py
+CREATE OR REPLACE VIEW agricultural_production AS
+SELECT f.id, p.product_name, f.quantity, f.sale_price, f.cost_price,
+       f.planting_date, f.harvest_date, f.production_status,
+       f.created_at, f.updated_at, f.farm_id, f.product_id
+FROM agricultural_production_base f
+JOIN products p ON p.product_id = f.product_id;
+
+CREATE INDEX idx_agri_prod_product ON agricultural_production_base (product_id);
+
+-- Keyset pagination: newest first on (created_at, id)
+CREATE INDEX idx_agri_prod_created ON agricultural_production_base (created_at DESC, id DESC);
+CREATE INDEX idx_agri_prod_farm ON agricultural_production_base (farm_id, created_at);
+
+-- Range search: status-first composites for the common "closed in period" questions
+CREATE INDEX idx_agri_prod_status_harvest ON agricultural_production_base (production_status, harvest_date, quantity);
+CREATE INDEX idx_agri_prod_status_planting ON agricultural_production_base (production_status, planting_date);
+CREATE INDEX idx_agri_prod_harvest_prices ON agricultural_production_base (harvest_date, cost_price, sale_price);
+
+-- Derived ROI; the expression must match db.ROI_SQL exactly
+CREATE INDEX idx_agri_prod_roi ON agricultural_production_base (
+    CASE WHEN cost_price > 0 AND sale_price > 0 THEN (sale_price - cost_price) / cost_price * 100 ELSE 0 END
+);
+
+-- Rollup cube: sums and counts per (product, harvest year-month, status).
+-- Records without harvest date are kept under year_month 'N/A'.
+CREATE TABLE production_rollup (
+    product_name VARCHAR2(100) NOT NULL,
+    year_month VARCHAR2(7) NOT NULL,
+    production_status VARCHAR2(20) NOT NULL,
+    production_count NUMBER DEFAULT 0 NOT NULL,
+    total_quantity NUMBER DEFAULT 0 NOT NULL,
+    total_cost NUMBER DEFAULT 0 NOT NULL,
+    total_revenue NUMBER DEFAULT 0 NOT NULL,
+    growth_days_total NUMBER DEFAULT 0 NOT NULL,
+    growth_days_count NUMBER DEFAULT 0 NOT NULL,
+
+    CONSTRAINT pk_production_rollup PRIMARY KEY (product_name, year_month, production_status)
+);
+
+CREATE OR REPLACE PROCEDURE production_rollup_apply (
+    p_product_name IN VARCHAR2,
+    p_harvest_date IN DATE,
+    p_planting_date IN DATE,
+    p_status IN VARCHAR2,
+    p_sign IN NUMBER,
+    p_quantity IN NUMBER,
+    p_cost IN NUMBER,
+    p_revenue IN NUMBER
+) AS
+    v_year_month VARCHAR2(7) := NVL(TO_CHAR(p_harvest_date, 'YYYY-MM'), 'N/A');
+    v_growth_days NUMBER := CASE
+        WHEN p_harvest_date - p_planting_date > 0 THEN p_harvest_date - p_planting_date
+        ELSE 0
+    END;
+BEGIN
+    BEGIN
+        MERGE INTO production_rollup r
+        USING (SELECT p_product_name AS product_name, v_year_month AS year_month,
+                      p_status AS production_status FROM dual) k
+           ON (r.product_name = k.product_name
+               AND r.year_month = k.year_month
+               AND r.production_status = k.production_status)
+        WHEN MATCHED THEN UPDATE SET
+            r.production_count = r.production_count + p_sign,
+            r.total_quantity = r.total_quantity + p_sign * p_quantity,
+            r.total_cost = r.total_cost + p_sign * NVL(p_cost, 0),
+            r.total_revenue = r.total_revenue + p_sign * NVL(p_revenue, 0),
+            r.growth_days_total = r.growth_days_total + p_sign * v_growth_days,
+            r.growth_days_count = r.growth_days_count
+                + CASE WHEN v_growth_days > 0 THEN p_sign ELSE 0 END
+        WHEN NOT MATCHED THEN INSERT (
+            product_name, year_month, production_status, production_count,
+            total_quantity, total_cost, total_revenue, growth_days_total, growth_days_count
+        ) VALUES (
+            k.product_name, k.year_month, k.production_status, p_sign,
+            p_sign * p_quantity, p_sign * NVL(p_cost, 0), p_sign * NVL(p_revenue, 0),
+            p_sign * v_growth_days, CASE WHEN v_growth_days > 0 THEN p_sign ELSE 0 END
+        );
+    EXCEPTION
+        -- Two first writes to the same cell: both MERGEs see no row, the
+        -- second INSERT waits for the first commit and fails. The row exists
+        -- now, so apply the delta to it.
+        WHEN DUP_VAL_ON_INDEX THEN
+            UPDATE production_rollup r SET
+                r.production_count = r.production_count + p_sign,
+                r.total_quantity = r.total_quantity + p_sign * p_quantity,
+                r.total_cost = r.total_cost + p_sign * NVL(p_cost, 0),
+                r.total_revenue = r.total_revenue + p_sign * NVL(p_revenue, 0),
+                r.growth_days_total = r.growth_days_total + p_sign * v_growth_days,
+                r.growth_days_count = r.growth_days_count
+                    + CASE WHEN v_growth_days > 0 THEN p_sign ELSE 0 END
+             WHERE r.product_name = p_product_name
+               AND r.year_month = v_year_month
+               AND r.production_status = p_status;
+    END;
+
+    DELETE FROM production_rollup
+     WHERE product_name = p_product_name
+       AND year_month = v_year_month
+       AND production_status = p_status
+       AND production_count = 0;
+END;
+/
+
+-- Canonical name of a product (NULL for a NULL key)
+CREATE OR REPLACE FUNCTION product_name_of (p_product_id IN NUMBER)
+RETURN VARCHAR2 RESULT_CACHE AS
+    v_product_name products.product_name%TYPE;
+BEGIN
+    IF p_product_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+    SELECT product_name INTO v_product_name FROM products WHERE product_id = p_product_id;
+    RETURN v_product_name;
+END;
+/
+
+-- Keeps the cube in step with every write, in the writer's transaction
+CREATE OR REPLACE TRIGGER trg_agri_prod_rollup
+AFTER INSERT OR UPDATE OR DELETE ON agricultural_production_base
+FOR EACH ROW
+BEGIN
+    -- Archiving moves rows between tables; the cube keeps counting them
+    IF SYS_CONTEXT('CLIENTCONTEXT', 'production_archiving') = 'Y' THEN
+        RETURN;
+    END IF;
+    IF DELETING OR UPDATING THEN
+        production_rollup_apply(product_name_of(:OLD.product_id), :OLD.harvest_date, :OLD.planting_date,
+                                :OLD.production_status, -1, :OLD.quantity,
+                                :OLD.cost_price, :OLD.sale_price);
+    END IF;
+    IF INSERTING OR UPDATING THEN
+        production_rollup_apply(product_name_of(:NEW.product_id), :NEW.harvest_date, :NEW.planting_date,
+                                :NEW.production_status, 1, :NEW.quantity,
+                                :NEW.cost_price, :NEW.sale_price);
+    END IF;
+END;
+/
+
+-- Initial load (rollup.rebuild_rollup() does the same on demand)
+INSERT INTO production_rollup
+SELECT product_name,
+       NVL(TO_CHAR(harvest_date, 'YYYY-MM'), 'N/A'),
+       production_status,
+       COUNT(*),
+       SUM(quantity),
+       SUM(NVL(cost_price, 0)),
+       SUM(NVL(sale_price, 0)),
+       SUM(CASE WHEN harvest_date - planting_date > 0 THEN harvest_date - planting_date ELSE 0 END),
+       SUM(CASE WHEN harvest_date - planting_date > 0 THEN 1 ELSE 0 END)
+FROM agricultural_production
+GROUP BY product_name, NVL(TO_CHAR(harvest_date, 'YYYY-MM'), 'N/A'), production_status;
+COMMIT;
+
+-- Approximate analytics: serialized sketches (HyperLogLog, count-min, reservoir)
+CREATE TABLE production_sketches (
+    sketch_name VARCHAR2(50) PRIMARY KEY,
+    payload CLOB NOT NULL,
+    updated_at DATE DEFAULT SYSDATE
+);
+
+-- The row always exists so writers can lock it with SELECT ... FOR UPDATE
+INSERT INTO production_sketches (sketch_name, payload) VALUES ('production', '{}');
+COMMIT;
+
+-- Data version: change counter bumped by every write function in db.py
+CREATE TABLE production_data_version (
+    id NUMBER DEFAULT 1 PRIMARY KEY,
+    change_counter NUMBER DEFAULT 0 NOT NULL,
+
+    CONSTRAINT chk_data_version_single_row CHECK (id = 1)
+);
+INSERT INTO production_data_version (id, change_counter) VALUES (1, 0);
+COMMIT;
+
+-- Keeps MAX(updated_at) of the data version fingerprint an index lookup
+CREATE INDEX idx_agri_prod_updated ON agricultural_production_base (updated_at);
+
+-- Change feed: append-only log of every write, in the writer's transaction.
+-- change_id comes from a sequence, so it grows monotonically; consumers tail
+-- it from a checkpoint (see change_feed.py).
+CREATE SEQUENCE production_change_seq;
+
+CREATE TABLE production_changes (
+    change_id NUMBER PRIMARY KEY,
+    operation VARCHAR2(6) NOT NULL,
+    record_id NUMBER NOT NULL,
+    changed_at TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL,
+    old_product_name VARCHAR2(100),
+    old_quantity NUMBER(10,2),
+    old_sale_price NUMBER(10,2),
+    old_cost_price NUMBER(10,2),
+    old_planting_date DATE,
+    old_harvest_date DATE,
+    old_production_status VARCHAR2(20),
+    new_product_name VARCHAR2(100),
+    new_quantity NUMBER(10,2),
+    new_sale_price NUMBER(10,2),
+    new_cost_price NUMBER(10,2),
+    new_planting_date DATE,
+    new_harvest_date DATE,
+    new_production_status VARCHAR2(20),
+
+    CONSTRAINT chk_change_operation CHECK (operation IN ('INSERT', 'UPDATE', 'DELETE'))
+);
+
+-- Last change_id processed by each subscriber
+CREATE TABLE production_change_checkpoints (
+    subscriber_name VARCHAR2(50) PRIMARY KEY,
+    last_change_id NUMBER DEFAULT 0 NOT NULL,
+    updated_at DATE DEFAULT SYSDATE
+);
+
+CREATE OR REPLACE TRIGGER trg_agri_prod_changes
+AFTER INSERT OR UPDATE OR DELETE ON agricultural_production_base
+FOR EACH ROW
+BEGIN
+    -- Archiving is not a logical change of the data
+    IF SYS_CONTEXT('CLIENTCONTEXT', 'production_archiving') = 'Y' THEN
+        RETURN;
+    END IF;
+    INSERT INTO production_changes (
+        change_id, operation, record_id,
+        old_product_name, old_quantity, old_sale_price, old_cost_price,
+        old_planting_date, old_harvest_date, old_production_status,
+        new_product_name, new_quantity, new_sale_price, new_cost_price,
+        new_planting_date, new_harvest_date, new_production_status
+    ) VALUES (
+        production_change_seq.NEXTVAL,
+        CASE WHEN INSERTING THEN 'INSERT' WHEN UPDATING THEN 'UPDATE' ELSE 'DELETE' END,
+        NVL(:NEW.id, :OLD.id),
+        product_name_of(:OLD.product_id), :OLD.quantity, :OLD.sale_price, :OLD.cost_price,
+        :OLD.planting_date, :OLD.harvest_date, :OLD.production_status,
+        product_name_of(:NEW.product_id), :NEW.quantity, :NEW.sale_price, :NEW.cost_price,
+        :NEW.planting_date, :NEW.harvest_date, :NEW.production_status
+    );
+END;
+/
+
+-- Hot/cold tiering: SOLD records harvested before the cutoff are moved here
+-- by archive.py. Same columns as agricultural_production, ids preserved; the
+-- product name is copied as it was when archived (cold rows never change).
+CREATE TABLE agricultural_production_archive (
+    id NUMBER PRIMARY KEY,
+    -- Product key, so reports group archived rows with the hot ones even
+    -- after a rename. Existing databases:
+    --     ALTER TABLE agricultural_production_archive ADD product_id NUMBER;
+    --     UPDATE agricultural_production_archive a
+    --        SET product_id = (SELECT p.product_id FROM products p
+    --                           WHERE p.search_key = UPPER(TRIM(REGEXP_REPLACE(
+    --                                 a.product_name, '[[:space:]]+', ' '))));
+    product_id NUMBER,
+    product_name VARCHAR2(100) NOT NULL,
+    quantity NUMBER(10,2) NOT NULL,
+    sale_price NUMBER(10,2),
+    cost_price NUMBER(10,2),
+    planting_date DATE,
+    harvest_date DATE,
+    production_status VARCHAR2(20),
+    created_at DATE,
+    updated_at TIMESTAMP,
+    farm_id VARCHAR2(30) DEFAULT 'default' NOT NULL,
+    archived_at DATE DEFAULT SYSDATE
+);
+
+CREATE INDEX idx_agri_archive_harvest ON agricultural_production_archive (harvest_date, product_name);
+
+-- Every archived row has harvest_date < archive_horizon (NULL: nothing archived)
+CREATE TABLE production_archive_state (
+    id NUMBER DEFAULT 1 PRIMARY KEY,
+    archive_horizon DATE,
+    archived_rows NUMBER DEFAULT 0 NOT NULL,
+    last_run_at DATE,
+
+    CONSTRAINT chk_archive_state_single_row CHECK (id = 1)
+);
+INSERT INTO production_archive_state (id) VALUES (1);
+COMMIT;
+
+-- Idempotency keys of the local write journal entries already applied, so a
+-- batch retried after a lost commit acknowledgement is not applied twice
+CREATE TABLE production_journal_applied (
+    idempotency_key VARCHAR2(36) PRIMARY KEY,
+    operation VARCHAR2(10) NOT NULL,
+    applied_at DATE DEFAULT SYSDATE NOT NULL
+);
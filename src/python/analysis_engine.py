@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Motor map-reduce da análise quantitativa (opção 7 do app)
+
+A tabela é dividida em faixas de id; cada faixa é lida em fluxo por um
+processo com a sua própria conexão e resumida em um agregado parcial
+combinável (map). Os parciais são combinados (reduce) em um resultado igual
+ao de uma única passada sobre todos os registros.
+
+Os estados por produto não viajam em dicionários: cada parcial os grava em
+arquivos de partição (spill_aggregate.write_partitions) e finish_analysis os
+combina partição a partição, reduzindo cada produto na hora a uma linha de
+estatísticas e aos candidatos dos rankings.
+"""
+
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import get_context
+from typing import Callable, Dict, Iterable, List
+import db
+import ranking
+import spill_aggregate
+import stream_stats
+
+
+# Abaixo deste número de registros, processos extras custam mais do que rendem
+PARALLEL_MIN_ROWS = 50000
+PARTITIONS_PER_WORKER = 4
+# Produtos acumulados antes de atualizar os candidatos dos rankings
+RANKING_BATCH = 1000
+TOP_PRODUCTS = 5
+
+
+def empty_partial() -> Dict:
+    """Agregado parcial vazio"""
+    return {
+        "row_count": 0,
+        "total_investment": 0,
+        "total_revenue": 0,
+        "status_count": {},
+        "statistics": stream_stats.ProductionStatistics(),
+        # Arquivos de partição dos estados por produto, um conjunto por map
+        "product_parts": [],
+    }
+
+
+def _new_product_group(product_id: int) -> Dict:
+    """Estado inicial de um produto: totais e acumuladores estatísticos"""
+    return {
+        "totals": {
+            "product_name": None,
+            "quantity": 0,
+            "investment": 0,
+            "revenue": 0,
+            "production_count": 0,
+        },
+        "statistics": stream_stats.ProductionStatistics(),
+    }
+
+
+def _update_product_group(group: Dict, record: Dict):
+    """Inclui um registro no estado do seu produto"""
+    stats = group["totals"]
+    stats["product_name"] = record["product_name"]
+    stats["quantity"] += record["quantity"]
+    stats["investment"] += record["cost_price"]
+    stats["revenue"] += record["sale_price"] or 0
+    stats["production_count"] += 1
+    group["statistics"].add(record)
+
+
+def _merge_product_groups(group: Dict, other: Dict) -> Dict:
+    """Combina dois estados parciais do mesmo produto"""
+    for key in ("quantity", "investment", "revenue", "production_count"):
+        group["totals"][key] += other["totals"][key]
+    group["statistics"].merge(other["statistics"])
+    return group
+
+
+def map_rows(
+    rows: Iterable[Dict],
+    directory: str,
+    max_bytes: int = spill_aggregate.MAX_BYTES_IN_MEMORY,
+    identity: Callable = db.product_identity,
+) -> Dict:
+    """
+    Resume um fluxo de registros em um agregado parcial (uma passada)
+
+    Os registros são agrupados pela chave inteira product_id. Ao gravar as
+    partições, cada produto passa a ser identificado por identity, que vale
+    entre shards, e recebe o seu nome atual.
+
+    Args:
+        rows: Registros de uma partição (de um único shard)
+        directory: Onde gravar as partições dos estados por produto
+        max_bytes: Orçamento dos estados por produto em memória durante a
+            leitura; acima dele transbordam para disco (spill_aggregate)
+        identity: (product_id, nome) -> (chave entre shards, nome); o padrão
+            consulta a dimensão de produtos do shard atual
+
+    Returns:
+        Dict: Agregado parcial (ver empty_partial)
+    """
+    partial = empty_partial()
+    status_count = partial["status_count"]
+
+    with spill_aggregate.SpillingAggregator(
+        key=lambda record: record["product_id"],
+        create=_new_product_group,
+        update=_update_product_group,
+        merge=_merge_product_groups,
+        max_bytes=max_bytes,
+    ) as groups:
+        for record in rows:
+            partial["row_count"] += 1
+            partial["total_investment"] += record["cost_price"]
+            if record["sale_price"]:
+                partial["total_revenue"] += record["sale_price"]
+
+            status = record["production_status"]
+            status_count[status] = status_count.get(status, 0) + 1
+
+            groups.add(record)
+            partial["statistics"].add(record)
+
+        def identified_groups():
+            for product_id, group in groups.results():
+                key, group["totals"]["product_name"] = identity(
+                    product_id, group["totals"]["product_name"]
+                )
+                yield key, group
+
+        # Direto das partições para os arquivos, sem voltar a um dicionário
+        partial["product_parts"].append(
+            spill_aggregate.write_partitions(identified_groups(), directory)
+        )
+
+    return partial
+
+
+def merge_partials(partials: Iterable[Dict]) -> Dict:
+    """
+    Combina agregados parciais (reduce)
+
+    Os estados por produto continuam em disco: só as listas de arquivos são
+    reunidas, e finish_analysis os combina.
+
+    Args:
+        partials: Resultados de map_rows
+
+    Returns:
+        Dict: Agregado combinado
+    """
+    merged = empty_partial()
+
+    for partial in partials:
+        merged["row_count"] += partial["row_count"]
+        merged["total_investment"] += partial["total_investment"]
+        merged["total_revenue"] += partial["total_revenue"]
+
+        for status, count in partial["status_count"].items():
+            merged["status_count"][status] = merged["status_count"].get(status, 0) + count
+
+        merged["statistics"].merge(partial["statistics"])
+        merged["product_parts"].extend(partial["product_parts"])
+
+    return merged
+
+
+def finish_analysis(
+    partial: Dict, max_bytes: int = spill_aggregate.MAX_BYTES_IN_MEMORY
+) -> Dict:
+    """
+    Combina os produtos de um agregado e monta o resultado da análise
+
+    Args:
+        partial: Agregado de map_rows ou merge_partials
+        max_bytes: Orçamento de cada partição durante a combinação
+
+    Returns:
+        Dict: row_count, total_investment, total_revenue, status_count, os
+        rankings 'top_roi' e 'top_efficiency' e 'statistics_rows' (formato
+        de stream_stats.statistics_rows)
+    """
+    result = {
+        key: partial[key]
+        for key in ("row_count", "total_investment", "total_revenue", "status_count")
+    }
+    top_roi, top_efficiency, batch, rows = [], [], [], []
+
+    def update_rankings():
+        nonlocal top_roi, top_efficiency, batch
+        top_roi = ranking.rank_product_aggregates(
+            top_roi + batch, "roi", TOP_PRODUCTS
+        )
+        top_efficiency = ranking.rank_product_aggregates(
+            top_efficiency + batch, "efficiency", TOP_PRODUCTS
+        )
+        batch = []
+
+    for _, group in spill_aggregate.merge_partitions(
+        partial["product_parts"], _merge_product_groups, max_bytes
+    ):
+        name = group["totals"]["product_name"]
+        rows.append({"product_name": name, **group["statistics"].summary()})
+        batch.append(group["totals"])
+        if len(batch) >= RANKING_BATCH:
+            update_rankings()
+    update_rankings()
+
+    rows.sort(key=lambda row: row["product_name"])
+    rows.append({"product_name": "TOTAL", **partial["statistics"].summary()})
+
+    result["top_roi"] = top_roi
+    result["top_efficiency"] = top_efficiency
+    result["statistics_rows"] = rows
+    return result
+
+
+def _id_bounds() -> tuple:
+    """Menor id, maior id e total de registros"""
+    connection = db.get_connection()
+    if not connection:
+        raise ConnectionError("Could not connect to the database")
+
+    try:
+        cursor = connection.cursor()
+        return db.fetchone_statement(cursor, "id_bounds")
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def partition_ids(min_id: int, max_id: int, partitions: int) -> List[tuple]:
+    """
+    Divide [min_id, max_id] em faixas contíguas de tamanho semelhante
+
+    Returns:
+        List[tuple]: Faixas (início, fim) inclusivas
+    """
+    span = max_id - min_id + 1
+    size = max(1, -(-span // partitions))
+    return [
+        (low, min(low + size - 1, max_id)) for low in range(min_id, max_id + 1, size)
+    ]
+
+
+def _analyze_partition(
+    bounds: tuple, shard: str = db.DEFAULT_SHARD, directory: str = None
+) -> Dict:
+    """Executado em cada processo: lê a faixa de ids do shard e devolve o parcial"""
+    with db.use_shard(shard):
+        return map_rows(db.stream_agricultural_production({"id": bounds}), directory)
+
+
+def _analyze_shard(workers: int, directory: str) -> Dict:
+    """Agregado parcial do shard atual (db.use_shard)"""
+    min_id, max_id, row_count = _id_bounds()
+
+    if not row_count:
+        return empty_partial()
+    if workers == 1 or row_count < PARALLEL_MIN_ROWS:
+        return map_rows(db.stream_agricultural_production(), directory)
+
+    ranges = partition_ids(min_id, max_id, workers * PARTITIONS_PER_WORKER)
+    # "spawn": cada processo abre o seu próprio pool de conexões
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=get_context("spawn")
+    ) as executor:
+        return merge_partials(
+            executor.map(
+                _analyze_partition,
+                ranges,
+                repeat(db.current_shard()),
+                repeat(directory),
+            )
+        )
+
+
+def run_analysis(workers: int = None) -> Dict:
+    """
+    Executa a análise sobre toda a tabela, em paralelo quando compensa
+
+    Com mais de um shard (db.SHARDS), cada banco é resumido ao mesmo tempo
+    (scatter-gather) e os parciais são combinados como os das faixas de id.
+
+    Args:
+        workers: Número de processos por shard (padrão: número de CPUs)
+
+    Returns:
+        Dict: Resultado de finish_analysis
+
+    Raises:
+        Exception: Erros de conexão ou leitura de qualquer shard
+    """
+    workers = workers or os.cpu_count() or 1
+    # Partições de todos os parciais; removidas também quando algo falha
+    directory = tempfile.mkdtemp(prefix="analysis_")
+    try:
+        partials = db.scatter_gather(_analyze_shard, workers, directory)
+        return finish_analysis(merge_partials(partials.values()))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -4,9 +4,16 @@ Sistema de Gestão de Produção Agrícola
 Interface CLI para cadastro e consulta de dados de produção
 """
 
+import signal
 import sys
 from datetime import datetime
+import analysis_engine
 import db
+import profiling
+import report_cache
+import rollup
+import sketches
+import write_journal
 
 
 def print_menu():
@@ -21,8 +28,13 @@ def print_menu():
     print("5. 🗑️  Deletar produção")
     print("6. 📊 Exportar dados para CSV")
     print("7. 📈 Gerar relatórios")
+    print("8. 🔎 Busca avançada por faixas")
+    print("9. ⚡ Relatório aproximado (rápido)")
     print("0. 🚪 Sair")
     print("=" * 50)
+    pending = write_journal.backlog_size()
+    if pending:
+        print(f"📤 {pending} operações aguardando envio ao banco")
 
 
 def get_date_input(prompt):
@@ -101,64 +113,139 @@ def cadastrar_producao():
 
     confirm = input("\nConfirmar cadastro? (s/N): ").strip().lower()
     if confirm in ["s", "sim", "y", "yes"]:
-        if db.create_agricultural_production(
-            product_name=product_name,
-            quantity=quantity,
-            sale_price=sale_price,
-            cost_price=cost_price,
-            planting_date=planting_date,
-            harvest_date=harvest_date,
-            production_status=production_status,
-        ):
+        # Grava no diário local e volta na hora; o envio ao banco é em segundo plano
+        try:
+            write_journal.create_production(
+                product_name=product_name,
+                quantity=quantity,
+                sale_price=sale_price,
+                cost_price=cost_price,
+                planting_date=planting_date,
+                harvest_date=harvest_date,
+                production_status=production_status,
+            )
             print("✅ Produção cadastrada com sucesso!")
-        else:
-            print("❌ Erro ao cadastrar produção!")
+            print(f"📤 Pendentes de envio ao banco: {write_journal.backlog_size()}")
+        except OSError as e:
+            print(f"❌ Erro ao cadastrar produção: {e}")
     else:
         print("❌ Cadastro cancelado.")
 
 
+PAGE_SIZE = 10
+
+
+def format_production(prod):
+    """Formata uma produção como lista de linhas para exibição"""
+    lines = [f"\n🆔 ID: {prod['id']}"]
+    if len(db.SHARDS) > 1 and "shard" in prod:
+        lines.append(f"🗄️  Shard: {prod['shard']}")
+    lines += [
+        f"🌱 Produto: {prod['product_name']}",
+        f"📦 Quantidade: {prod['quantity']}",
+        f"💰 Custo: R$ {prod['cost_price']:.2f}",
+        f"🏷️  Preço venda: R$ {prod['sale_price']:.2f}",
+    ]
+
+    if prod["sale_price"] > 0 and prod["cost_price"] > 0:
+        profit = prod["sale_price"] - prod["cost_price"]
+        roi = ((profit / prod["cost_price"]) * 100) if prod["cost_price"] > 0 else 0
+        lines.append(f"📈 Lucro: R$ {profit:.2f} (ROI: {roi:.1f}%)")
+
+    lines.extend(
+        [
+            f"📅 Plantio: {prod['planting_date'] or 'N/A'}",
+            f"🌾 Colheita: {prod['harvest_date'] or 'N/A'}",
+            f"📊 Status: {prod['production_status']}",
+            f"🕐 Cadastrado: {prod['created_at']}",
+            "-" * 30,
+        ]
+    )
+    return lines
+
+
 def listar_producoes():
-    """Lista todas as produções cadastradas"""
+    """Lista as produções cadastradas em todos os shards, uma página por vez"""
     print("\n📋 TODAS AS PRODUÇÕES")
     print("-" * 50)
 
-    productions = db.read_all_agricultural_production()
+    page = db.read_page_across_shards(PAGE_SIZE)
+    page_number = 1
+    has_next = page["has_more"]
+    has_previous = False
 
-    if not productions:
+    if not page["records"]:
         print("📭 Nenhuma produção encontrada.")
         return
 
-    for prod in productions:
-        print(f"\n🆔 ID: {prod['id']}")
-        print(f"🌱 Produto: {prod['product_name']}")
-        print(f"📦 Quantidade: {prod['quantity']}")
-        print(f"💰 Custo: R$ {prod['cost_price']:.2f}")
-        print(f"🏷️  Preço venda: R$ {prod['sale_price']:.2f}")
-
-        if prod["sale_price"] > 0 and prod["cost_price"] > 0:
-            profit = prod["sale_price"] - prod["cost_price"]
-            roi = ((profit / prod["cost_price"]) * 100) if prod["cost_price"] > 0 else 0
-            print(f"📈 Lucro: R$ {profit:.2f} (ROI: {roi:.1f}%)")
+    while True:
+        records = page["records"]
+
+        # Monta a página inteira e escreve de uma só vez
+        lines = []
+        for prod in records:
+            lines.extend(format_production(prod))
+        lines.append(f"\n📄 Página {page_number} ({len(records)} registros)")
+        sys.stdout.write("\n".join(lines) + "\n")
+
+        options = []
+        if has_next:
+            options.append("[n] próxima")
+        if has_previous:
+            options.append("[p] anterior")
+        options.extend(["[d] ir para data", "[q] sair"])
+        command = input(" ".join(options) + ": ").strip().lower()
+
+        first, last = records[0], records[-1]
+        if command == "n" and has_next:
+            new_page = db.read_page_across_shards(
+                PAGE_SIZE, after=(last["created_at"], last["shard"], last["id"])
+            )
+            page_number += 1
+            has_next, has_previous = new_page["has_more"], True
+        elif command == "p" and has_previous:
+            new_page = db.read_page_across_shards(
+                PAGE_SIZE, before=(first["created_at"], first["shard"], first["id"])
+            )
+            page_number = max(page_number - 1, 1)
+            has_next, has_previous = True, new_page["has_more"]
+        elif command == "d":
+            date_str = get_date_input("Mostrar cadastros até a data")
+            if not date_str:
+                continue
+            new_page = db.read_page_across_shards(
+                PAGE_SIZE, from_date=date_str
+            )
+            # Após um salto a posição absoluta é desconhecida
+            page_number = 1
+            has_next, has_previous = new_page["has_more"], True
+        elif command == "q":
+            return
+        else:
+            print("❌ Opção inválida!")
+            continue
 
-        print(f"📅 Plantio: {prod['planting_date'] or 'N/A'}")
-        print(f"🌾 Colheita: {prod['harvest_date'] or 'N/A'}")
-        print(f"📊 Status: {prod['production_status']}")
-        print(f"🕐 Cadastrado: {prod['created_at']}")
-        print("-" * 30)
+        if not new_page["records"]:
+            print("📭 Nenhuma produção encontrada.")
+            return
+        page = new_page
 
 
 def buscar_producao():
-    """Busca uma produção por ID"""
+    """Busca uma produção por ID (em todos os shards)"""
     print("\n🔍 BUSCAR PRODUÇÃO")
     print("-" * 20)
 
     try:
         prod_id = int(input("Digite o ID da produção: "))
-        production = db.read_agricultural_production_by_id(prod_id)
+        # Ids só são únicos dentro de um shard: pode haver um por banco
+        productions = db.read_by_id_across_shards(prod_id)
 
-        if production:
+        for production in productions:
             print(f"\n✅ Produção encontrada:")
             print(f"🆔 ID: {production['id']}")
+            if len(db.SHARDS) > 1:
+                print(f"🗄️  Shard: {production['shard']}")
             print(f"🌱 Produto: {production['product_name']}")
             print(f"📦 Quantidade: {production['quantity']}")
             print(f"💰 Custo: R$ {production['cost_price']:.2f}")
@@ -166,13 +253,147 @@ def buscar_producao():
             print(f"📅 Plantio: {production['planting_date'] or 'N/A'}")
             print(f"🌾 Colheita: {production['harvest_date'] or 'N/A'}")
             print(f"📊 Status: {production['production_status']}")
-        else:
+            if production["archived"]:
+                print("🗄️  Arquivada (somente leitura)")
+        if not productions:
             print("❌ Produção não encontrada!")
 
     except ValueError:
         print("❌ ID inválido! Digite um número.")
 
 
+def get_range_input(label, is_date=False):
+    """Solicita uma faixa (mínimo, máximo); Enter deixa o limite em aberto"""
+    if is_date:
+        minimum = get_date_input(f"{label} a partir de")
+        maximum = get_date_input(f"{label} até")
+        return minimum, maximum
+
+    bounds = []
+    for side in ("mínimo", "máximo"):
+        while True:
+            value_str = input(f"{label} {side} (Enter para pular): ").strip()
+            if not value_str:
+                bounds.append(None)
+                break
+            try:
+                bounds.append(float(value_str))
+                break
+            except ValueError:
+                print("❌ Valor inválido! Digite um número válido.")
+    return tuple(bounds)
+
+
+def busca_avancada():
+    """Busca produções por faixas de datas, valores e ROI"""
+    print("\n🔎 BUSCA AVANÇADA")
+    print("-" * 20)
+
+    ranges = {
+        "planting_date": get_range_input("Plantio", is_date=True),
+        "harvest_date": get_range_input("Colheita", is_date=True),
+        "quantity": get_range_input("Quantidade"),
+        "cost_price": get_range_input("Custo (R$)"),
+        "sale_price": get_range_input("Preço de venda (R$)"),
+        "roi": get_range_input("ROI (%)"),
+    }
+    ranges = {
+        column: bounds
+        for column, bounds in ranges.items()
+        if any(bound is not None for bound in bounds)
+    }
+
+    status_map = {"1": "PLANTED", "2": "HARVESTED", "3": "SOLD"}
+    print("1. PLANTED  2. HARVESTED  3. SOLD")
+    production_status = status_map.get(
+        input("Status (1-3) ou Enter para todos: ").strip()
+    )
+
+    sort_map = {
+        "1": "created_at",
+        "2": "harvest_date",
+        "3": "quantity",
+        "4": "sale_price",
+        "5": "roi",
+    }
+    print("Ordenar por: 1. Cadastro  2. Colheita  3. Quantidade  4. Preço  5. ROI")
+    sort_by = sort_map.get(input("Ordenação (1-5) [1]: ").strip(), "created_at")
+    ascending = input("Ordem crescente? (s/N): ").strip().lower() in ["s", "sim", "y"]
+
+    limit_str = input("Limite de resultados [20]: ").strip()
+    limit = int(limit_str) if limit_str.isdigit() else 20
+
+    # Cada shard já devolve os seus limit primeiros; a mescla mantém a ordem
+    productions = db.read_across_shards(
+        db.search_agricultural_production_ranges,
+        ranges,
+        production_status=production_status,
+        sort_by=sort_by,
+        descending=not ascending,
+        limit=limit,
+        sort_key=db.sort_key(sort_by),
+        reverse=not ascending,
+    )[:limit]
+
+    if not productions:
+        print("📭 Nenhuma produção encontrada.")
+        return
+
+    lines = []
+    for prod in productions:
+        lines.extend(format_production(prod))
+    lines.append(f"\n📊 {len(productions)} produções encontradas")
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+def confirm_journal():
+    """Pergunta se a operação que falhou deve ir para o diário local"""
+    answer = input(
+        "Banco indisponível? Registrar para enviar quando ele voltar? (s/N): "
+    )
+    return answer.strip().lower() in ["s", "sim", "y", "yes"]
+
+
+def ask_farm():
+    """
+    Pergunta a fazenda do registro quando há mais de um shard
+
+    Ids só são únicos dentro de um shard, então atualizações e exclusões
+    precisam saber em qual banco está o registro (None: shard padrão).
+    """
+    if len(db.SHARDS) == 1:
+        return None
+    return input(f"Fazenda do registro [{db.DEFAULT_FARM}]: ").strip() or None
+
+
+def mostrar_producao_atual(prod_id, farm_id):
+    """
+    Lê e mostra o registro antes de alterá-lo ou deletá-lo
+
+    Registros arquivados aparecem nas listagens, mas não são alterados.
+
+    O updated_at lido é enviado junto com a alteração: se outro usuário
+    mudar o registro nesse meio tempo, a alteração é recusada (conflito).
+
+    Returns:
+        dict: Registro lido, ou None se não foi encontrado
+    """
+    with db.use_farm(farm_id):
+        production = db.read_agricultural_production_by_id(prod_id)
+
+    if production is None:
+        print("❌ Produção não encontrada!")
+        return None
+    if production["archived"]:
+        print("🗄️ Produção arquivada: não pode ser alterada nem deletada.")
+        return None
+
+    lines = format_production(production)
+    lines.insert(-1, f"🕑 Atualizado: {production['updated_at']}")
+    sys.stdout.write("\n".join(lines) + "\n")
+    return production
+
+
 def atualizar_producao():
     """Atualiza uma produção existente"""
     print("\n✏️ ATUALIZAR PRODUÇÃO")
@@ -180,47 +401,74 @@ def atualizar_producao():
 
     try:
         prod_id = int(input("Digite o ID da produção para atualizar: "))
+        farm_id = ask_farm()
 
-        # Primeiro verifica se existe
-        existing = db.read_agricultural_production_by_id(prod_id)
-        if not existing:
-            print("❌ Produção não encontrada!")
+        current = mostrar_producao_atual(prod_id, farm_id)
+        if current is None:
             return
 
-        print(f"\n📋 Dados atuais da produção ID {prod_id}:")
-        print(f"Produto: {existing['product_name']}")
-        print(f"Quantidade: {existing['quantity']}")
-        print(f"Status: {existing['production_status']}")
-
         print("\n📝 Digite os novos dados (pressione Enter para manter o valor atual):")
 
-        # Coleta novos dados
-        new_name = input(f"Novo nome [{existing['product_name']}]: ").strip()
-        product_name = new_name if new_name else existing["product_name"]
+        # Campos vazios são enviados como None e mantêm o valor no banco
+        product_name = input("Novo nome: ").strip() or None
 
-        quantity_input = input(f"Nova quantidade [{existing['quantity']}]: ").strip()
-        quantity = float(quantity_input) if quantity_input else existing["quantity"]
+        quantity_input = input("Nova quantidade: ").strip()
+        quantity = float(quantity_input) if quantity_input else None
 
-        cost_input = input(f"Novo custo [{existing['cost_price']}]: ").strip()
-        cost_price = float(cost_input) if cost_input else existing["cost_price"]
+        cost_input = input("Novo custo: ").strip()
+        cost_price = float(cost_input) if cost_input else None
 
-        sale_input = input(f"Novo preço [{existing['sale_price']}]: ").strip()
-        sale_price = float(sale_input) if sale_input else existing["sale_price"]
+        sale_input = input("Novo preço: ").strip()
+        sale_price = float(sale_input) if sale_input else None
 
         # Status
-        print(f"\nStatus atual: {existing['production_status']}")
         print("1. PLANTED  2. HARVESTED  3. SOLD")
         status_input = input("Novo status (1-3) ou Enter para manter: ").strip()
 
         status_map = {"1": "PLANTED", "2": "HARVESTED", "3": "SOLD"}
-        production_status = status_map.get(status_input, existing["production_status"])
+        production_status = status_map.get(status_input)
+
+        # Uma única ida ao banco: atualiza e devolve os dados antes/depois
+        with db.use_farm(farm_id):
+            result = db.update_agricultural_production_returning(
+                prod_id,
+                product_name=product_name,
+                quantity=quantity,
+                sale_price=sale_price,
+                cost_price=cost_price,
+                production_status=production_status,
+                expected_updated_at=current["updated_at"],
+            )
 
-        if db.update_agricultural_production(
-            prod_id, product_name, quantity, sale_price, cost_price, production_status
-        ):
-            print("✅ Produção atualizada com sucesso!")
-        else:
+        if result is None:
             print("❌ Erro ao atualizar produção!")
+            if confirm_journal():
+                write_journal.update_production(
+                    prod_id,
+                    product_name=product_name,
+                    quantity=quantity,
+                    sale_price=sale_price,
+                    cost_price=cost_price,
+                    production_status=production_status,
+                    expected_updated_at=current["updated_at"],
+                    farm_id=farm_id,
+                )
+                print("📤 Atualização registrada para envio posterior.")
+        elif result["status"] == "not_found":
+            print("❌ Produção não encontrada!")
+        elif result["status"] == "conflict":
+            print("❌ Produção alterada por outro usuário, tente novamente!")
+        else:
+            before, after = result["before"], result["after"]
+            print(f"\n📋 Produção ID {prod_id} (antes → depois):")
+            print(f"Produto: {before['product_name']} → {after['product_name']}")
+            print(f"Quantidade: {before['quantity']} → {after['quantity']}")
+            print(f"Custo: {before['cost_price']} → {after['cost_price']}")
+            print(f"Preço: {before['sale_price']} → {after['sale_price']}")
+            print(
+                f"Status: {before['production_status']} → {after['production_status']}"
+            )
+            print("✅ Produção atualizada com sucesso!")
 
     except ValueError:
         print("❌ Valores inválidos!")
@@ -233,26 +481,45 @@ def deletar_producao():
 
     try:
         prod_id = int(input("Digite o ID da produção para deletar: "))
+        farm_id = ask_farm()
 
-        # Mostra os dados antes de deletar
-        production = db.read_agricultural_production_by_id(prod_id)
-        if not production:
-            print("❌ Produção não encontrada!")
+        current = mostrar_producao_atual(prod_id, farm_id)
+        if current is None:
+            return
+
+        confirm = (
+            input(f"\n❗ Tem certeza que deseja deletar a produção {prod_id}? (s/N): ")
+            .strip()
+            .lower()
+        )
+        if confirm not in ["s", "sim", "y", "yes"]:
+            print("❌ Operação cancelada.")
             return
 
-        print(f"\n⚠️  Dados da produção a ser deletada:")
-        print(f"ID: {production['id']}")
-        print(f"Produto: {production['product_name']}")
-        print(f"Quantidade: {production['quantity']}")
+        # Uma única ida ao banco: deleta e devolve os dados removidos
+        with db.use_farm(farm_id):
+            result = db.delete_agricultural_production_returning(
+                prod_id, expected_updated_at=current["updated_at"]
+            )
 
-        confirm = input("\n❗ Tem certeza que deseja deletar? (s/N): ").strip().lower()
-        if confirm in ["s", "sim", "y", "yes"]:
-            if db.delete_agricultural_production(prod_id):
-                print("✅ Produção deletada com sucesso!")
-            else:
-                print("❌ Erro ao deletar produção!")
+        if result is None:
+            print("❌ Erro ao deletar produção!")
+            if confirm_journal():
+                write_journal.delete_production(
+                    prod_id, expected_updated_at=current["updated_at"], farm_id=farm_id
+                )
+                print("📤 Exclusão registrada para envio posterior.")
+        elif result["status"] == "not_found":
+            print("❌ Produção não encontrada!")
+        elif result["status"] == "conflict":
+            print("❌ Produção alterada por outro usuário, tente novamente!")
         else:
-            print("❌ Operação cancelada.")
+            production = result["before"]
+            print(f"\n🗑️  Dados da produção deletada:")
+            print(f"ID: {production['id']}")
+            print(f"Produto: {production['product_name']}")
+            print(f"Quantidade: {production['quantity']}")
+            print("✅ Produção deletada com sucesso!")
 
     except ValueError:
         print("❌ ID inválido! Digite um número.")
@@ -273,28 +540,40 @@ def exportar_csv():
             print("❌ Erro ao exportar dados!")
     except ImportError:
         print("❌ Módulo export_csv não encontrado!")
+    except db.INTERRUPTIONS:
+        raise
     except Exception as e:
         print(f"❌ Erro: {e}")
 
 
-def gerar_analise():
-    """Gera análise básica em Python"""
+def gerar_analise(approximate=False):
+    """Gera análise básica em Python (ou aproximada, a partir dos sketches)"""
+    if approximate:
+        sketches.print_approximate_report()
+        return
+
     print("🔄 Executando análise quantitativa em Python...")
 
     try:
-        # Busca todos os dados
-        productions = db.read_all_agricultural_production()
+        # Agregados parciais por faixa de ids, combinados em um único resultado;
+        # reaproveitado do cache enquanto os dados não mudarem
+        analysis = report_cache.get_or_compute(
+            "analysis",
+            analysis_engine.run_analysis,
+            is_empty=lambda analysis: not analysis["row_count"],
+        )
+        row_count = analysis["row_count"]
 
-        if not productions:
+        if not row_count:
             print("❌ Nenhum dado encontrado para análise!")
             return
 
-        print(f"\n📊 ANÁLISE QUANTITATIVA - {len(productions)} registros")
+        print(f"\n📊 ANÁLISE QUANTITATIVA - {row_count} registros")
         print("=" * 50)
 
         # 1. Análise Financeira Geral
-        total_investment = sum(p["cost_price"] for p in productions)
-        total_revenue = sum(p["sale_price"] for p in productions if p["sale_price"])
+        total_investment = analysis["total_investment"]
+        total_revenue = analysis["total_revenue"]
         total_profit = total_revenue - total_investment
         overall_roi = (
             (total_profit / total_investment * 100) if total_investment > 0 else 0
@@ -308,86 +587,114 @@ def gerar_analise():
 
         # 2. Análise por Produto
         print("\n🌱 ANÁLISE POR PRODUTO:")
-        product_stats = {}
-
-        for prod in productions:
-            name = prod["product_name"]
-            if name not in product_stats:
-                product_stats[name] = {
-                    "quantidade": 0,
-                    "investimento": 0,
-                    "receita": 0,
-                    "count": 0,
-                }
-
-            product_stats[name]["quantidade"] += prod["quantity"]
-            product_stats[name]["investimento"] += prod["cost_price"]
-            product_stats[name]["receita"] += prod["sale_price"] or 0
-            product_stats[name]["count"] += 1
 
         # Top 5 produtos por ROI
-        product_roi = []
-        for name, stats in product_stats.items():
-            if stats["investimento"] > 0:
-                lucro = stats["receita"] - stats["investimento"]
-                roi = (lucro / stats["investimento"]) * 100
-                product_roi.append((name, roi, lucro, stats["quantidade"]))
-
-        product_roi.sort(key=lambda x: x[1], reverse=True)
-
         print("\n🏆 TOP 5 PRODUTOS POR ROI:")
-        for i, (name, roi, lucro, quantidade) in enumerate(product_roi[:5], 1):
+        for entry in analysis["top_roi"]:
             print(
-                f"{i}. {name}: {roi:.1f}% ROI (Lucro: R$ {lucro:.2f}, Qtd: {quantidade:.1f})"
+                f"{entry['rank']}. {entry['product_name']}: {entry['roi']:.1f}% ROI "
+                f"(Lucro: R$ {entry['profit']:.2f}, Qtd: {entry['quantity']:.1f})"
             )
 
-        # 3. Análise de Status
+        # 3. Análise de Status (ordem fixa, independente das partições)
         print("\n📊 STATUS DAS PRODUÇÕES:")
-        status_count = {}
-        for prod in productions:
-            status = prod["production_status"]
-            status_count[status] = status_count.get(status, 0) + 1
-
-        for status, count in status_count.items():
-            percentage = (count / len(productions)) * 100
-            status_name = {
-                "PLANTED": "🌱 Plantado",
-                "HARVESTED": "🌾 Colhido",
-                "SOLD": "💰 Vendido",
-            }.get(status, status)
-            print(f"{status_name}: {count} ({percentage:.1f}%)")
+        status_names = {
+            "PLANTED": "🌱 Plantado",
+            "HARVESTED": "🌾 Colhido",
+            "SOLD": "💰 Vendido",
+        }
+        status_order = list(status_names)
+        status_count = analysis["status_count"]
+        for status in sorted(
+            status_count,
+            key=lambda st: status_order.index(st) if st in status_order else len(status_order),
+        ):
+            count = status_count[status]
+            percentage = (count / row_count) * 100
+            print(f"{status_names.get(status, status)}: {count} ({percentage:.1f}%)")
 
         # 4. Produtos Mais Eficientes
         print("\n⚡ PRODUTOS MAIS EFICIENTES (quantidade/investimento):")
-        efficiency_list = []
-        for name, stats in product_stats.items():
-            if stats["investimento"] > 0:
-                efficiency = stats["quantidade"] / stats["investimento"]
-                efficiency_list.append((name, efficiency))
-
-        efficiency_list.sort(key=lambda x: x[1], reverse=True)
+        for entry in analysis["top_efficiency"]:
+            print(
+                f"{entry['rank']}. {entry['product_name']}: "
+                f"{entry['efficiency']:.0f} unidades/R$"
+            )
 
-        for i, (name, eff) in enumerate(efficiency_list[:5], 1):
-            print(f"{i}. {name}: {eff:.0f} unidades/R$")
+        # 5. Melhor mês de venda por produto (consulta ao cubo)
+        print("\n📅 MELHOR MÊS DE VENDA POR PRODUTO (ROI):")
+        for name, cells in rollup.best_periods("month", top=1).items():
+            best = cells[0]
+            print(f"{name}: {best['period']} ({best['roi_percent']:.1f}% ROI)")
+
+        # 6. Correlação Investimento vs. Retorno (uma passada, memória constante)
+        print("\n🔗 CORRELAÇÃO INVESTIMENTO × RETORNO:")
+        for row in analysis["statistics_rows"]:
+            roi_median = row["roi_median"]
+            roi_text = f"{roi_median:.1f}%" if roi_median is not None else "N/A"
+            print(
+                f"{row['product_name']}: r = {row['cost_revenue_correlation']:.2f} "
+                f"(ROI mediano: {roi_text}, {row['count']} registros)"
+            )
 
         print("\n✅ Análise Python concluída!")
 
+    except db.INTERRUPTIONS:
+        raise
     except Exception as e:
         print(f"❌ Erro na análise: {e}")
 
 
+def run_action(action, *args):
+    """
+    Executa uma opção do menu; Ctrl-C cancela só a operação em andamento
+
+    Com uma consulta em execução, o Ctrl-C pede ao banco que a interrompa
+    (db.cancel_running): a função recebe o erro, a sessão continua válida e o
+    menu volta. Fora de consultas (ex.: digitando dados), desiste da opção.
+    """
+    cancelled = []
+
+    def on_interrupt(signum, frame):
+        if db.cancel_running():
+            cancelled.append(True)
+            print("\n⏹️ Cancelando a consulta...")
+        else:
+            raise KeyboardInterrupt
+
+    previous = signal.signal(signal.SIGINT, on_interrupt)
+    try:
+        # Com --profile, cada opção gera um perfil em results/
+        with profiling.profile_action(action.__name__):
+            action(*args)
+    except KeyboardInterrupt:
+        print("\n⏹️ Operação cancelada.")
+    except db.QueryCancelled:
+        print("\n⏹️ Consulta cancelada.")
+    except db.QueryTimeout as e:
+        print(f"\n⏱️ Tempo limite excedido: {e}")
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+    if cancelled:
+        print("⏹️ Consulta cancelada; a conexão com o banco continua ativa.")
+
+
 def main():
     """Função principal do programa"""
     print("🌾 Iniciando Sistema de Gestão Agrícola...")
 
     # Testa conexão com banco
     connection = db.get_connection()
-    if not connection:
-        print("❌ Erro: Não foi possível conectar ao banco de dados!")
+    if connection:
+        connection.close()
+        print("✅ Conexão com banco de dados estabelecida!")
+    else:
+        # Os cadastros continuam no diário local e são enviados quando o banco voltar
+        print("⚠️ Banco de dados indisponível: cadastros ficam pendentes no diário local")
         print("Verifique as configurações em db.py")
-        sys.exit(1)
-    connection.close()
-    print("✅ Conexão com banco de dados estabelecida!")
+
+    write_journal.start_flusher()
 
     while True:
         try:
@@ -395,25 +702,29 @@ def main():
             choice = input("\nEscolha uma opção: ").strip()
 
             if choice == "1":
-                cadastrar_producao()
+                run_action(cadastrar_producao)
             elif choice == "2":
-                listar_producoes()
+                run_action(listar_producoes)
             elif choice == "3":
-                buscar_producao()
+                run_action(buscar_producao)
             elif choice == "4":
-                atualizar_producao()
+                run_action(atualizar_producao)
             elif choice == "5":
-                deletar_producao()
+                run_action(deletar_producao)
             elif choice == "6":
-                exportar_csv()
+                run_action(exportar_csv)
             elif choice == "7":
-                gerar_analise()
+                run_action(gerar_analise)
+            elif choice == "8":
+                run_action(busca_avancada)
+            elif choice == "9":
+                run_action(gerar_analise, True)
             elif choice == "0":
                 print("\n👋 Obrigado por usar o Sistema de Gestão Agrícola!")
                 print("🌱 Até a próxima!")
                 break
             else:
-                print("❌ Opção inválida! Escolha um número de 0 a 7.")
+                print("❌ Opção inválida! Escolha um número de 0 a 9.")
 
         except KeyboardInterrupt:
             print("\n\n👋 Sistema encerrado pelo usuário.")
@@ -422,6 +733,10 @@ def main():
             print(f"\n❌ Erro inesperado: {e}")
             print("Tente novamente ou entre em contato com o suporte.")
 
+    pending = write_journal.stop_flusher()
+    if pending:
+        print(f"📤 {pending} operações ficaram no diário e serão enviadas na próxima execução")
+
 
 if __name__ == "__main__":
     main()
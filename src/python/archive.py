@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Arquivamento de produções encerradas (camadas quente e fria)
+
+Produções SOLD colhidas há mais de ARCHIVE_AFTER_DAYS dias são movidas de
+agricultural_production para agricultural_production_archive em lotes, cada
+um em sua própria transação: uma execução interrompida continua de onde
+parou na próxima, sem duplicar nem perder registros.
+
+A listagem, a paginação e as buscas por nome/status leem só a tabela quente.
+As buscas por faixa, o fluxo de registros e os rankings (db.record_source_sql)
+incluem o arquivo apenas quando a faixa de datas ou o status consultado podem
+alcançá-lo. O cubo production_rollup e o feed de alterações ignoram a
+movimentação, que não altera os dados do ponto de vista dos relatórios.
+
+Cada shard (db.SHARDS) tem o seu arquivo: as funções abaixo atuam no shard
+atual, e main() arquiva todos os shards em paralelo (db.scatter_gather).
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict
+import db
+
+
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 500
+
+db.register_statement(
+    "archive_batch",
+    f"""
+    DECLARE
+        TYPE id_list IS TABLE OF NUMBER;
+        v_ids id_list;
+    BEGIN
+        -- Os triggers de cubo e feed ignoram as linhas movidas nesta sessão
+        DBMS_SESSION.SET_CONTEXT('CLIENTCONTEXT', 'production_archiving', 'Y');
+
+        SELECT id BULK COLLECT INTO v_ids
+          FROM agricultural_production_base
+         WHERE production_status = 'SOLD'
+           AND harvest_date < :cutoff
+           AND ROWNUM <= :batch_size
+           FOR UPDATE;
+
+        FORALL i IN 1 .. v_ids.COUNT
+            INSERT INTO {db.ARCHIVE_TABLE} ({db.RECORD_COLUMNS_SQL}, farm_id, archived_at)
+            SELECT {db.RECORD_COLUMNS_SQL}, farm_id, SYSDATE
+              FROM agricultural_production
+             WHERE id = v_ids(i);
+
+        FORALL i IN 1 .. v_ids.COUNT
+            DELETE FROM agricultural_production_base WHERE id = v_ids(i);
+
+        :moved := v_ids.COUNT;
+        IF v_ids.COUNT > 0 THEN
+            UPDATE production_archive_state
+               SET archive_horizon = GREATEST(NVL(archive_horizon, :cutoff), :cutoff),
+                   archived_rows = archived_rows + v_ids.COUNT,
+                   last_run_at = SYSDATE;
+            UPDATE production_data_version
+               SET change_counter = change_counter + 1;
+        END IF;
+
+        DBMS_SESSION.CLEAR_CONTEXT('CLIENTCONTEXT', NULL, 'production_archiving');
+    EXCEPTION
+        WHEN OTHERS THEN
+            DBMS_SESSION.CLEAR_CONTEXT('CLIENTCONTEXT', NULL, 'production_archiving');
+            RAISE;
+    END;
+    """,
+)
+db.register_statement(
+    "archive_status",
+    f"""
+    SELECT s.archive_horizon, s.archived_rows, s.last_run_at,
+           (SELECT COUNT(*) FROM agricultural_production_base),
+           (SELECT COUNT(*) FROM {db.ARCHIVE_TABLE})
+    FROM production_archive_state s
+    """,
+)
+
+
+def archive_cutoff(older_than_days: int = ARCHIVE_AFTER_DAYS) -> datetime:
+    """Data de colheita limite: anteriores a ela podem ser arquivadas"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=older_than_days)
+
+
+def archive_sold_records(
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    max_batches: int = None,
+) -> int:
+    """
+    Move produções vendidas antigas para a tabela de arquivo
+
+    Args:
+        older_than_days: Idade mínima (pela data de colheita) para arquivar
+        batch_size: Registros movidos por transação
+        max_batches: Limita o número de lotes desta execução (None: até o fim)
+
+    Returns:
+        int: Número de registros arquivados nesta execução
+    """
+    connection = db.get_connection()
+    if not connection:
+        return 0
+
+    cutoff = archive_cutoff(older_than_days)
+    total = 0
+    batches = 0
+
+    try:
+        cursor = connection.cursor()
+        moved = cursor.var(int)
+        while max_batches is None or batches < max_batches:
+            db.execute_statement(
+                cursor,
+                "archive_batch",
+                {"cutoff": cutoff, "batch_size": batch_size, "moved": moved},
+            )
+            connection.commit()
+            batches += 1
+            total += moved.getvalue()
+            if moved.getvalue() < batch_size:
+                break
+        return total
+
+    except db.INTERRUPTIONS:
+        connection.rollback()
+        raise
+    except Exception as e:
+        print(f"❌ Erro ao arquivar registros (lotes anteriores mantidos): {e}")
+        connection.rollback()
+        return total
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def archive_status() -> Dict:
+    """
+    Situação do arquivamento
+
+    Returns:
+        Dict: archive_horizon, archived_rows, last_run_at, hot_rows e
+        archive_rows (vazio se o banco estiver indisponível)
+    """
+    connection = db.get_connection()
+    if not connection:
+        return {}
+
+    try:
+        cursor = connection.cursor()
+        row = db.fetchone_statement(cursor, "archive_status")
+        keys = ("archive_horizon", "archived_rows", "last_run_at", "hot_rows", "archive_rows")
+        return dict(zip(keys, row)) if row else {}
+
+    except db.INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"❌ Erro ao consultar arquivamento: {e}")
+        return {}
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def main():
+    """Arquiva nos shards as produções vendidas há mais de ARCHIVE_AFTER_DAYS dias"""
+    print("🗄️ ARQUIVAMENTO DE PRODUÇÕES VENDIDAS")
+    print("=" * 40)
+    print(f"📅 Colhidas antes de {archive_cutoff():%d/%m/%Y}")
+
+    moved = db.scatter_gather(archive_sold_records)
+    statuses = db.scatter_gather(archive_status)
+    for shard in db.SHARDS:
+        if len(db.SHARDS) > 1:
+            print(f"\n🗄️ Shard {shard}")
+        print(f"✅ Registros arquivados: {moved[shard]}")
+        status = statuses[shard]
+        if status:
+            print(f"🔥 Tabela quente: {status['hot_rows']} registros")
+            print(f"🧊 Arquivo: {status['archive_rows']} registros")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Feed de alterações da tabela agricultural_production
+
+O trigger trg_agri_prod_changes grava cada insert/update/delete em
+production_changes, na mesma transação da escrita, com um change_id
+crescente. Consumidores (caches, resumos, exportações) leem o log a partir do
+seu checkpoint em lotes e aplicam só o que mudou, sem reler a tabela inteira.
+
+Como a sequência é consumida antes do commit, uma transação mais lenta pode
+tornar visível um change_id menor depois de um maior. Por isso a leitura para
+no primeiro buraco da sequência e só o pula depois de GAP_TIMEOUT segundos
+(buracos também surgem de rollbacks e do cache da sequência). Os ids pulados
+continuam sendo procurados a cada leitura por GAP_RECHECK segundos: se
+aparecerem, são entregues no lote seguinte, fora da ordem de change_id e com
+'late' = True. Enquanto isso o checkpoint gravado não passa do menor id
+pulado, então um consumidor reiniciado também não os perde (as alterações
+seguintes podem ser entregues de novo, como em toda entrega pelo menos uma
+vez).
+
+Cada shard (db.SHARDS) tem o seu próprio log, sequência e checkpoints, e os
+change_ids de bancos diferentes não são comparáveis: um consumidor acompanha
+um único shard (o atual ao criá-lo, ou o informado em shard) e cada alteração
+traz a chave 'shard'. Para acompanhar todos, crie um consumidor por shard.
+"""
+
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+import db
+
+
+DEFAULT_BATCH_SIZE = 500
+GAP_TIMEOUT = 5.0
+# Por quanto tempo um id pulado ainda é procurado (transação longa) antes de
+# ser considerado perdido (rollback ou cache da sequência)
+GAP_RECHECK = 600.0
+RECHECK_BINDS = 20
+POLL_INTERVAL = 1.0
+
+CHANGE_FIELDS = (
+    "product_name",
+    "quantity",
+    "sale_price",
+    "cost_price",
+    "planting_date",
+    "harvest_date",
+    "production_status",
+)
+
+db.register_statement(
+    "changes_after",
+    """
+    SELECT change_id, operation, record_id, changed_at,
+           old_product_name, old_quantity, old_sale_price, old_cost_price,
+           old_planting_date, old_harvest_date, old_production_status,
+           new_product_name, new_quantity, new_sale_price, new_cost_price,
+           new_planting_date, new_harvest_date, new_production_status
+    FROM production_changes
+    WHERE change_id > :last_change_id
+    ORDER BY change_id
+    FETCH FIRST :batch_size ROWS ONLY
+    """,
+)
+db.register_statement(
+    "changes_recheck",
+    f"""
+    SELECT change_id, operation, record_id, changed_at,
+           old_product_name, old_quantity, old_sale_price, old_cost_price,
+           old_planting_date, old_harvest_date, old_production_status,
+           new_product_name, new_quantity, new_sale_price, new_cost_price,
+           new_planting_date, new_harvest_date, new_production_status
+    FROM production_changes
+    WHERE change_id IN ({", ".join(f":id{i}" for i in range(RECHECK_BINDS))})
+    ORDER BY change_id
+    """,
+)
+db.register_statement(
+    "change_checkpoint_read",
+    """
+    SELECT last_change_id FROM production_change_checkpoints
+    WHERE subscriber_name = :subscriber_name
+    """,
+)
+db.register_statement(
+    "change_checkpoint_save",
+    """
+    MERGE INTO production_change_checkpoints c
+    USING (SELECT :subscriber_name AS subscriber_name FROM dual) s
+       ON (c.subscriber_name = s.subscriber_name)
+    WHEN MATCHED THEN UPDATE SET
+        c.last_change_id = :last_change_id, c.updated_at = SYSDATE
+    WHEN NOT MATCHED THEN INSERT (subscriber_name, last_change_id)
+        VALUES (s.subscriber_name, :last_change_id)
+    """,
+)
+db.register_statement(
+    "change_latest_id",
+    "SELECT NVL(MAX(change_id), 0) FROM production_changes",
+)
+db.register_statement(
+    "changes_purge",
+    """
+    DELETE FROM production_changes
+    WHERE change_id <= (SELECT MIN(last_change_id) FROM production_change_checkpoints)
+    """,
+)
+
+
+def _change_from_row(columns: List[str], row: tuple) -> Dict:
+    """Converte uma linha do log em {change_id, operation, record_id, before, after}"""
+    values = dict(zip(columns, row))
+    change = {
+        "change_id": values["change_id"],
+        "operation": values["operation"].lower(),
+        "record_id": values["record_id"],
+        "changed_at": values["changed_at"],
+        "before": None,
+        "after": None,
+    }
+    if change["operation"] != "insert":
+        change["before"] = {"id": values["record_id"]}
+        change["before"].update((f, values[f"old_{f}"]) for f in CHANGE_FIELDS)
+    if change["operation"] != "delete":
+        change["after"] = {"id": values["record_id"]}
+        change["after"].update((f, values[f"new_{f}"]) for f in CHANGE_FIELDS)
+    return change
+
+
+def latest_change_id() -> int:
+    """Maior change_id já visível no shard atual (0 se o log estiver vazio)"""
+    connection = db.get_connection()
+    if not connection:
+        return 0
+
+    try:
+        cursor = connection.cursor()
+        return db.fetchone_statement(cursor, "change_latest_id")[0]
+    finally:
+        cursor.close()
+        connection.close()
+
+
+class ChangeSubscriber:
+    """
+    Consumidor do feed de um shard, com checkpoint persistido no banco
+
+    Uso típico:
+        subscriber = ChangeSubscriber("resumo_produtos")
+        for batch in subscriber.follow():
+            aplicar(batch)
+            subscriber.commit()
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        gap_timeout: float = GAP_TIMEOUT,
+        shard: str = None,
+        gap_recheck: float = GAP_RECHECK,
+    ):
+        self.name = name
+        self.batch_size = batch_size
+        self.gap_timeout = gap_timeout
+        self.gap_recheck = gap_recheck
+        # Fixado na criação: follow() pode ser consumido em outra thread
+        self.shard = shard or db.current_shard()
+        self.position = self._load_checkpoint()
+        self._pending_position = self.position
+        self._gap_since = None  # (change_id esperado, instante em que o buraco apareceu)
+        # Ids pulados ainda procurados: {change_id: instante em que foi pulado}
+        self._skipped = {}
+        self._committed_skipped = {}
+
+    def _load_checkpoint(self) -> int:
+        """Último change_id confirmado por este consumidor (0 se novo)"""
+        connection = db.get_connection(self.shard)
+        if not connection:
+            return 0
+
+        try:
+            cursor = connection.cursor()
+            row = db.fetchone_statement(
+                cursor, "change_checkpoint_read", {"subscriber_name": self.name}
+            )
+            return row[0] if row else 0
+        finally:
+            cursor.close()
+            connection.close()
+
+    def _accept_gap(self, expected_id: int) -> bool:
+        """Decide se um buraco na sequência já esperou o suficiente"""
+        now = time.monotonic()
+        if self._gap_since is None or self._gap_since[0] != expected_id:
+            self._gap_since = (expected_id, now)
+        return now - self._gap_since[1] >= self.gap_timeout
+
+    def _fetch_changes(self, statement: str, params: Dict) -> Optional[List[Dict]]:
+        """Alterações de uma consulta ao log (None se a leitura falhar)"""
+        connection = db.get_connection(self.shard)
+        if not connection:
+            return None
+
+        try:
+            cursor = connection.cursor()
+            rows = db.fetchall_statement(cursor, statement, params)
+            columns = [col[0].lower() for col in cursor.description]
+        except db.INTERRUPTIONS:
+            raise
+        except Exception as e:
+            print(f"❌ Erro ao ler feed de alterações: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+
+        changes = []
+        for row in rows:
+            change = _change_from_row(columns, row)
+            change["shard"] = self.shard
+            changes.append(change)
+        return changes
+
+    def _recheck_skipped(self) -> List[Dict]:
+        """Procura de novo os ids pulados; devolve os que ficaram visíveis"""
+        now = time.monotonic()
+        self._skipped = {
+            change_id: skipped_at
+            for change_id, skipped_at in self._skipped.items()
+            if now - skipped_at < self.gap_recheck
+        }
+
+        late = []
+        ids = sorted(self._skipped)
+        for start in range(0, len(ids), RECHECK_BINDS):
+            chunk = ids[start : start + RECHECK_BINDS]
+            params = {f"id{i}": None for i in range(RECHECK_BINDS)}
+            params.update((f"id{i}", change_id) for i, change_id in enumerate(chunk))
+            changes = self._fetch_changes("changes_recheck", params)
+            if changes is None:
+                break
+            for change in changes:
+                del self._skipped[change["change_id"]]
+                change["late"] = True
+                late.append(change)
+        return late
+
+    def poll(self) -> List[Dict]:
+        """
+        Lê o próximo lote de alterações após a posição atual
+
+        Returns:
+            List[Dict]: Alterações com 'before' e 'after' (None quando não se
+            aplicam) e a chave 'shard'. Primeiro as que preencheram buracos já
+            pulados ('late' = True), depois as novas em ordem de change_id.
+            Vazia se não houver nada novo.
+        """
+        late = self._recheck_skipped() if self._skipped else []
+
+        changes = self._fetch_changes(
+            "changes_after",
+            {"last_change_id": self._pending_position, "batch_size": self.batch_size},
+        )
+        if changes is None:
+            return late
+
+        batch = []
+        expected_id = self._pending_position + 1
+        for change in changes:
+            if change["change_id"] != expected_id:
+                if not self._accept_gap(expected_id):
+                    # Uma transação anterior pode ainda não ter feito commit
+                    break
+                # Continua procurando os ids pulados nas próximas leituras
+                skipped_at = time.monotonic()
+                for change_id in range(expected_id, change["change_id"]):
+                    self._skipped[change_id] = skipped_at
+            self._gap_since = None
+            batch.append(change)
+            expected_id = change["change_id"] + 1
+
+        if batch:
+            self._pending_position = batch[-1]["change_id"]
+        return late + batch
+
+    def commit(self) -> bool:
+        """
+        Persiste a posição do último lote lido como checkpoint
+
+        Returns:
+            bool: True se o checkpoint foi gravado
+        """
+        if (
+            self._pending_position == self.position
+            and self._skipped == self._committed_skipped
+        ):
+            return True
+
+        # Não passa dos ids pulados que ainda podem aparecer
+        checkpoint = self._pending_position
+        if self._skipped:
+            checkpoint = min(checkpoint, min(self._skipped) - 1)
+
+        connection = db.get_connection(self.shard)
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            db.execute_statement(
+                cursor,
+                "change_checkpoint_save",
+                {"subscriber_name": self.name, "last_change_id": checkpoint},
+            )
+            connection.commit()
+            self.position = self._pending_position
+            self._committed_skipped = dict(self._skipped)
+            return True
+        except db.INTERRUPTIONS:
+            connection.rollback()
+            raise
+        except Exception as e:
+            print(f"❌ Erro ao gravar checkpoint de {self.name}: {e}")
+            connection.rollback()
+            return False
+        finally:
+            cursor.close()
+            connection.close()
+
+    def rewind(self):
+        """Volta ao último checkpoint confirmado (reprocessa o lote pendente)"""
+        self._pending_position = self.position
+        self._skipped = dict(self._committed_skipped)
+        self._gap_since = None
+
+    def follow(
+        self, poll_interval: float = POLL_INTERVAL, stop_when_idle: bool = False
+    ) -> Iterator[List[Dict]]:
+        """
+        Acompanha o feed, entregando lotes conforme aparecem
+
+        Args:
+            poll_interval: Espera entre leituras quando não há novidades
+            stop_when_idle: Encerra na primeira leitura vazia (modo catch-up)
+
+        Yields:
+            List[Dict]: Lotes de alterações; chame commit() após aplicá-los
+        """
+        while True:
+            batch = self.poll()
+            if batch:
+                yield batch
+                continue
+            if stop_when_idle:
+                return
+            time.sleep(poll_interval)
+
+
+def consume(
+    name: str,
+    apply: Callable[[List[Dict]], None],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    stop_when_idle: bool = True,
+) -> int:
+    """
+    Aplica as alterações pendentes de um consumidor do shard atual, lote a lote
+
+    O checkpoint só avança depois que apply() termina sem erro, então uma
+    falha reprocessa o lote na próxima execução (entrega pelo menos uma vez).
+
+    Args:
+        name: Nome do consumidor (chave do checkpoint)
+        apply: Função chamada com cada lote
+        batch_size: Alterações por lote
+        stop_when_idle: Encerra quando alcançar o fim do log
+
+    Returns:
+        int: Número de alterações aplicadas
+    """
+    subscriber = ChangeSubscriber(name, batch_size)
+    applied = 0
+    for batch in subscriber.follow(stop_when_idle=stop_when_idle):
+        apply(batch)
+        if not subscriber.commit():
+            break
+        applied += len(batch)
+    return applied
+
+
+def purge_consumed() -> int:
+    """
+    Remove do log do shard atual as alterações já confirmadas por todos os
+    consumidores
+
+    Returns:
+        int: Número de alterações removidas
+    """
+    connection = db.get_connection()
+    if not connection:
+        return 0
+
+    try:
+        cursor = connection.cursor()
+        db.execute_statement(cursor, "changes_purge")
+        connection.commit()
+        return cursor.rowcount
+    except db.INTERRUPTIONS:
+        connection.rollback()
+        raise
+    except Exception as e:
+        print(f"❌ Erro ao limpar feed de alterações: {e}")
+        connection.rollback()
+        return 0
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def _format_change(change: Dict) -> str:
+    """Linha de log de uma alteração"""
+    record = change["after"] or change["before"]
+    changed_at = change["changed_at"]
+    if isinstance(changed_at, datetime):
+        changed_at = changed_at.strftime("%Y-%m-%d %H:%M:%S")
+    return (
+        f"#{change['change_id']} {changed_at} {change['operation'].upper():6} "
+        f"id={change['record_id']} {record['product_name']} "
+        f"({record['production_status']})"
+    )
+
+
+def main():
+    """Acompanha o feed no terminal (Ctrl+C para sair)"""
+    print("📡 FEED DE ALTERAÇÕES")
+    print("=" * 40)
+    subscriber = ChangeSubscriber("console")
+    try:
+        for batch in subscriber.follow():
+            for change in batch:
+                print(_format_change(change))
+            subscriber.commit()
+    except KeyboardInterrupt:
+        print("\n👋 Encerrado")
+
+
+if __name__ == "__main__":
+    main()
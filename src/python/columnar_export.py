@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Exportação em formato colunar tipado, ao lado do CSV
+
+Com pyarrow instalado os arquivos são Parquet. Sem ele é usado um formato
+binário próprio (.agcol), autodescritivo e só com a biblioteca padrão:
+
+    [8 bytes]  assinatura b"AGCOL1\\0\\0"
+    [...]      grupos de linhas; cada coluna do grupo é um bloco contíguo
+    [N bytes]  rodapé JSON: esquema e, por grupo, posição, nulos, min e max
+    [4 bytes]  tamanho do rodapé (uint32, little-endian)
+    [8 bytes]  assinatura
+
+Tipos: int64, float64, date (dias desde 1970-01-01, int32), timestamp
+(segundos desde 1970-01-01, int64) e string (offsets uint64 + UTF-8). Colunas
+com nulos levam antes dos dados um byte de validade por linha.
+
+Os dois formatos guardam min/max por coluna em cada grupo de linhas, então
+leitores podem pular grupos fora da faixa consultada (read_columnar).
+"""
+
+import array
+import json
+import os
+import struct
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+import db
+import report_cache
+from export_csv import (
+    MONTHLY_HEADERS,
+    SUMMARY_HEADERS,
+    ensure_data_directory,
+    monthly_analysis_rows,
+    summarize_by_product,
+)
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:  # sem pyarrow, usa o formato .agcol
+    pyarrow = None
+    parquet = None
+
+
+MAGIC = b"AGCOL1\0\0"
+FOOTER_SIZE = struct.Struct("<I")
+ROW_GROUP_SIZE = 50000
+EPOCH = datetime(1970, 1, 1)
+
+DETAIL_SCHEMA = [
+    ("id", "int64"),
+    ("product_name", "string"),
+    ("quantity", "float64"),
+    ("sale_price", "float64"),
+    ("cost_price", "float64"),
+    ("planting_date", "date"),
+    ("harvest_date", "date"),
+    ("production_status", "string"),
+    ("created_at", "timestamp"),
+    ("updated_at", "timestamp"),
+    ("roi", "float64"),
+]
+
+# Tipos fixos do resumo: ele é gravado em fluxo, sem ver todas as linhas antes
+SUMMARY_SCHEMA = [
+    ("product_name", "string"),
+    ("total_quantity", "float64"),
+    ("total_cost", "float64"),
+    ("total_revenue", "float64"),
+    ("total_profit", "float64"),
+    ("total_roi_percent", "float64"),
+    ("count_planted", "int64"),
+    ("count_harvested", "int64"),
+    ("count_sold", "int64"),
+    ("avg_growth_period", "float64"),
+]
+
+# Typecode do módulo array para os tipos de largura fixa
+FIXED_TYPECODES = {"int64": "q", "float64": "d", "date": "i", "timestamp": "q"}
+
+
+def _parse_date(value):
+    """Aceita datas como 'YYYY-MM-DD' além de datetime"""
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            return value
+    return value
+
+
+def _encode_value(kind: str, value):
+    """Valor Python -> representação física (None continua None)"""
+    if value is None or (kind == "float64" and value != value):
+        return None
+    if kind in ("date", "timestamp"):
+        value = _parse_date(value)
+    if kind == "date":
+        return (value - EPOCH).days
+    if kind == "timestamp":
+        return int((value - EPOCH).total_seconds())
+    if kind == "float64":
+        return float(value)
+    if kind == "int64":
+        # NUMBER sem precisão (como o id) chega do banco como float64
+        return int(value)
+    return value
+
+
+def _decode_value(kind: str, value):
+    """Representação física -> valor Python"""
+    if value is None:
+        return None
+    if kind == "date":
+        return EPOCH + timedelta(days=value)
+    if kind == "timestamp":
+        return EPOCH + timedelta(seconds=value)
+    return value
+
+
+def infer_schema(rows: List[Dict], columns: List[str]) -> List[tuple]:
+    """
+    Deduz o tipo de cada coluna a partir dos valores
+
+    Colunas numéricas com algum valor fracionário viram float64.
+    """
+    schema = []
+    for name in columns:
+        values = [row.get(name) for row in rows if row.get(name) is not None]
+        if all(isinstance(v, bool) or not isinstance(v, (int, float)) for v in values):
+            kind = "timestamp" if values and isinstance(values[0], datetime) else "string"
+        elif all(isinstance(v, int) for v in values):
+            kind = "int64"
+        else:
+            kind = "float64"
+        schema.append((name, kind))
+    return schema
+
+
+class ColumnarFileWriter:
+    """Gravador do formato .agcol, um grupo de linhas por chamada"""
+
+    def __init__(self, path: str, schema: List[tuple]):
+        self.path = path
+        self.schema = schema
+        self.row_groups = []
+        self._temp_path = f"{path}.{os.getpid()}.tmp"
+        self._file = open(self._temp_path, "wb")
+        self._file.write(MAGIC)
+
+    def _write_chunk(self, kind: str, values: List) -> Dict:
+        """Grava uma coluna de um grupo e devolve os seus metadados"""
+        present = [v for v in values if v is not None]
+        chunk = {
+            "offset": self._file.tell(),
+            "null_count": len(values) - len(present),
+            "min": min(present) if present else None,
+            "max": max(present) if present else None,
+        }
+
+        if chunk["null_count"]:
+            self._file.write(bytes(0 if v is None else 1 for v in values))
+
+        if kind == "string":
+            data = [v.encode("utf-8") if v is not None else b"" for v in values]
+            offsets = array.array("Q", [0])
+            for item in data:
+                offsets.append(offsets[-1] + len(item))
+            self._write_array(offsets)
+            self._file.write(b"".join(data))
+        else:
+            filler = float("nan") if kind == "float64" else 0
+            self._write_array(
+                array.array(
+                    FIXED_TYPECODES[kind], [filler if v is None else v for v in values]
+                )
+            )
+
+        chunk["nbytes"] = self._file.tell() - chunk["offset"]
+        return chunk
+
+    def _write_array(self, values: array.array):
+        """Grava um array em little-endian"""
+        if sys.byteorder == "big":
+            values.byteswap()
+        values.tofile(self._file)
+
+    def write_group(self, columns: Dict[str, Iterable]):
+        """
+        Grava um grupo de linhas
+
+        Args:
+            columns: {nome: valores} com todas as colunas do esquema
+        """
+        encoded = {
+            name: [_encode_value(kind, v) for v in columns[name]]
+            for name, kind in self.schema
+        }
+        row_count = len(encoded[self.schema[0][0]]) if self.schema else 0
+        if not row_count:
+            return
+        self.row_groups.append(
+            {
+                "row_count": row_count,
+                "columns": {
+                    name: self._write_chunk(kind, encoded[name])
+                    for name, kind in self.schema
+                },
+            }
+        )
+
+    def close(self) -> str:
+        """Grava o rodapé e publica o arquivo"""
+        footer = json.dumps(
+            {
+                "version": 1,
+                "schema": self.schema,
+                "row_count": sum(group["row_count"] for group in self.row_groups),
+                "row_groups": self.row_groups,
+            }
+        ).encode("utf-8")
+        self._file.write(footer)
+        self._file.write(FOOTER_SIZE.pack(len(footer)))
+        self._file.write(MAGIC)
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+        return self.path
+
+
+class ParquetFileWriter:
+    """Gravador Parquet com a mesma interface de ColumnarFileWriter"""
+
+    ARROW_TYPES = {"int64": "int64", "float64": "float64", "string": "string"}
+
+    def __init__(self, path: str, schema: List[tuple]):
+        self.path = path
+        self.schema = schema
+        self._writer = None
+        self._schema = None
+
+    def _arrow_schema(self):
+        if self._schema is None:
+            fields = []
+            for name, kind in self.schema:
+                if kind in self.ARROW_TYPES:
+                    arrow_type = getattr(pyarrow, self.ARROW_TYPES[kind])()
+                else:
+                    arrow_type = pyarrow.timestamp("s")
+                fields.append(pyarrow.field(name, arrow_type))
+            self._schema = pyarrow.schema(fields)
+        return self._schema
+
+    def write_group(self, columns):
+        """
+        Grava um grupo de linhas
+
+        Todo grupo é convertido para o esquema declarado: o tipo que o driver
+        infere a cada lote (int64 ou double, precisão do timestamp) pode
+        variar, e o ParquetWriter exige o mesmo esquema em todos os grupos.
+
+        Args:
+            columns: {nome: valores} ou pyarrow.RecordBatch
+        """
+        schema = self._arrow_schema()
+        if isinstance(columns, dict):
+            columns = pyarrow.RecordBatch.from_pydict(
+                {name: list(columns[name]) for name, _ in self.schema},
+                schema=schema,
+            )
+        else:
+            columns = pyarrow.RecordBatch.from_arrays(
+                [columns.column(field.name).cast(field.type) for field in schema],
+                schema=schema,
+            )
+        if columns.num_rows == 0:
+            return
+        if self._writer is None:
+            self._writer = parquet.ParquetWriter(
+                self.path, schema, write_statistics=True
+            )
+        self._writer.write_batch(columns, row_group_size=ROW_GROUP_SIZE)
+
+    def close(self) -> str:
+        if self._writer is not None:
+            self._writer.close()
+        else:
+            parquet.write_table(self._arrow_schema().empty_table(), self.path)
+        return self.path
+
+
+def open_writer(base_path: str, schema: List[tuple]):
+    """
+    Abre o gravador disponível: Parquet com pyarrow, senão .agcol
+
+    Args:
+        base_path: Caminho sem extensão
+        schema: Lista de (coluna, tipo); os lotes são gravados neste esquema
+    """
+    if parquet is not None:
+        return ParquetFileWriter(f"{base_path}.parquet", schema)
+    return ColumnarFileWriter(f"{base_path}.agcol", schema)
+
+
+def _read_footer(handle) -> Dict:
+    """Lê e valida o rodapé de um arquivo .agcol"""
+    handle.seek(-(FOOTER_SIZE.size + len(MAGIC)), os.SEEK_END)
+    (footer_size,) = FOOTER_SIZE.unpack(handle.read(FOOTER_SIZE.size))
+    if handle.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Arquivo não está no formato .agcol")
+    handle.seek(-(footer_size + FOOTER_SIZE.size + len(MAGIC)), os.SEEK_END)
+    return json.loads(handle.read(footer_size))
+
+
+def _read_chunk(handle, kind: str, chunk: Dict, row_count: int) -> List:
+    """Decodifica uma coluna de um grupo"""
+    handle.seek(chunk["offset"])
+    validity = handle.read(row_count) if chunk["null_count"] else None
+
+    if kind == "string":
+        offsets = array.array("Q")
+        offsets.frombytes(handle.read((row_count + 1) * offsets.itemsize))
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        data = handle.read(offsets[-1])
+        values = [
+            data[offsets[i] : offsets[i + 1]].decode("utf-8") for i in range(row_count)
+        ]
+    else:
+        values = array.array(FIXED_TYPECODES[kind])
+        values.frombytes(handle.read(row_count * values.itemsize))
+        if sys.byteorder == "big":
+            values.byteswap()
+        values = [_decode_value(kind, v) for v in values]
+
+    if validity is not None:
+        values = [v if valid else None for v, valid in zip(values, validity)]
+    return values
+
+
+def _group_matches(group: Dict, schema: Dict, ranges: Dict) -> bool:
+    """Usa min/max do grupo para decidir se ele pode ter linhas na faixa"""
+    for name, (low, high) in ranges.items():
+        chunk = group["columns"][name]
+        if chunk["min"] is None:
+            return False
+        if low is not None and chunk["max"] < _encode_value(schema[name], low):
+            return False
+        if high is not None and chunk["min"] > _encode_value(schema[name], high):
+            return False
+    return True
+
+
+def read_columnar(path: str, columns: List[str] = None, ranges: Dict = None) -> Dict:
+    """
+    Lê um arquivo .agcol ou .parquet, pulando grupos fora das faixas
+
+    No formato .agcol as faixas só descartam grupos inteiros (linhas de um
+    grupo lido não são filtradas); no Parquet o pyarrow também filtra linhas.
+
+    Args:
+        path: Arquivo a ler
+        columns: Colunas desejadas (padrão: todas)
+        ranges: {coluna: (mínimo, máximo)} para descartar grupos pelas estatísticas
+
+    Returns:
+        Dict: {coluna: lista de valores}
+    """
+    ranges = ranges or {}
+    if path.endswith(".parquet"):
+        filters = [
+            (name, op, _parse_date(value))
+            for name, (low, high) in ranges.items()
+            for op, value in ((">=", low), ("<=", high))
+            if value is not None
+        ]
+        table = parquet.read_table(path, columns=columns, filters=filters or None)
+        return table.to_pydict()
+
+    with open(path, "rb") as handle:
+        footer = _read_footer(handle)
+        schema = dict(footer["schema"])
+        columns = columns or list(schema)
+        result = {name: [] for name in columns}
+        for group in footer["row_groups"]:
+            if not _group_matches(group, schema, ranges):
+                continue
+            for name in columns:
+                result[name].extend(
+                    _read_chunk(
+                        handle, schema[name], group["columns"][name], group["row_count"]
+                    )
+                )
+    return result
+
+
+def _write_rows(base_path: str, rows: List[Dict], headers: List[str]) -> str:
+    """Grava linhas de relatório (resumo ou mensal) em um único grupo"""
+    writer = open_writer(base_path, infer_schema(rows, headers))
+    writer.write_group({name: [row.get(name) for row in rows] for name in headers})
+    return writer.close()
+
+
+def _write_row_stream(base_path: str, rows: Iterable[Dict], schema: List[tuple]) -> str:
+    """Grava linhas de relatório em fluxo, ROW_GROUP_SIZE linhas por grupo"""
+    writer = open_writer(base_path, schema)
+    names = [name for name, _ in schema]
+
+    def columns(group: List[Dict]) -> Dict[str, list]:
+        return {name: [item.get(name) for item in group] for name in names}
+
+    group = []
+    for row in rows:
+        group.append(row)
+        if len(group) >= ROW_GROUP_SIZE:
+            writer.write_group(columns(group))
+            group = []
+    writer.write_group(columns(group))
+    return writer.close()
+
+
+def export_detail_columnar(base_path: str = None) -> str:
+    """
+    Exporta todos os registros (com ROI) em grupos de linhas
+
+    Lê o banco em lotes colunares: com pyarrow, direto em Arrow; sem ele, em
+    arrays tipados. Nenhum dos caminhos cria um dicionário por registro. Os
+    shards são lidos um depois do outro.
+
+    Returns:
+        str: Caminho do arquivo gravado
+    """
+    if base_path is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base_path = os.path.join(ensure_data_directory(), f"agricultural_data_{timestamp}")
+
+    writer = open_writer(base_path, DETAIL_SCHEMA)
+    for batch in db.stream_across_shards(
+        db.stream_agricultural_production_columns,
+        batch_size=ROW_GROUP_SIZE,
+        arrow=parquet is not None,
+    ):
+        writer.write_group(batch)
+    return writer.close()
+
+
+def export_summary_columnar(base_path: str = None) -> str:
+    """Exporta o resumo por produto (mesmas colunas do CSV)"""
+    if base_path is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base_path = os.path.join(
+            ensure_data_directory(), f"agricultural_summary_{timestamp}"
+        )
+
+    summaries = report_cache.get_or_stream("product_summary", summarize_by_product)
+    return _write_row_stream(base_path, summaries, SUMMARY_SCHEMA)
+
+
+def export_monthly_columnar(base_path: str = None) -> str:
+    """Exporta a análise mensal (mesmas colunas do CSV)"""
+    if base_path is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base_path = os.path.join(ensure_data_directory(), f"monthly_analysis_{timestamp}")
+
+    return _write_rows(base_path, monthly_analysis_rows(), MONTHLY_HEADERS)
+
+
+def export_all_columnar() -> bool:
+    """
+    Exporta detalhe, resumo e análise mensal no formato colunar
+
+    Returns:
+        bool: True se todas as exportações foram bem-sucedidas
+    """
+    try:
+        for label, export in (
+            ("Dados completos", export_detail_columnar),
+            ("Resumo por produto", export_summary_columnar),
+            ("Análise mensal", export_monthly_columnar),
+        ):
+            path = export()
+            print(f"✅ {label}: {path} ({os.path.getsize(path) / 1024:.1f} KB)")
+        return True
+
+    except db.INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"❌ Erro na exportação colunar: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    export_all_columnar()
@@ -1,6 +1,22 @@
+import array
+import asyncio
+import contextvars
+import heapq
+import json
+import os
+import threading
+import time
 import oracledb
-from datetime import datetime
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator, List, Dict, Optional
+
+try:
+    import pyarrow
+except ImportError:  # Arrow fetch is optional
+    pyarrow = None
 
 
 DB_CONFIG = {
@@ -9,99 +25,1888 @@ DB_CONFIG = {
     "sid": "ORCL",
     "username": "rm566925",
     "password": "fiap25",
+    # Connection pool size and per-connection statement cache size
+    "pool_min": 1,
+    "pool_max": 4,
+    "stmtcachesize": 40,
+    # Deadlines (seconds): longest wait for a pooled connection and longest
+    # single round trip when no db.deadline() block is active
+    "acquire_timeout": 10,
+    "call_timeout": 60,
+    # Statements slower than this are written to the slow query log
+    "slow_query_seconds": 1.0,
+}
+
+# Shards: each farm's records live in exactly one database. Add capacity by
+# adding an entry here (same keys as DB_CONFIG) and assigning farms to it in
+# FARM_SHARDS; farms not listed stay on DEFAULT_SHARD.
+DEFAULT_SHARD = "default"
+DEFAULT_FARM = "default"
+SHARDS = {DEFAULT_SHARD: DB_CONFIG}
+FARM_SHARDS = {}
+
+
+RECORD_COLUMNS_SQL = """id, product_id, product_name, quantity, sale_price,
+               cost_price, planting_date, harvest_date, production_status,
+               created_at, updated_at"""
+
+# Canonical SQL registry: every statement the application runs has a stable
+# text and bind names, so each one is hard parsed once and then served from
+# the driver statement cache of the pooled connection.
+STATEMENTS = {
+    "count_all": "SELECT COUNT(*) FROM agricultural_production_base",
+    # Covers archived records too, so id partitions span the whole history
+    "id_bounds": """
+        SELECT MIN(id), MAX(id), COUNT(*)
+        FROM (SELECT id FROM agricultural_production_base
+              UNION ALL
+              SELECT id FROM agricultural_production_archive)
+        """,
+    "insert": """
+        INSERT INTO agricultural_production_base
+        (product_id, quantity, sale_price, cost_price, planting_date, harvest_date,
+         production_status, farm_id)
+        VALUES (:product_id, :quantity, :sale_price, :cost_price,
+                :planting_date, :harvest_date, :production_status, :farm_id)
+        """,
+    "insert_returning_id": """
+        BEGIN
+            INSERT INTO agricultural_production_base
+            (product_id, quantity, sale_price, cost_price, planting_date, harvest_date,
+             production_status, farm_id)
+            VALUES (:product_id, :quantity, :sale_price, :cost_price,
+                    :planting_date, :harvest_date, :production_status, :farm_id)
+            RETURNING id INTO :new_id;
+
+            UPDATE production_data_version SET change_counter = change_counter + 1;
+        END;
+        """,
+    "bump_data_version": """
+        UPDATE production_data_version SET change_counter = change_counter + 1
+        """,
+    "data_version": """
+        SELECT (SELECT COUNT(*) FROM agricultural_production_base),
+               (SELECT MAX(updated_at) FROM agricultural_production_base),
+               (SELECT change_counter FROM production_data_version)
+        FROM dual
+        """,
+    "select_all": f"""
+        SELECT {RECORD_COLUMNS_SQL}
+        FROM agricultural_production
+        ORDER BY created_at DESC
+        """,
+    # Keyset pagination on (created_at, id), newest first
+    "page_first": f"""
+        SELECT {RECORD_COLUMNS_SQL}
+        FROM agricultural_production
+        ORDER BY created_at DESC, id DESC
+        FETCH FIRST :page_size ROWS ONLY
+        """,
+    "page_after": f"""
+        SELECT {RECORD_COLUMNS_SQL}
+        FROM agricultural_production
+        WHERE created_at < :cursor_created_at
+           OR (created_at = :cursor_created_at AND id < :cursor_id)
+        ORDER BY created_at DESC, id DESC
+        FETCH FIRST :page_size ROWS ONLY
+        """,
+    "page_before": f"""
+        SELECT {RECORD_COLUMNS_SQL}
+        FROM agricultural_production
+        WHERE created_at > :cursor_created_at
+           OR (created_at = :cursor_created_at AND id > :cursor_id)
+        ORDER BY created_at ASC, id ASC
+        FETCH FIRST :page_size ROWS ONLY
+        """,
+    "page_from_date": f"""
+        SELECT {RECORD_COLUMNS_SQL}
+        FROM agricultural_production
+        WHERE created_at < :date_limit
+        ORDER BY created_at DESC, id DESC
+        FETCH FIRST :page_size ROWS ONLY
+        """,
+    "update_returning": """
+        DECLARE
+            v_product_id NUMBER;
+        BEGIN
+            SELECT f.id, p.product_name, f.quantity, f.sale_price, f.cost_price,
+                   f.planting_date, f.harvest_date, f.production_status,
+                   f.created_at, f.updated_at
+              INTO :old_id, :old_product_name, :old_quantity, :old_sale_price,
+                   :old_cost_price, :old_planting_date, :old_harvest_date,
+                   :old_production_status, :old_created_at, :old_updated_at
+              FROM agricultural_production_base f
+              JOIN products p ON p.product_id = f.product_id
+             WHERE f.id = :record_id
+               FOR UPDATE OF f.id;
+
+            UPDATE agricultural_production_base
+               SET product_id = NVL(:product_id, product_id),
+                   quantity = NVL(:quantity, quantity),
+                   sale_price = NVL(:sale_price, sale_price),
+                   cost_price = NVL(:cost_price, cost_price),
+                   planting_date = NVL(:planting_date, planting_date),
+                   harvest_date = NVL(:harvest_date, harvest_date),
+                   production_status = NVL(:production_status, production_status),
+                   updated_at = SYSTIMESTAMP
+             WHERE id = :record_id
+               AND (:expected_updated_at IS NULL
+                    OR updated_at = :expected_updated_at)
+            RETURNING id, product_id, quantity, sale_price, cost_price,
+                      planting_date, harvest_date, production_status,
+                      created_at, updated_at
+                 INTO :new_id, v_product_id, :new_quantity, :new_sale_price,
+                      :new_cost_price, :new_planting_date, :new_harvest_date,
+                      :new_production_status, :new_created_at, :new_updated_at;
+
+            :row_count := SQL%ROWCOUNT;
+            IF :row_count > 0 THEN
+                :new_product_name := product_name_of(v_product_id);
+                UPDATE production_data_version
+                   SET change_counter = change_counter + 1;
+            END IF;
+        EXCEPTION
+            WHEN NO_DATA_FOUND THEN
+                :row_count := -1;
+        END;
+        """,
+    "delete_returning": """
+        DECLARE
+            v_product_id NUMBER;
+        BEGIN
+            DELETE FROM agricultural_production_base
+             WHERE id = :record_id
+               AND (:expected_updated_at IS NULL
+                    OR updated_at = :expected_updated_at)
+            RETURNING id, product_id, quantity, sale_price, cost_price,
+                      planting_date, harvest_date, production_status,
+                      created_at, updated_at
+                 INTO :old_id, v_product_id, :old_quantity, :old_sale_price,
+                      :old_cost_price, :old_planting_date, :old_harvest_date,
+                      :old_production_status, :old_created_at, :old_updated_at;
+
+            :row_count := SQL%ROWCOUNT;
+            IF :row_count = 0 THEN
+                SELECT COUNT(*) INTO :still_exists
+                  FROM agricultural_production_base
+                 WHERE id = :record_id;
+            ELSE
+                :old_product_name := product_name_of(v_product_id);
+                UPDATE production_data_version
+                   SET change_counter = change_counter + 1;
+            END IF;
+        END;
+        """,
+    # Product dimension: finds or adds a product by its case-folded key. A
+    # concurrent writer adding the same product makes the insert fail on the
+    # unique key, and the row it added is read instead.
+    "product_upsert": """
+        BEGIN
+            SELECT product_id, product_name INTO :product_id, :canonical_name
+              FROM products WHERE search_key = :search_key;
+        EXCEPTION
+            WHEN NO_DATA_FOUND THEN
+                BEGIN
+                    INSERT INTO products (product_name, search_key)
+                    VALUES (:product_name, :search_key)
+                    RETURNING product_id, product_name INTO :product_id, :canonical_name;
+                EXCEPTION
+                    WHEN DUP_VAL_ON_INDEX THEN
+                        SELECT product_id, product_name INTO :product_id, :canonical_name
+                          FROM products WHERE search_key = :search_key;
+                END;
+        END;
+        """,
+    "products_all": "SELECT product_id, product_name, search_key FROM products",
+    # Claims a write journal entry; no row inserted means it was applied before
+    "journal_claim": """
+        INSERT INTO production_journal_applied (idempotency_key, operation)
+        SELECT :idempotency_key, :operation FROM dual
+        WHERE NOT EXISTS (SELECT 1 FROM production_journal_applied
+                          WHERE idempotency_key = :idempotency_key)
+        """,
+    # Undo a rejected journal entry without losing the rest of its batch
+    "journal_savepoint": "SAVEPOINT journal_entry",
+    "journal_rollback_entry": "ROLLBACK TO SAVEPOINT journal_entry",
+}
+
+# Derived ROI (%) with the same rules as export_csv.calculate_metrics; the
+# text must match the function-based index idx_agri_prod_roi exactly
+ROI_SQL = (
+    "CASE WHEN cost_price > 0 AND sale_price > 0 "
+    "THEN (sale_price - cost_price) / cost_price * 100 ELSE 0 END"
+)
+
+# Columns accepted by the range search, in the fixed order used to build
+# statement shapes
+RANGE_COLUMNS = {
+    "id": "id",
+    "planting_date": "planting_date",
+    "harvest_date": "harvest_date",
+    "quantity": "quantity",
+    "cost_price": "cost_price",
+    "sale_price": "sale_price",
+    "roi": ROI_SQL,
+}
+
+SORT_COLUMNS = dict(RANGE_COLUMNS, created_at="created_at", product_name="product_name")
+
+# Closed records moved out of the hot table by archive.py. Every archived row
+# is SOLD and has harvest_date < production_archive_state.archive_horizon.
+ARCHIVE_TABLE = "agricultural_production_archive"
+
+# One pool per shard, and the shard used by get_connection() in the current
+# thread or task (set with use_shard / use_farm)
+_pools = {}
+_current_shard = contextvars.ContextVar("current_shard", default=DEFAULT_SHARD)
+
+# Per-statement execution counters and, for each pooled session, an LRU
+# mirror of the driver statement cache used to estimate hit rates
+_statement_stats = {}
+_session_caches = {}
+
+# Callbacks notified after each committed create/update/delete
+_write_listeners = []
+
+# Per-statement round-trip limits (seconds) overriding DB_CONFIG["call_timeout"]
+# for operations known to run long
+STATEMENT_TIMEOUTS = {
+    "rollup_rebuild": 600,
+    "archive_batch": 300,
+    "changes_purge": 300,
 }
 
+# Absolute time.monotonic() deadline of the current operation (db.deadline)
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+# Connections with a statement executing right now, for cancel_running()
+_running = {}
+_running_lock = threading.Lock()
+
+SLOW_QUERY_LOG = os.path.join(
+    os.path.dirname(__file__), "..", "data", "logs", "slow_queries.log"
+)
+_slow_log_lock = threading.Lock()
+
+
+class QueryTimeout(TimeoutError):
+    """A statement or pool acquire exceeded its deadline"""
+
+
+class QueryCancelled(Exception):
+    """A running statement was cancelled (see cancel_running)"""
+
+
+# Raised on purpose (deadline reached, Ctrl-C): handlers that turn database
+# errors into empty results re-raise these so the caller can report them
+INTERRUPTIONS = (QueryTimeout, QueryCancelled)
+
+
+# Product dimension cache per shard: (shard, search key) -> product id and
+# (shard, product id) -> canonical name. Products are never renamed or
+# removed, so entries never go stale.
+_product_ids = {}
+_product_names = {}
+
+
+def get_pool(shard: str = None):
+    """
+    Get (creating on first use) the connection pool of a shard
+
+    Args:
+        shard: Key of SHARDS (default: the current shard)
+    """
+    shard = shard or _current_shard.get()
+    if shard not in _pools:
+        config = SHARDS[shard]
+        dsn = f"{config['host']}:{config['port']}/{config['sid']}"
+        _pools[shard] = oracledb.create_pool(
+            user=config["username"],
+            password=config["password"],
+            dsn=dsn,
+            min=config["pool_min"],
+            max=config["pool_max"],
+            increment=1,
+            stmtcachesize=config["stmtcachesize"],
+            # Wait at most acquire_timeout for a free connection
+            getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+            wait_timeout=int(config["acquire_timeout"] * 1000),
+        )
+    return _pools[shard]
+
+
+def get_connection(shard: str = None):
+    """Get database connection (released back to the pool on close)"""
+    try:
+        _remaining_seconds()
+        connection = get_pool(shard).acquire()
+        _apply_call_timeout(connection)
+        return connection
+    except INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
+        return None
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Bound the total time of the database calls made inside the block
+
+    Each round trip gets the time left as its driver call timeout, so a slow
+    statement fails with QueryTimeout instead of hanging. Nested blocks can
+    only shorten the deadline.
+
+    Example:
+        with db.deadline(5):
+            rows = db.search_agricultural_production("milho")
+    """
+    limit = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(limit if current is None else min(current, limit))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _remaining_seconds(name: str = None) -> float:
+    """
+    Time allowed for the next round trip
+
+    The statement's own limit (STATEMENT_TIMEOUTS, else call_timeout),
+    shortened to the time left in the current db.deadline block.
+    """
+    allowed = STATEMENT_TIMEOUTS.get(name, SHARDS[current_shard()]["call_timeout"])
+    limit = _deadline.get()
+    if limit is None:
+        return allowed
+    remaining = limit - time.monotonic()
+    if remaining <= 0:
+        raise QueryTimeout("Operation deadline exceeded")
+    return min(allowed, remaining)
+
+
+def _apply_call_timeout(connection, name: str = None):
+    """Set the driver call timeout of the next round trips"""
+    # At least 1 ms: 0 would mean "no timeout" to the driver
+    connection.call_timeout = max(1, int(_remaining_seconds(name) * 1000))
+
+
+def cancel_running() -> int:
+    """
+    Cancel every statement currently executing (e.g. on Ctrl-C)
+
+    The sessions stay usable: the interrupted call raises QueryCancelled and
+    the connection goes back to the pool as usual.
+
+    Returns:
+        int: Number of statements cancelled
+    """
+    # Runs from the SIGINT handler, possibly while the main thread holds
+    # _running_lock in tracked_statement: taking it here would deadlock, and
+    # copying the values is a single step under the GIL
+    connections = list(_running.values())
+    for connection in connections:
+        try:
+            connection.cancel()
+        except Exception as e:
+            print(f"Error cancelling statement: {e}")
+    return len(connections)
+
+
+def shard_for_farm(farm_id: str = None) -> str:
+    """Shard that owns a farm's records"""
+    return FARM_SHARDS.get(farm_id or DEFAULT_FARM, DEFAULT_SHARD)
+
+
+def current_shard() -> str:
+    """Shard used by get_connection() in the current context"""
+    return _current_shard.get()
+
+
+@contextmanager
+def use_shard(shard: str):
+    """
+    Route every database call made inside the block to a shard
+
+    Example:
+        with db.use_shard("north"):
+            rows = db.read_all_agricultural_production()
+    """
+    if shard not in SHARDS:
+        raise KeyError(f"Unknown shard: {shard}")
+    token = _current_shard.set(shard)
+    try:
+        yield shard
+    finally:
+        _current_shard.reset(token)
+
+
+def use_farm(farm_id: str):
+    """Route every database call made inside the block to the farm's shard"""
+    return use_shard(shard_for_farm(farm_id))
+
+
+def scatter_gather(function, *args, shards: List[str] = None, **kwargs) -> Dict:
+    """
+    Run a function once per shard, in parallel threads
+
+    Each call runs inside use_shard, so the db functions it calls reach that
+    shard, and sees the caller's context variables (e.g. deadline). The
+    function must consume its results before returning: a generator returned
+    unconsumed would be read later on the caller's shard.
+
+    Args:
+        function: Called as function(*args, **kwargs)
+        shards: Shards to query (default: all of SHARDS)
+
+    Returns:
+        Dict: Result of each shard, keyed by shard name
+
+    Raises:
+        Exception: The first error raised by a shard
+    """
+    shards = list(shards or SHARDS)
+
+    def run(shard):
+        with use_shard(shard):
+            return function(*args, **kwargs)
+
+    if len(shards) == 1:
+        return {shards[0]: run(shards[0])}
+
+    # Worker threads start with an empty context: each task runs in a copy of
+    # the caller's, so deadline() and the other context variables carry over
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        futures = {
+            shard: executor.submit(contextvars.copy_context().run, run, shard)
+            for shard in shards
+        }
+    return {shard: future.result() for shard, future in futures.items()}
+
+
+def read_across_shards(
+    function, *args, sort_key=None, reverse: bool = False, **kwargs
+) -> List[Dict]:
+    """
+    Run a list-returning read on every shard and merge the results
+
+    Ids are only unique within a shard, so each record gets a 'shard' key.
+
+    Args:
+        function: Read returning a list of records (e.g.
+            read_all_agricultural_production, search_agricultural_production)
+        sort_key: Key the function already orders its results by; the
+            per-shard lists are merged keeping that order (None: concatenate)
+        reverse: True when the function orders descending
+
+    Returns:
+        List[Dict]: Records of all shards
+    """
+    results = scatter_gather(function, *args, **kwargs)
+    for shard, rows in results.items():
+        for row in rows:
+            row["shard"] = shard
+
+    if sort_key is None:
+        return [row for rows in results.values() for row in rows]
+    return list(heapq.merge(*results.values(), key=sort_key, reverse=reverse))
+
+
+def read_by_id_across_shards(record_id: int) -> List[Dict]:
+    """
+    Read the records with an id on every shard
+
+    Returns:
+        List[Dict]: At most one record per shard, each with a 'shard' key
+    """
+
+    def read_one():
+        record = read_agricultural_production_by_id(record_id)
+        return [record] if record else []
+
+    return read_across_shards(read_one)
+
+
+def sort_key(column: str):
+    """
+    Python sort key matching "ORDER BY column, id" in SQL
+
+    NULLs compare greater than any value, as in Oracle, so per-shard results
+    can be merged in the order each shard returned them. Ids repeat across
+    shards, so rows of different shards with equal values are ordered by
+    their 'shard' key before the id.
+    """
+
+    def key(row):
+        value = row[column]
+        return (
+            value is None,
+            value if value is not None else 0,
+            row.get("shard", ""),
+            row["id"],
+        )
+
+    return key
+
+
+# Greater than any identity value, so "id < _ID_LIMIT" matches every id
+_ID_LIMIT = 10 ** 38
+
+
+def _shard_page_cursor(cursor: tuple, shard: str) -> Optional[tuple]:
+    """
+    (created_at, id) cursor of one shard for a cross-shard page cursor
+
+    The merged order is (created_at, shard, id). Records of another shard
+    created at the cursor's instant are all on one side of it: shards sorting
+    before the cursor's shard come after it (older) and shards sorting after
+    it come before it (newer), so only the cursor's own shard compares ids.
+    """
+    if cursor is None:
+        return None
+    created_at, cursor_shard, record_id = cursor
+    if shard == cursor_shard:
+        return (created_at, record_id)
+    return (created_at, _ID_LIMIT if shard < cursor_shard else 0)
+
+
+def read_page_across_shards(
+    page_size: int = 20,
+    after: tuple = None,
+    before: tuple = None,
+    from_date: str = None,
+) -> Dict:
+    """
+    Read one page of records of every shard, newest first
+
+    Each shard reads its own page (read_agricultural_production_page) and the
+    pages are merged by (created_at, shard, id). Ids are only unique within a
+    shard, so the cursors carry the shard too.
+
+    Args:
+        page_size: Number of records per page
+        after: (created_at, shard, id) of the last record of the current
+            page, to read the next (older) page
+        before: (created_at, shard, id) of the first record of the current
+            page, to read the previous (newer) page
+        from_date: Jump to records created on or before this 'YYYY-MM-DD' date
+
+    Returns:
+        Dict: {"records": [...], "has_more": bool}, each record with a
+        'shard' key
+    """
+
+    def read_shard_page():
+        shard = current_shard()
+        return read_agricultural_production_page(
+            page_size,
+            _shard_page_cursor(after, shard),
+            _shard_page_cursor(before, shard),
+            from_date,
+        )
+
+    pages = scatter_gather(read_shard_page)
+    for shard, page in pages.items():
+        for record in page["records"]:
+            record["shard"] = shard
+
+    records = list(
+        heapq.merge(
+            *(page["records"] for page in pages.values()),
+            key=sort_key("created_at"),
+            reverse=True,
+        )
+    )
+    has_more = len(records) > page_size or any(
+        page["has_more"] for page in pages.values()
+    )
+    # Previous pages keep the records nearest to the cursor: the oldest ones
+    records = records[-page_size:] if before else records[:page_size]
+    return {"records": records, "has_more": has_more}
+
+
+def iterate_on_shard(shard: str, function, *args, **kwargs) -> Iterator:
+    """
+    Consume a generator function on a shard, from any thread
+
+    use_shard only covers the block (and thread) it runs in, while streams
+    are often read elsewhere: stage_pipeline reads them in a thread of its
+    own. Here each step of the generator runs inside use_shard, and the
+    caller's shard is restored before every yield.
+
+    Args:
+        shard: Key of SHARDS
+        function: Generator function, called as function(*args, **kwargs)
+    """
+    with use_shard(shard):
+        iterator = function(*args, **kwargs)
+    try:
+        while True:
+            with use_shard(shard):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        with use_shard(shard):
+            iterator.close()
+
+
+def stream_across_shards(
+    function, *args, shards: List[str] = None, **kwargs
+) -> Iterator:
+    """
+    Chain a streaming read over every shard, one shard after the other
+
+    Args:
+        function: Generator function (e.g. stream_agricultural_production)
+        shards: Shards to read (default: all of SHARDS, in order)
+
+    Yields:
+        The items of each shard's stream (without a 'shard' key: use
+        iterate_on_shard when the caller needs to know the shard)
+    """
+    for shard in shards or SHARDS:
+        yield from iterate_on_shard(shard, function, *args, **kwargs)
+
+
+def add_write_listener(callback):
+    """
+    Register a callback notified after each committed write
+
+    Args:
+        callback: Called as callback(operation, before, after) where
+            operation is 'insert', 'update' or 'delete' and before/after are
+            record dictionaries (None when not applicable)
+    """
+    if callback not in _write_listeners:
+        _write_listeners.append(callback)
+
+
+def _notify_write(operation: str, before: Optional[Dict], after: Optional[Dict]):
+    """Notify write listeners; their failures never undo the write"""
+    for callback in _write_listeners:
+        try:
+            callback(operation, before, after)
+        except Exception as e:
+            print(f"Error in write listener: {e}")
+
+
+def register_statement(name: str, sql: str) -> str:
+    """
+    Add a statement to the registry, keeping the first text registered
+
+    Args:
+        name: Registry key of the statement
+        sql: Statement text
+
+    Returns:
+        str: The registered statement name
+    """
+    STATEMENTS.setdefault(name, sql)
+    return name
+
+
+def _record_execution(connection, name: str):
+    """
+    Count an execution and whether it would hit the statement cache
+
+    The driver does not expose its cache hits, so an LRU per session, sized
+    like the statement cache of the current shard's pool, decides: a miss
+    counts as an estimated parse.
+    """
+    stats = _statement_stats.setdefault(name, {"executions": 0, "parses": 0})
+    stats["executions"] += 1
+
+    # Pooled sessions outlive the Connection wrapper returned by acquire()
+    session_key = id(getattr(connection, "_impl", connection))
+    cache = _session_caches.setdefault(session_key, OrderedDict())
+    if name in cache:
+        cache.move_to_end(name)
+    else:
+        stats["parses"] += 1
+        cache[name] = True
+        if len(cache) > SHARDS[current_shard()]["stmtcachesize"]:
+            cache.popitem(last=False)
+
+
+def _interruption(error: Exception, name: str, connection) -> Optional[Exception]:
+    """QueryTimeout or QueryCancelled matching a driver error (None otherwise)"""
+    if not isinstance(error, oracledb.Error):
+        return None
+    code = getattr(error.args[0], "full_code", "") if error.args else ""
+    if code in ("DPY-4024", "ORA-03156"):
+        return QueryTimeout(
+            f"Statement '{name}' exceeded its "
+            f"{connection.call_timeout / 1000:.1f}s deadline"
+        )
+    if code == "ORA-01013":
+        return QueryCancelled(f"Statement '{name}' cancelled")
+    return None
+
+
+@contextmanager
+def tracked_statement(cursor, name: str, params=None, connection=None):
+    """
+    Track a statement from its execute to its last fetch
+
+    While the block runs the connection is registered for cancel_running,
+    so Ctrl-C interrupts fetches as well as the execute. Driver timeouts and
+    cancellations raised by any round trip become QueryTimeout and
+    QueryCancelled, and the total time, with the rows actually fetched, is
+    checked against the slow query threshold. For streams the time includes
+    the consumer's work between batches. Nested blocks on the same
+    connection are tracked by the outermost one.
+
+    Args:
+        cursor: Cursor running the statement (None for connection-level fetches)
+        name: Registry key of the statement
+        params: Bind values (only their names and kinds are logged)
+        connection: Connection, when no cursor is given
+
+    Yields:
+        Dict: {"rows": None}; set "rows" when the cursor cannot count them
+
+    Example:
+        with db.tracked_statement(cursor, "select_all"):
+            db.execute_statement(cursor, "select_all")
+            for rows in db.fetch_batches(cursor, "select_all"):
+                ...
+    """
+    connection = connection or cursor.connection
+    key = id(connection)
+    with _running_lock:
+        nested = key in _running
+        _running[key] = connection
+    progress = {"rows": None}
+    if nested:
+        yield progress
+        return
+
+    started = time.perf_counter()
+    try:
+        yield progress
+    except oracledb.Error as e:
+        interruption = _interruption(e, name, connection)
+        if interruption is None:
+            raise
+        raise interruption from e
+    finally:
+        elapsed = time.perf_counter() - started
+        with _running_lock:
+            _running.pop(key, None)
+        if elapsed >= SHARDS[current_shard()]["slow_query_seconds"]:
+            row_count = progress["rows"]
+            if row_count is None and cursor is not None:
+                try:
+                    row_count = cursor.rowcount
+                except Exception:
+                    row_count = None
+            _log_slow_query(name, params, elapsed, row_count)
+
+
+def execute_statement(cursor, name: str, params=None):
+    """
+    Execute a registered statement on the given cursor
+
+    The execute is tracked on its own (tracked_statement) unless it runs
+    inside a tracked_statement block, which then also covers the fetches.
+
+    Args:
+        cursor: Open cursor
+        name: Registry key of the statement
+        params: Bind values (sequence or dictionary)
+
+    Returns:
+        The cursor, ready for fetching
+    """
+    connection = cursor.connection
+    _record_execution(connection, name)
+    _apply_call_timeout(connection, name)
+
+    with tracked_statement(cursor, name, params):
+        if params is None:
+            return cursor.execute(STATEMENTS[name])
+        return cursor.execute(STATEMENTS[name], params)
+
+
+def fetch_batches(cursor, name: str) -> Iterator[list]:
+    """
+    Fetch the remaining rows of a statement, one round trip per batch
+
+    Each round trip gets the time left in the current db.deadline block.
+    Use inside tracked_statement so the fetches are cancellable and timed.
+
+    Args:
+        cursor: Cursor with an executed query (batch size: cursor.arraysize)
+        name: Registry key of the statement
+
+    Yields:
+        list: Rows of one round trip
+    """
+    while True:
+        _apply_call_timeout(cursor.connection, name)
+        rows = cursor.fetchmany()
+        if not rows:
+            return
+        yield rows
+
+
+def fetchall_statement(cursor, name: str, params=None) -> List[tuple]:
+    """
+    Execute a registered query and fetch all of its rows, tracked as one statement
+
+    Returns:
+        List[tuple]: Every row (column names in cursor.description)
+    """
+    with tracked_statement(cursor, name, params):
+        execute_statement(cursor, name, params)
+        rows = []
+        for batch in fetch_batches(cursor, name):
+            rows.extend(batch)
+        return rows
+
+
+def fetchone_statement(cursor, name: str, params=None) -> Optional[tuple]:
+    """Execute a registered query and fetch its first row, tracked as one statement"""
+    with tracked_statement(cursor, name, params):
+        execute_statement(cursor, name, params)
+        _apply_call_timeout(cursor.connection, name)
+        return cursor.fetchone()
+
+
+def _bind_summary(params) -> Dict:
+    """Bind names and kinds, without values (they may hold personal data)"""
+    if params is None:
+        return {}
+    if not isinstance(params, dict):
+        return {"positional": len(params)}
+    summary = {}
+    for bind, value in params.items():
+        if isinstance(value, (list, tuple)):
+            summary[bind] = f"list[{len(value)}]"
+        elif hasattr(value, "getvalue"):
+            summary[bind] = "out"
+        else:
+            summary[bind] = type(value).__name__
+    return summary
+
+
+def _log_slow_query(name: str, params, elapsed: float, row_count: Optional[int]):
+    """Append one statement to the slow query log (JSON lines)"""
+    entry = {
+        "logged_at": datetime.now().isoformat(timespec="seconds"),
+        "shard": current_shard(),
+        "statement": name,
+        "sql": " ".join(STATEMENTS[name].split())[:500],
+        "binds": _bind_summary(params),
+        "elapsed": round(elapsed, 3),
+        "row_count": row_count,
+    }
+    try:
+        with _slow_log_lock:
+            os.makedirs(os.path.dirname(SLOW_QUERY_LOG), exist_ok=True)
+            with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as log:
+                log.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"Error writing slow query log: {e}")
+
+
+def get_slow_query_report(limit: int = 10) -> List[Dict]:
+    """
+    Summarize the slow query log by statement
+
+    Args:
+        limit: Number of statements to report
+
+    Returns:
+        List[Dict]: statement, count, total, max and average elapsed seconds,
+        and the largest row count seen; highest total time first
+    """
+    summary = {}
+    try:
+        with open(SLOW_QUERY_LOG, "r", encoding="utf-8") as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                stats = summary.setdefault(
+                    entry["statement"],
+                    {"statement": entry["statement"], "count": 0, "total": 0.0,
+                     "max": 0.0, "max_rows": 0},
+                )
+                stats["count"] += 1
+                stats["total"] += entry["elapsed"]
+                stats["max"] = max(stats["max"], entry["elapsed"])
+                stats["max_rows"] = max(stats["max_rows"], entry["row_count"] or 0)
+    except FileNotFoundError:
+        return []
+
+    report = sorted(summary.values(), key=lambda stats: stats["total"], reverse=True)
+    for stats in report:
+        stats["total"] = round(stats["total"], 3)
+        stats["average"] = round(stats["total"] / stats["count"], 3)
+    return report[:limit]
+
+
+def print_slow_query_report(limit: int = 10):
+    """Print the slowest statements of the slow query log"""
+    report = get_slow_query_report(limit)
+    if not report:
+        print("No slow queries logged")
+        return
+    print(f"{'Statement':<30} {'Count':>6} {'Total s':>9} {'Avg s':>7} {'Max s':>7} {'Rows':>8}")
+    for entry in report:
+        print(
+            f"{entry['statement']:<30} {entry['count']:>6} {entry['total']:>9.2f} "
+            f"{entry['average']:>7.2f} {entry['max']:>7.2f} {entry['max_rows']:>8}"
+        )
+
+
+def get_statement_cache_report() -> List[Dict]:
+    """
+    Report executions and estimated parses and cache hit rate of each statement
+
+    Parses and hit rates come from the LRU mirror in _record_execution, not
+    from the server: they assume the driver cache evicts the same way and
+    ignore parses the server avoids on its own (session cursor cache). Use
+    v$mystat ('parse count (hard)') for real figures when the account can
+    read it.
+
+    Returns:
+        List[Dict]: One entry per executed statement, most executed first
+    """
+    report = []
+    for name, stats in _statement_stats.items():
+        executions = stats["executions"]
+        hits = executions - stats["parses"]
+        report.append(
+            {
+                "statement": name,
+                "executions": executions,
+                "estimated_parses": stats["parses"],
+                "estimated_hit_rate": (
+                    round(hits / executions * 100, 1) if executions else 0
+                ),
+            }
+        )
+    report.sort(key=lambda entry: entry["executions"], reverse=True)
+    return report
+
+
+def print_statement_cache_report():
+    """Print the statement cache report (parses and hit rates are estimates)"""
+    print(f"{'Statement':<30} {'Exec':>8} {'~Parses':>8} {'~Hit %':>7}")
+    for entry in get_statement_cache_report():
+        print(
+            f"{entry['statement']:<30} {entry['executions']:>8} "
+            f"{entry['estimated_parses']:>8} {entry['estimated_hit_rate']:>7.1f}"
+        )
+    print("(~ estimated from a client-side LRU of the driver statement cache)")
+
+
+def get_data_version() -> Optional[tuple]:
+    """
+    Cheap fingerprint of the table contents
+
+    Combines the row count, the latest updated_at and the change counter
+    bumped by every write function, so any committed write changes it.
+
+    Returns:
+        Optional[tuple]: (row_count, max_updated_at, change_counter), or None
+        if the database cannot be reached
+    """
+    connection = get_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor()
+        return tuple(fetchone_statement(cursor, "data_version"))
+
+    except INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"Error reading data version: {e}")
+        return None
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def get_data_versions() -> Optional[tuple]:
+    """
+    Data version of every shard, read in parallel (see get_data_version)
+
+    Returns:
+        Optional[tuple]: (shard, version) pairs in SHARDS order, or None if
+        any shard cannot be reached
+    """
+    versions = scatter_gather(get_data_version)
+    if any(version is None for version in versions.values()):
+        return None
+    return tuple(versions.items())
+
+
+def product_search_key(product_name: str) -> str:
+    """Case-folded key of a product name (spacing and case are ignored)"""
+    return " ".join(product_name.split()).upper()
+
+
+def _cache_product(product_id: int, product_name: str, search_key: str = None):
+    """Store a product in the dimension cache of the current shard"""
+    shard = current_shard()
+    _product_ids[(shard, search_key or product_search_key(product_name))] = product_id
+    _product_names[(shard, product_id)] = product_name
+
+
+def load_product_cache() -> int:
+    """
+    Load the whole product dimension of the current shard into the cache
+
+    Returns:
+        int: Number of products loaded
+    """
+    connection = get_connection()
+    if not connection:
+        return 0
+
+    try:
+        cursor = connection.cursor()
+        rows = fetchall_statement(cursor, "products_all")
+        for product_id, product_name, search_key in rows:
+            _cache_product(product_id, product_name, search_key)
+        return len(rows)
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def get_product_id(product_name: str) -> int:
+    """
+    Integer key of a product, adding it to the dimension when new
+
+    Served from the cache after the first lookup. A new product is committed
+    on its own, so the cached key stays valid even if the caller's write is
+    rolled back (the product is simply left unused).
+
+    Args:
+        product_name: Product name in any case/spacing
+
+    Returns:
+        int: product_id
+
+    Raises:
+        ConnectionError: If the product is not cached and no connection is available
+    """
+    search_key = product_search_key(product_name)
+    cached = _product_ids.get((current_shard(), search_key))
+    if cached is not None:
+        return cached
+
+    connection = get_connection()
+    if not connection:
+        raise ConnectionError("Database connection unavailable")
+
+    try:
+        cursor = connection.cursor()
+        product_id = cursor.var(int)
+        canonical_name = cursor.var(str)
+        execute_statement(
+            cursor,
+            "product_upsert",
+            {
+                "product_name": " ".join(product_name.split()),
+                "search_key": search_key,
+                "product_id": product_id,
+                "canonical_name": canonical_name,
+            },
+        )
+        connection.commit()
+        _cache_product(product_id.getvalue(), canonical_name.getvalue(), search_key)
+        return product_id.getvalue()
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def get_product_name(product_id: int) -> Optional[str]:
+    """Canonical name of a product key (cache, loading the dimension on a miss)"""
+    key = (current_shard(), product_id)
+    if key not in _product_names:
+        load_product_cache()
+    return _product_names.get(key)
+
+
+def product_identity(product_id: int, product_name: str = None) -> tuple:
+    """
+    Shard-independent identity of a product of the current shard
+
+    product_id is only unique within one shard; reports group records on it
+    while reading a shard, then use this identity to combine shards.
+
+    Args:
+        product_id: Product key in the current shard
+        product_name: Name to fall back on when the key is unknown
+
+    Returns:
+        tuple: (search key, canonical name)
+    """
+    name = get_product_name(product_id) or product_name
+    return product_search_key(name), name
+
+
+def build_insert_params(
+    product_name: str,
+    quantity: float,
+    sale_price: float = 0,
+    cost_price: float = 0,
+    planting_date: str = None,
+    harvest_date: str = None,
+    production_status: str = "PLANTED",
+    farm_id: str = None,
+) -> Dict:
+    """
+    Build the bind values of the registered "insert" statement
+
+    Args:
+        Same as create_agricultural_production
+
+    Returns:
+        Dict: Bind values with dates converted to datetime objects and the
+        product name replaced by its product_id (see get_product_id)
+    """
+    # Convert date strings to datetime objects if provided
+    planting_dt = (
+        datetime.strptime(planting_date, "%Y-%m-%d") if planting_date else None
+    )
+    harvest_dt = datetime.strptime(harvest_date, "%Y-%m-%d") if harvest_date else None
+
+    return {
+        "product_id": get_product_id(product_name),
+        "quantity": quantity,
+        "sale_price": sale_price,
+        "cost_price": cost_price,
+        "planting_date": planting_dt,
+        "harvest_date": harvest_dt,
+        "production_status": production_status,
+        "farm_id": farm_id or DEFAULT_FARM,
+    }
+
+
+def create_agricultural_production(
+    product_name: str,
+    quantity: float,
+    sale_price: float = 0,
+    cost_price: float = 0,
+    planting_date: str = None,
+    harvest_date: str = None,
+    production_status: str = "PLANTED",
+    farm_id: str = None,
+) -> bool:
+    """
+    Create a new agricultural production record
+
+    Args:
+        product_name: Name of the product
+        quantity: Quantity produced
+        sale_price: Sale price (optional, default 0)
+        cost_price: Cost price (optional, default 0)
+        planting_date: Planting date in 'YYYY-MM-DD' format (optional)
+        harvest_date: Harvest date in 'YYYY-MM-DD' format (optional)
+        production_status: Status ('PLANTED', 'HARVESTED', 'SOLD')
+        farm_id: Owning farm; the record is written to its shard
+            (default: DEFAULT_FARM, or the current shard when inside use_shard)
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    if farm_id and shard_for_farm(farm_id) != current_shard():
+        # Product keys are per shard, so resolve them on the farm's shard too
+        with use_farm(farm_id):
+            return create_agricultural_production(
+                product_name,
+                quantity,
+                sale_price,
+                cost_price,
+                planting_date,
+                harvest_date,
+                production_status,
+                farm_id,
+            )
+
+    connection = get_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+
+        params = build_insert_params(
+            product_name,
+            quantity,
+            sale_price,
+            cost_price,
+            planting_date,
+            harvest_date,
+            production_status,
+            farm_id,
+        )
+        new_id = cursor.var(int)
+        execute_statement(cursor, "insert_returning_id", {**params, "new_id": new_id})
+        connection.commit()
+
+        print(f"Successfully created record for {product_name}")
+        _notify_write(
+            "insert",
+            None,
+            {
+                "id": new_id.getvalue(),
+                "product_name": get_product_name(params["product_id"]),
+                **params,
+            },
+        )
+        return True
+
+    except INTERRUPTIONS:
+        connection.rollback()
+        raise
+    except Exception as e:
+        print(f"Error creating record: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def read_all_agricultural_production(include_archive: bool = True) -> List[Dict]:
+    """
+    Read all agricultural production records
+
+    Like the streams, exports and analysis, the default covers the whole
+    history: archived records (archive.py) included.
+
+    Args:
+        include_archive: False to read only the hot table
+
+    Returns:
+        List[Dict]: List of all records as dictionaries, newest first
+    """
+    connection = get_connection()
+    if not connection:
+        return []
+
+    statement = "select_all_with_archive" if include_archive else "select_all"
+
+    try:
+        cursor = connection.cursor()
+
+        rows = fetchall_statement(cursor, statement)
+        columns = [col[0].lower() for col in cursor.description]
+        records = []
+
+        for row in rows:
+            record = dict(zip(columns, row))
+            records.append(record)
+
+        return records
+
+    except INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"Error reading records: {e}")
+        return []
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def read_agricultural_production_page(
+    page_size: int = 20,
+    after: tuple = None,
+    before: tuple = None,
+    from_date: str = None,
+) -> Dict:
+    """
+    Read one page of records ordered by (created_at, id), newest first
+
+    Uses keyset pagination, so every page costs the same whatever its
+    position in the table.
+
+    Args:
+        page_size: Number of records per page
+        after: (created_at, id) of the last record of the current page,
+            to read the next (older) page
+        before: (created_at, id) of the first record of the current page,
+            to read the previous (newer) page
+        from_date: Jump to records created on or before this 'YYYY-MM-DD' date
+
+    Returns:
+        Dict: {"records": [...], "has_more": bool} where has_more tells
+        whether more records exist in the direction of travel
+    """
+    connection = get_connection()
+    if not connection:
+        return {"records": [], "has_more": False}
+
+    try:
+        cursor = connection.cursor()
+
+        # One extra row tells whether there is another page
+        params = {"page_size": page_size + 1}
+        if after:
+            statement = "page_after"
+            params["cursor_created_at"], params["cursor_id"] = after
+        elif before:
+            statement = "page_before"
+            params["cursor_created_at"], params["cursor_id"] = before
+        elif from_date:
+            statement = "page_from_date"
+            params["date_limit"] = datetime.strptime(
+                from_date, "%Y-%m-%d"
+            ) + timedelta(days=1)
+        else:
+            statement = "page_first"
+
+        cursor.arraysize = page_size + 1
+        rows = fetchall_statement(cursor, statement, params)
+        columns = [col[0].lower() for col in cursor.description]
+        records = [dict(zip(columns, row)) for row in rows]
+
+        has_more = len(records) > page_size
+        records = records[:page_size]
+        if before:
+            # Previous pages are read oldest first; restore display order
+            records.reverse()
+
+        return {"records": records, "has_more": has_more}
+
+    except INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"Error reading page: {e}")
+        return {"records": [], "has_more": False}
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def read_agricultural_production_by_id(record_id: int) -> Optional[Dict]:
+    """
+    Read a specific agricultural production record by ID
+
+    Archived records are found too; they are read-only, since updates and
+    deletes only reach the hot table.
+
+    Args:
+        record_id: ID of the record to retrieve
+
+    Returns:
+        Optional[Dict]: Record as dictionary if found, None otherwise, with
+        an extra 'archived' key (bool)
+    """
+    connection = get_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor()
+
+        row = fetchone_statement(cursor, "select_by_id", {"record_id": record_id})
+        columns = [col[0].lower() for col in cursor.description]
+
+        if row:
+            record = dict(zip(columns, row))
+            record["archived"] = bool(record["archived"])
+            return record
+        else:
+            print(f"No record found with ID {record_id}")
+            return None
+
+    except INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"Error reading record: {e}")
+        return None
+    finally:
+        cursor.close()
+        connection.close()
+
+
+# Columns returned by the RETURNING INTO clauses, with the Python type used
+# to allocate each out bind variable
+RETURNING_COLUMNS = {
+    "id": int,
+    "product_name": str,
+    "quantity": float,
+    "sale_price": float,
+    "cost_price": float,
+    "planting_date": oracledb.DB_TYPE_DATE,
+    "harvest_date": oracledb.DB_TYPE_DATE,
+    "production_status": str,
+    "created_at": oracledb.DB_TYPE_DATE,
+    "updated_at": oracledb.DB_TYPE_TIMESTAMP,
+}
+
+
+def _returning_vars(cursor, prefix: str) -> Dict:
+    """Allocate one out bind variable per returned column"""
+    return {
+        f"{prefix}_{column}": cursor.var(var_type)
+        for column, var_type in RETURNING_COLUMNS.items()
+    }
+
+
+def _returned_row(bind_vars: Dict, prefix: str) -> Optional[Dict]:
+    """Build a record dictionary from out bind variables"""
+    row = {}
+    for column in RETURNING_COLUMNS:
+        value = bind_vars[f"{prefix}_{column}"].getvalue()
+        # DML returning binds come back as one-element lists
+        if isinstance(value, list):
+            value = value[0] if value else None
+        row[column] = value
+    return row if row["id"] is not None else None
+
+
+def _parse_date(value):
+    """Convert a 'YYYY-MM-DD' string to datetime, leaving other values as-is"""
+    if isinstance(value, str):
+        return datetime.strptime(value, "%Y-%m-%d")
+    return value
+
+
+def update_agricultural_production_returning(
+    record_id: int,
+    product_name: str = None,
+    quantity: float = None,
+    sale_price: float = None,
+    cost_price: float = None,
+    production_status: str = None,
+    planting_date: str = None,
+    harvest_date: str = None,
+    expected_updated_at: datetime = None,
+) -> Optional[Dict]:
+    """
+    Update a record in a single round trip, returning its before/after state
+
+    The statement text is the same whatever fields are provided: fields left
+    as None keep their current value through NVL, so the server parses it once.
+
+    Args:
+        record_id: ID of the record to update
+        product_name, quantity, sale_price, cost_price, production_status,
+        planting_date, harvest_date: Fields to update (None keeps the value)
+        expected_updated_at: If given, only update when the stored updated_at
+            still matches (optimistic concurrency); updated_at is a TIMESTAMP
+            set by every update, so the check holds below one second
+
+    Returns:
+        Optional[Dict]: {"status", "before", "after"} where status is
+        'updated', 'not_found' or 'conflict'; None on database errors
+    """
+    connection = get_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor()
+
+        # Type the nullable inputs so every call binds the same way
+        cursor.setinputsizes(
+            product_id=oracledb.DB_TYPE_NUMBER,
+            quantity=oracledb.DB_TYPE_NUMBER,
+            sale_price=oracledb.DB_TYPE_NUMBER,
+            cost_price=oracledb.DB_TYPE_NUMBER,
+            planting_date=oracledb.DB_TYPE_DATE,
+            harvest_date=oracledb.DB_TYPE_DATE,
+            expected_updated_at=oracledb.DB_TYPE_TIMESTAMP,
+        )
+
+        old_vars = _returning_vars(cursor, "old")
+        new_vars = _returning_vars(cursor, "new")
+        row_count = cursor.var(int)
+
+        execute_statement(
+            cursor,
+            "update_returning",
+            {
+                "record_id": record_id,
+                "product_id": get_product_id(product_name) if product_name else None,
+                "quantity": quantity,
+                "sale_price": sale_price,
+                "cost_price": cost_price,
+                "planting_date": _parse_date(planting_date),
+                "harvest_date": _parse_date(harvest_date),
+                "production_status": production_status,
+                "expected_updated_at": expected_updated_at,
+                "row_count": row_count,
+                **old_vars,
+                **new_vars,
+            },
+        )
+
+        count = row_count.getvalue()
+        if count == -1:
+            connection.rollback()
+            print(f"No record found with ID {record_id}")
+            return {"status": "not_found", "before": None, "after": None}
+
+        before = _returned_row(old_vars, "old")
+        if count == 0:
+            # Someone changed the record since it was read; release the lock
+            connection.rollback()
+            print(f"Record with ID {record_id} was modified by another user")
+            return {"status": "conflict", "before": before, "after": None}
+
+        connection.commit()
+        print(f"Successfully updated record with ID {record_id}")
+        after = _returned_row(new_vars, "new")
+        _notify_write("update", before, after)
+        return {"status": "updated", "before": before, "after": after}
+
+    except INTERRUPTIONS:
+        connection.rollback()
+        raise
+    except Exception as e:
+        print(f"Error updating record: {e}")
+        connection.rollback()
+        return None
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def update_agricultural_production(
+    record_id: int,
+    product_name: str = None,
+    quantity: float = None,
+    sale_price: float = None,
+    cost_price: float = None,
+    production_status: str = None,
+) -> bool:
+    """
+    Update an agricultural production record
+
+    Args:
+        record_id: ID of the record to update
+        product_name, quantity, sale_price, cost_price, production_status: Fields to update
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    if all(
+        value is None
+        for value in (product_name, quantity, sale_price, cost_price, production_status)
+    ):
+        print("No valid fields provided for update")
+        return False
+
+    result = update_agricultural_production_returning(
+        record_id,
+        product_name=product_name,
+        quantity=quantity,
+        sale_price=sale_price,
+        cost_price=cost_price,
+        production_status=production_status,
+    )
+    return bool(result) and result["status"] == "updated"
+
+
+def delete_agricultural_production_returning(
+    record_id: int, expected_updated_at: datetime = None
+) -> Optional[Dict]:
+    """
+    Delete a record in a single round trip, returning the deleted row
+
+    Args:
+        record_id: ID of the record to delete
+        expected_updated_at: If given, only delete when the stored updated_at
+            still matches (optimistic concurrency)
+
+    Returns:
+        Optional[Dict]: {"status", "before"} where status is 'deleted',
+        'not_found' or 'conflict'; None on database errors
+    """
+    connection = get_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor()
+
+        cursor.setinputsizes(expected_updated_at=oracledb.DB_TYPE_TIMESTAMP)
+
+        old_vars = _returning_vars(cursor, "old")
+        row_count = cursor.var(int)
+        still_exists = cursor.var(int)
+
+        execute_statement(
+            cursor,
+            "delete_returning",
+            {
+                "record_id": record_id,
+                "expected_updated_at": expected_updated_at,
+                "row_count": row_count,
+                "still_exists": still_exists,
+                **old_vars,
+            },
+        )
+
+        if row_count.getvalue() == 0:
+            connection.rollback()
+            if still_exists.getvalue():
+                print(f"Record with ID {record_id} was modified by another user")
+                return {"status": "conflict", "before": None}
+            print(f"No record found with ID {record_id}")
+            return {"status": "not_found", "before": None}
+
+        connection.commit()
+        print(f"Successfully deleted record with ID {record_id}")
+        before = _returned_row(old_vars, "old")
+        _notify_write("delete", before, None)
+        return {"status": "deleted", "before": before}
+
+    except INTERRUPTIONS:
+        connection.rollback()
+        raise
+    except Exception as e:
+        print(f"Error deleting record: {e}")
+        connection.rollback()
+        return None
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def delete_agricultural_production(record_id: int) -> bool:
+    """
+    Delete an agricultural production record
+
+    Args:
+        record_id: ID of the record to delete
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    result = delete_agricultural_production_returning(record_id)
+    return bool(result) and result["status"] == "deleted"
+
+
+def _parse_timestamp(value):
+    """Convert an ISO timestamp string (as journaled) to datetime"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
 
-def get_connection():
-    """Get database connection"""
-    try:
-        dsn = f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['sid']}"
-        connection = oracledb.connect(
-            user=DB_CONFIG["username"], password=DB_CONFIG["password"], dsn=dsn
+
+def _apply_write(cursor, operation: str, params: Dict) -> tuple:
+    """Run one journaled write on an open transaction; returns (status, before, after)"""
+    if operation == "insert":
+        insert_params = build_insert_params(**params)
+        new_id = cursor.var(int)
+        execute_statement(
+            cursor, "insert_returning_id", {**insert_params, "new_id": new_id}
         )
-        return connection
-    except Exception as e:
-        print(f"Error connecting to database: {e}")
-        return None
+        after = {
+            "id": new_id.getvalue(),
+            "product_name": get_product_name(insert_params["product_id"]),
+            **insert_params,
+        }
+        return "inserted", None, after
+
+    # The farm only routes the entry to its shard (see write_journal)
+    params = {key: value for key, value in params.items() if key != "farm_id"}
+
+    if operation == "update":
+        cursor.setinputsizes(
+            product_id=oracledb.DB_TYPE_NUMBER,
+            quantity=oracledb.DB_TYPE_NUMBER,
+            sale_price=oracledb.DB_TYPE_NUMBER,
+            cost_price=oracledb.DB_TYPE_NUMBER,
+            planting_date=oracledb.DB_TYPE_DATE,
+            harvest_date=oracledb.DB_TYPE_DATE,
+            expected_updated_at=oracledb.DB_TYPE_TIMESTAMP,
+        )
+        old_vars = _returning_vars(cursor, "old")
+        new_vars = _returning_vars(cursor, "new")
+        row_count = cursor.var(int)
+        binds = {
+            "record_id": None,
+            "product_name": None,
+            "quantity": None,
+            "sale_price": None,
+            "cost_price": None,
+            "planting_date": None,
+            "harvest_date": None,
+            "production_status": None,
+            "expected_updated_at": None,
+        }
+        binds.update(params)
+        product_name = binds.pop("product_name")
+        binds["product_id"] = get_product_id(product_name) if product_name else None
+        for key in ("planting_date", "harvest_date"):
+            binds[key] = _parse_date(binds[key])
+        binds["expected_updated_at"] = _parse_timestamp(binds["expected_updated_at"])
+        execute_statement(
+            cursor,
+            "update_returning",
+            {**binds, "row_count": row_count, **old_vars, **new_vars},
+        )
+        count = row_count.getvalue()
+        if count == -1:
+            return "not_found", None, None
+        if count == 0:
+            return "conflict", _returned_row(old_vars, "old"), None
+        return "updated", _returned_row(old_vars, "old"), _returned_row(new_vars, "new")
+
+    if operation == "delete":
+        cursor.setinputsizes(expected_updated_at=oracledb.DB_TYPE_TIMESTAMP)
+        old_vars = _returning_vars(cursor, "old")
+        row_count = cursor.var(int)
+        still_exists = cursor.var(int)
+        execute_statement(
+            cursor,
+            "delete_returning",
+            {
+                "record_id": params["record_id"],
+                "expected_updated_at": _parse_timestamp(params.get("expected_updated_at")),
+                "row_count": row_count,
+                "still_exists": still_exists,
+                **old_vars,
+            },
+        )
+        if row_count.getvalue() == 0:
+            return ("conflict" if still_exists.getvalue() else "not_found"), None, None
+        return "deleted", _returned_row(old_vars, "old"), None
+
+    raise ValueError(f"Unknown write operation: {operation}")
+
+
+# Errors caused by the data of a write (value too large, invalid number or
+# date, NULL in a NOT NULL column...), which fail the same way on every retry
+PERMANENT_WRITE_ERRORS = {
+    "ORA-01400",
+    "ORA-01407",
+    "ORA-01438",
+    "ORA-01722",
+    "ORA-01830",
+    "ORA-01839",
+    "ORA-01841",
+    "ORA-01843",
+    "ORA-01847",
+    "ORA-01858",
+    "ORA-01861",
+    "ORA-12899",
+}
 
 
-def create_agricultural_production(
-    product_name: str,
-    quantity: float,
-    sale_price: float = 0,
-    cost_price: float = 0,
-    planting_date: str = None,
-    harvest_date: str = None,
-    production_status: str = "PLANTED",
-) -> bool:
+def _is_permanent_write_error(error: Exception) -> bool:
+    """Whether a write failed because of its data rather than the database"""
+    if isinstance(error, (oracledb.IntegrityError, ValueError)):
+        return True
+    if not isinstance(error, oracledb.DatabaseError):
+        return False
+    code = getattr(error.args[0], "full_code", "") if error.args else ""
+    return code in PERMANENT_WRITE_ERRORS
+
+
+def apply_write_batch(entries: List[Dict]) -> List[Dict]:
     """
-    Create a new agricultural production record
+    Apply journaled writes in order, in a single transaction
+
+    Each entry is claimed by its idempotency key in the same transaction, so
+    re-sending a batch whose commit succeeded but was not acknowledged skips
+    the entries already applied. Not found and conflict outcomes are final
+    (retrying would give the same answer) and do not abort the batch.
+    Neither do errors caused by the entry's own data (constraint violations
+    and PERMANENT_WRITE_ERRORS): the entry is rolled back to a savepoint
+    taken after its claim and recorded as rejected.
 
     Args:
-        product_name: Name of the product
-        quantity: Quantity produced
-        sale_price: Sale price (optional, default 0)
-        cost_price: Cost price (optional, default 0)
-        planting_date: Planting date in 'YYYY-MM-DD' format (optional)
-        harvest_date: Harvest date in 'YYYY-MM-DD' format (optional)
-        production_status: Status ('PLANTED', 'HARVESTED', 'SOLD')
+        entries: Dicts with 'key' (idempotency key), 'operation' ('insert',
+            'update' or 'delete') and 'params' (arguments of the matching
+            create/update/delete function)
 
     Returns:
-        bool: True if successful, False otherwise
+        List[Dict]: One {"key", "status"} per entry, where status is
+        'inserted', 'updated', 'deleted', 'not_found', 'conflict',
+        'rejected' (constraint violation or invalid value) or 'duplicate'
+
+    Raises:
+        ConnectionError: If no connection is available
+        oracledb.Error: On other database errors (the whole batch is rolled
+            back)
     """
     connection = get_connection()
     if not connection:
-        return False
+        raise ConnectionError("Database connection unavailable")
 
+    results = []
+    notifications = []
+    cursor = None
     try:
         cursor = connection.cursor()
+        for entry in entries:
+            execute_statement(
+                cursor,
+                "journal_claim",
+                {"idempotency_key": entry["key"], "operation": entry["operation"]},
+            )
+            if cursor.rowcount == 0:
+                results.append({"key": entry["key"], "status": "duplicate"})
+                continue
+
+            execute_statement(cursor, "journal_savepoint")
+            try:
+                status, before, after = _apply_write(
+                    cursor, entry["operation"], entry["params"]
+                )
+            except Exception as e:
+                if not _is_permanent_write_error(e):
+                    raise
+                # Invalid data fails the same way on every retry: undo the
+                # entry (keeping its claim) and record it as rejected instead
+                # of blocking the entries behind it
+                execute_statement(cursor, "journal_rollback_entry")
+                print(f"Journal entry {entry['key']} rejected: {e}")
+                status, before, after = "rejected", None, None
+            results.append({"key": entry["key"], "status": status})
+            if status in ("inserted", "updated", "deleted"):
+                notifications.append((entry["operation"], before, after))
 
-        sql = """
-        INSERT INTO agricultural_production 
-        (product_name, quantity, sale_price, cost_price, planting_date, harvest_date, production_status)
-        VALUES (:1, :2, :3, :4, :5, :6, :7)
-        """
-
-        # Convert date strings to datetime objects if provided
-        planting_dt = (
-            datetime.strptime(planting_date, "%Y-%m-%d") if planting_date else None
-        )
-        harvest_dt = (
-            datetime.strptime(harvest_date, "%Y-%m-%d") if harvest_date else None
-        )
-
-        cursor.execute(
-            sql,
-            (
-                product_name,
-                quantity,
-                sale_price,
-                cost_price,
-                planting_dt,
-                harvest_dt,
-                production_status,
-            ),
-        )
         connection.commit()
-
-        print(f"Successfully created record for {product_name}")
-        return True
-
-    except Exception as e:
-        print(f"Error creating record: {e}")
+    except Exception:
         connection.rollback()
-        return False
+        raise
     finally:
-        cursor.close()
+        if cursor is not None:
+            cursor.close()
         connection.close()
 
+    for operation, before, after in notifications:
+        _notify_write(operation, before, after)
+    return results
+
 
-def read_all_agricultural_production() -> List[Dict]:
+def search_agricultural_production(
+    product_name: str = None, production_status: str = None
+) -> List[Dict]:
     """
-    Read all agricultural production records
+    Search agricultural production records by criteria, archive included
+
+    Args:
+        product_name: Product name to search for (partial match)
+        production_status: Status to filter by
 
     Returns:
-        List[Dict]: List of all records as dictionaries
+        List[Dict]: List of matching records
     """
     connection = get_connection()
     if not connection:
@@ -110,257 +1915,752 @@ def read_all_agricultural_production() -> List[Dict]:
     try:
         cursor = connection.cursor()
 
-        sql = """
-        SELECT id, product_name, quantity, sale_price, cost_price, 
-               planting_date, harvest_date, production_status, 
-               created_at, updated_at
-        FROM agricultural_production
-        ORDER BY created_at DESC
-        """
+        # One fixed statement per combination of criteria
+        params = {}
+        if product_name:
+            # Same normalization as the products.search_key column
+            params["product_name"] = f"%{product_search_key(product_name)}%"
+        if production_status:
+            params["production_status"] = production_status
+
+        if product_name and production_status:
+            statement = "search_by_name_and_status"
+        elif product_name:
+            statement = "search_by_name"
+        elif production_status:
+            statement = "search_by_status"
+        else:
+            statement = "select_all_with_archive"
 
-        cursor.execute(sql)
+        rows = fetchall_statement(cursor, statement, params)
         columns = [col[0].lower() for col in cursor.description]
         records = []
 
-        for row in cursor.fetchall():
+        for row in rows:
             record = dict(zip(columns, row))
             records.append(record)
 
         return records
 
+    except INTERRUPTIONS:
+        raise
     except Exception as e:
-        print(f"Error reading records: {e}")
+        print(f"Error searching records: {e}")
         return []
     finally:
         cursor.close()
         connection.close()
 
 
-def read_agricultural_production_by_id(record_id: int) -> Optional[Dict]:
+def build_range_binds(ranges: Dict) -> tuple:
     """
-    Read a specific agricultural production record by ID
+    Translate range criteria into statement bounds and bind values
 
     Args:
-        record_id: ID of the record to retrieve
+        ranges: {column: (minimum, maximum)}; either bound may be None
+
+    Returns:
+        tuple: ([(column, 'min'|'max'), ...] in RANGE_COLUMNS order,
+        {bind name: value})
+    """
+    bounds = []
+    params = {}
+    for column in RANGE_COLUMNS:
+        if column not in ranges:
+            continue
+        for side, value in zip(("min", "max"), ranges[column]):
+            if value is None:
+                continue
+            bounds.append((column, side))
+            params[f"{side}_{column}"] = _parse_date(value)
+    return bounds, params
+
+
+def record_source_sql(
+    bounds: List[tuple] = (), filter_status: bool = False, include_archive: bool = True
+) -> str:
+    """
+    FROM source for range reads: the hot table, plus the archive when needed
+
+    The archive branch is guarded by conditions on the binds, so the database
+    skips it at execution time when the minimum harvest date is past the
+    archive horizon, when the status filter is not SOLD, or when nothing has
+    been archived yet.
+
+    Args:
+        bounds: Range bounds, as returned by build_range_binds
+        filter_status: Whether the statement binds :production_status
+        include_archive: False to read only the hot table
+
+    Returns:
+        str: Table name or parenthesized UNION ALL of both tables
+    """
+    if not include_archive:
+        return "agricultural_production"
+
+    horizon = "(SELECT archive_horizon FROM production_archive_state)"
+    if ("harvest_date", "min") in bounds:
+        guards = [f"{horizon} > :min_harvest_date"]
+    else:
+        guards = [f"{horizon} IS NOT NULL"]
+    if filter_status:
+        guards.append(":production_status = 'SOLD'")
+
+    return f"""(
+            SELECT {RECORD_COLUMNS_SQL} FROM agricultural_production
+            UNION ALL
+            SELECT {RECORD_COLUMNS_SQL} FROM {ARCHIVE_TABLE}
+            WHERE {" AND ".join(guards)}
+        )"""
+
+
+register_statement(
+    "select_all_with_archive",
+    f"""
+    SELECT {RECORD_COLUMNS_SQL}
+    FROM {record_source_sql()}
+    ORDER BY created_at DESC
+    """,
+)
+
+# Reads by id and searches reach archived records too; the status searches
+# only open the archive for SOLD, the only archived status
+register_statement(
+    "select_by_id",
+    f"""
+    SELECT {RECORD_COLUMNS_SQL},
+           CASE WHEN EXISTS (SELECT 1 FROM {ARCHIVE_TABLE} WHERE id = :record_id)
+                THEN 1 ELSE 0 END AS archived
+    FROM {record_source_sql()}
+    WHERE id = :record_id
+    """,
+)
+register_statement(
+    "search_by_name",
+    f"""
+    SELECT {RECORD_COLUMNS_SQL}
+    FROM {record_source_sql()}
+    WHERE product_id IN (SELECT product_id FROM products
+                         WHERE search_key LIKE :product_name)
+    ORDER BY created_at DESC
+    """,
+)
+register_statement(
+    "search_by_status",
+    f"""
+    SELECT {RECORD_COLUMNS_SQL}
+    FROM {record_source_sql(filter_status=True)}
+    WHERE production_status = :production_status
+    ORDER BY created_at DESC
+    """,
+)
+register_statement(
+    "search_by_name_and_status",
+    f"""
+    SELECT {RECORD_COLUMNS_SQL}
+    FROM {record_source_sql(filter_status=True)}
+    WHERE product_id IN (SELECT product_id FROM products
+                         WHERE search_key LIKE :product_name)
+      AND production_status = :production_status
+    ORDER BY created_at DESC
+    """,
+)
+
+
+def _range_search_statement(
+    bounds: List[tuple],
+    filter_name: bool,
+    filter_status: bool,
+    sort_by: str,
+    descending: bool,
+    limited: bool,
+    include_archive: bool = True,
+) -> str:
+    """
+    Register (once) and return the statement for one search shape
+
+    The text depends only on which criteria are present, never on their
+    values, so each shape is parsed once and reused for every search.
+    """
+    key = "|".join(
+        [
+            ",".join(f"{column}:{side}" for column, side in bounds),
+            "name" if filter_name else "",
+            "status" if filter_status else "",
+            f"{sort_by}:{'desc' if descending else 'asc'}",
+            "limit" if limited else "",
+            "archive" if include_archive else "",
+        ]
+    )
+    name = f"range_search[{key}]"
+    if name in STATEMENTS:
+        return name
+
+    predicates = []
+    for column, side in bounds:
+        operator = ">=" if side == "min" else "<="
+        predicates.append(f"{RANGE_COLUMNS[column]} {operator} :{side}_{column}")
+    if filter_name:
+        predicates.append("UPPER(product_name) LIKE UPPER(:product_name)")
+    if filter_status:
+        predicates.append("production_status = :production_status")
+
+    direction = "DESC" if descending else "ASC"
+    order_by = f"{SORT_COLUMNS[sort_by]} {direction}"
+    if sort_by != "id":
+        order_by += f", id {direction}"
+    sql = f"""
+        SELECT {RECORD_COLUMNS_SQL}, {ROI_SQL} AS roi
+        FROM {record_source_sql(bounds, filter_status, include_archive)}
+        {"WHERE " + " AND ".join(predicates) if predicates else ""}
+        ORDER BY {order_by}
+        {"FETCH FIRST :row_limit ROWS ONLY" if limited else ""}
+        """
+    return register_statement(name, sql)
+
+
+def search_agricultural_production_ranges(
+    ranges: Dict = None,
+    product_name: str = None,
+    production_status: str = None,
+    sort_by: str = "created_at",
+    descending: bool = True,
+    limit: int = None,
+    include_archive: bool = True,
+) -> List[Dict]:
+    """
+    Search records by value ranges, with sorting and limit done in SQL
+
+    Args:
+        ranges: {column: (minimum, maximum)} for any of id, planting_date,
+            harvest_date, quantity, cost_price, sale_price and roi; either
+            bound may be None. Dates use the 'YYYY-MM-DD' format
+        product_name: Product name to search for (partial match)
+        production_status: Status to filter by
+        sort_by: Column to sort by (a range column, created_at or product_name)
+        descending: Sort direction
+        limit: Maximum number of records to return
+        include_archive: Also search archived records the ranges can reach
 
     Returns:
-        Optional[Dict]: Record as dictionary if found, None otherwise
+        List[Dict]: Matching records, each with an extra 'roi' key
     """
+    ranges = ranges or {}
+    unknown = set(ranges) - set(RANGE_COLUMNS)
+    if unknown:
+        print(f"Unknown range columns: {', '.join(sorted(unknown))}")
+        return []
+    if sort_by not in SORT_COLUMNS:
+        print(f"Unknown sort column: {sort_by}")
+        return []
+
+    bounds, params = build_range_binds(ranges)
+    if product_name:
+        params["product_name"] = f"%{product_search_key(product_name)}%"
+    if production_status:
+        params["production_status"] = production_status
+    if limit:
+        params["row_limit"] = limit
+
     connection = get_connection()
     if not connection:
-        return None
+        return []
 
     try:
         cursor = connection.cursor()
 
-        sql = """
-        SELECT id, product_name, quantity, sale_price, cost_price, 
-               planting_date, harvest_date, production_status, 
-               created_at, updated_at
-        FROM agricultural_production
-        WHERE id = :1
-        """
-
-        cursor.execute(sql, (record_id,))
+        statement = _range_search_statement(
+            bounds,
+            bool(product_name),
+            bool(production_status),
+            sort_by,
+            descending,
+            bool(limit),
+            include_archive,
+        )
+        rows = fetchall_statement(cursor, statement, params)
         columns = [col[0].lower() for col in cursor.description]
-        row = cursor.fetchone()
 
-        if row:
-            return dict(zip(columns, row))
-        else:
-            print(f"No record found with ID {record_id}")
-            return None
+        return [dict(zip(columns, row)) for row in rows]
 
+    except INTERRUPTIONS:
+        raise
     except Exception as e:
-        print(f"Error reading record: {e}")
-        return None
+        print(f"Error searching records: {e}")
+        return []
     finally:
         cursor.close()
         connection.close()
 
 
-def update_agricultural_production(
-    record_id: int,
-    product_name: str = None,
-    quantity: float = None,
-    sale_price: float = None,
-    cost_price: float = None,
+def _stream_statement(ranges: Dict, production_status: str, include_archive: bool):
+    """Statement and bind values of a range stream ordered by id"""
+    bounds, params = build_range_binds(ranges or {})
+    if production_status:
+        params["production_status"] = production_status
+    statement = _range_search_statement(
+        bounds, False, bool(production_status), "id", False, False, include_archive
+    )
+    return statement, params
+
+
+def stream_agricultural_production(
+    ranges: Dict = None,
     production_status: str = None,
-) -> bool:
+    batch_size: int = 1000,
+    include_archive: bool = True,
+):
     """
-    Update an agricultural production record
+    Stream records matching the range criteria, ordered by id
+
+    Rows are fetched batch_size at a time, so memory stays bounded whatever
+    the size of the table. The connection is held until the generator is
+    exhausted or closed.
 
     Args:
-        record_id: ID of the record to update
-        product_name, quantity, sale_price, cost_price, production_status: Fields to update
+        ranges: Same as search_agricultural_production_ranges
+        production_status: Status to filter by
+        batch_size: Rows fetched per round trip
+        include_archive: Also stream archived records the ranges can reach
 
-    Returns:
-        bool: True if successful, False otherwise
+    Yields:
+        Dict: One record at a time, with an extra 'roi' key
+
+    Raises:
+        ConnectionError: If no connection could be acquired
+        oracledb.Error: If the read fails midway, so a truncated stream is
+            never mistaken for the whole table
     """
+    statement, params = _stream_statement(ranges, production_status, include_archive)
+
     connection = get_connection()
     if not connection:
-        return False
+        raise ConnectionError("Could not connect to the database")
 
     try:
         cursor = connection.cursor()
+        cursor.arraysize = batch_size
+        cursor.prefetchrows = batch_size
 
-        # Build dynamic update query based on provided fields
-        update_fields = []
-        values = []
-
-        # Create kwargs from local variables
-        local_vars = {
-            "product_name": product_name,
-            "quantity": quantity,
-            "sale_price": sale_price,
-            "cost_price": cost_price,
-            "production_status": production_status,
-        }
+        with tracked_statement(cursor, statement, params):
+            execute_statement(cursor, statement, params)
+            columns = [col[0].lower() for col in cursor.description]
 
-        for field, value in local_vars.items():
-            if value is not None:
-                update_fields.append(f"{field} = :{len(values) + 1}")
+            for rows in fetch_batches(cursor, statement):
+                for row in rows:
+                    yield dict(zip(columns, row))
+
+    except INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"Error streaming records: {e}")
+        raise
+    finally:
+        cursor.close()
+        connection.close()
 
-                # Handle date conversion
-                if field in ["planting_date", "harvest_date"] and isinstance(
-                    value, str
-                ):
-                    value = datetime.strptime(value, "%Y-%m-%d")
 
-                values.append(value)
+def fetch_record_batches(
+    ranges: Dict = None,
+    production_status: str = None,
+    batch_size: int = 1000,
+    include_archive: bool = True,
+):
+    """
+    Fetch records matching the range criteria in batches, ordered by id
 
-        if not update_fields:
-            print("No valid fields provided for update")
-            return False
+    Batch counterpart of stream_agricultural_production: errors are raised
+    instead of ending the stream early, so callers can tell a complete read
+    from an interrupted one.
 
-        # Add updated_at field
-        update_fields.append(f"updated_at = :{len(values) + 1}")
-        values.append(datetime.now())
+    Args:
+        ranges, production_status, include_archive: Same as
+            stream_agricultural_production
+        batch_size: Rows per batch (and per round trip)
 
-        # Add record_id for WHERE clause
-        values.append(record_id)
+    Yields:
+        List[Dict]: One batch of records, each with an extra 'roi' key
 
-        sql = f"""
-        UPDATE agricultural_production 
-        SET {', '.join(update_fields)}
-        WHERE id = :{len(values)}
-        """
+    Raises:
+        ConnectionError: If no connection could be acquired
+    """
+    statement, params = _stream_statement(ranges, production_status, include_archive)
 
-        cursor.execute(sql, values)
+    connection = get_connection()
+    if not connection:
+        raise ConnectionError("Could not connect to the database")
 
-        if cursor.rowcount > 0:
-            connection.commit()
-            print(f"Successfully updated record with ID {record_id}")
-            return True
-        else:
-            print(f"No record found with ID {record_id}")
-            return False
+    try:
+        cursor = connection.cursor()
+        cursor.arraysize = batch_size
+        cursor.prefetchrows = batch_size
 
-    except Exception as e:
-        print(f"Error updating record: {e}")
-        connection.rollback()
-        return False
+        with tracked_statement(cursor, statement, params):
+            execute_statement(cursor, statement, params)
+            columns = [col[0].lower() for col in cursor.description]
+
+            for rows in fetch_batches(cursor, statement):
+                yield [dict(zip(columns, row)) for row in rows]
     finally:
         cursor.close()
         connection.close()
 
 
-def delete_agricultural_production(record_id: int) -> bool:
+def _column_typecode(description: tuple):
     """
-    Delete an agricultural production record
+    Array typecode of a fetched column, chosen once from cursor.description
 
-    Args:
-        record_id: ID of the record to delete
+    NUMBER(p, 0) is integral ('q'); any other NUMBER, including unconstrained
+    NUMBER and expressions, is 'd', the same mapping the driver's Arrow fetch
+    uses. Other types have no typecode (None).
+    """
+    type_code, precision, scale = description[1], description[4], description[5]
+    if type_code is not oracledb.DB_TYPE_NUMBER:
+        return None
+    if scale == 0 and precision and precision <= 18:
+        return "q"
+    return "d"
 
-    Returns:
-        bool: True if successful, False otherwise
+
+def _typed_column(values: tuple, typecode: str):
+    """
+    Pack one fetched column with the typecode of its column
+
+    A column without NULLs becomes an array of that typecode. A column with
+    NULLs stays a list, with None for each NULL and the other values
+    converted to the same type, so NULL is never confused with a value.
+    """
+    if typecode is None:
+        return list(values)
+    convert = int if typecode == "q" else float
+    if None in values:
+        return [None if value is None else convert(value) for value in values]
+    return array.array(typecode, map(convert, values))
+
+
+def fetch_column_batches(
+    statement: str, params=None, batch_size: int = 10000
+) -> Iterator[Dict]:
+    """
+    Fetch a registered statement as column batches instead of row dicts
+
+    Each round trip of batch_size rows is transposed once into one sequence
+    per column, so no per-row dictionary is ever built. The type of each
+    column is fixed by cursor.description, so it is the same in every batch.
+
+    Args:
+        statement: Registry key of the statement
+        params: Bind values
+        batch_size: Rows per batch (and per round trip)
+
+    Yields:
+        Dict: {column name: array.array or list}, all of the same length;
+        NULL is None (see _typed_column)
+
+    Raises:
+        ConnectionError: If no connection could be acquired
+        oracledb.Error: If the read fails midway, so a truncated export is
+            never mistaken for the whole table
     """
     connection = get_connection()
     if not connection:
-        return False
+        raise ConnectionError("Could not connect to the database")
 
     try:
         cursor = connection.cursor()
-
-        sql = "DELETE FROM agricultural_production WHERE id = :1"
-        cursor.execute(sql, (record_id,))
-
-        if cursor.rowcount > 0:
-            connection.commit()
-            print(f"Successfully deleted record with ID {record_id}")
-            return True
-        else:
-            print(f"No record found with ID {record_id}")
-            return False
-
+        cursor.arraysize = batch_size
+        cursor.prefetchrows = batch_size
+
+        with tracked_statement(cursor, statement, params):
+            execute_statement(cursor, statement, params)
+            names = [col[0].lower() for col in cursor.description]
+            typecodes = [_column_typecode(col) for col in cursor.description]
+
+            for rows in fetch_batches(cursor, statement):
+                columns = zip(*rows)
+                yield {
+                    name: _typed_column(values, typecode)
+                    for name, typecode, values in zip(names, typecodes, columns)
+                }
+
+    except INTERRUPTIONS:
+        raise
     except Exception as e:
-        print(f"Error deleting record: {e}")
-        connection.rollback()
-        return False
+        print(f"Error fetching column batches: {e}")
+        raise
     finally:
         cursor.close()
         connection.close()
 
 
-def search_agricultural_production(
-    product_name: str = None, production_status: str = None
-) -> List[Dict]:
+def fetch_arrow_batches(statement: str, params=None, batch_size: int = 10000):
     """
-    Search agricultural production records by criteria
+    Fetch a registered statement as Arrow record batches
+
+    Uses the driver's native DataFrame fetch (python-oracledb 3+), which
+    fills Arrow buffers without creating Python objects per row; older
+    drivers fall back to fetch_column_batches.
 
     Args:
-        product_name: Product name to search for (partial match)
-        production_status: Status to filter by
+        statement: Registry key of the statement
+        params: Bind values
+        batch_size: Rows per batch
 
-    Returns:
-        List[Dict]: List of matching records
+    Yields:
+        pyarrow.RecordBatch: Column names in lower case
+
+    Raises:
+        ImportError: If pyarrow is not installed
+        ConnectionError: If no connection could be acquired
+        oracledb.Error: If the read fails midway
     """
+    if pyarrow is None:
+        raise ImportError("pyarrow is required for Arrow fetches")
+
     connection = get_connection()
     if not connection:
-        return []
+        raise ConnectionError("Could not connect to the database")
+
+    if not hasattr(connection, "fetch_df_batches"):
+        connection.close()
+        for columns in fetch_column_batches(statement, params, batch_size):
+            yield pyarrow.RecordBatch.from_pydict(columns)
+        return
 
     try:
-        cursor = connection.cursor()
+        _record_execution(connection, statement)
+        _apply_call_timeout(connection, statement)
+        with tracked_statement(
+            None, statement, params, connection=connection
+        ) as progress:
+            progress["rows"] = 0
+            for frame in connection.fetch_df_batches(
+                STATEMENTS[statement], parameters=params, size=batch_size
+            ):
+                table = pyarrow.Table.from_arrays(
+                    frame.column_arrays(),
+                    names=[name.lower() for name in frame.column_names()],
+                )
+                progress["rows"] += table.num_rows
+                yield from table.to_batches()
+                _apply_call_timeout(connection, statement)
+
+    except INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"Error fetching Arrow batches: {e}")
+        raise
+    finally:
+        connection.close()
 
-        sql = """
-        SELECT id, product_name, quantity, sale_price, cost_price, 
-               planting_date, harvest_date, production_status, 
-               created_at, updated_at
-        FROM agricultural_production
-        WHERE 1=1
-        """
 
-        params = []
+def stream_agricultural_production_columns(
+    ranges: Dict = None,
+    production_status: str = None,
+    batch_size: int = 10000,
+    include_archive: bool = True,
+    arrow: bool = False,
+):
+    """
+    Columnar counterpart of stream_agricultural_production
 
-        if product_name:
-            sql += " AND UPPER(product_name) LIKE UPPER(:1)"
-            params.append(f"%{product_name}%")
+    Args:
+        ranges, production_status, include_archive: Same as
+            stream_agricultural_production
+        batch_size: Rows per batch
+        arrow: Yield pyarrow.RecordBatch objects instead of column dicts
 
-        if production_status:
-            param_num = len(params) + 1
-            sql += f" AND production_status = :{param_num}"
-            params.append(production_status)
+    Yields:
+        Column batches ordered by id, with an extra 'roi' column
+    """
+    statement, params = _stream_statement(ranges, production_status, include_archive)
+    if arrow:
+        yield from fetch_arrow_batches(statement, params, batch_size)
+    else:
+        yield from fetch_column_batches(statement, params, batch_size)
 
-        sql += " ORDER BY created_at DESC"
 
-        cursor.execute(sql, params)
-        columns = [col[0].lower() for col in cursor.description]
-        records = []
+def pipeline_operation(kind: str, statement: str = None, params=None) -> Dict:
+    """
+    Describe one operation of a pipeline
 
-        for row in cursor.fetchall():
-            record = dict(zip(columns, row))
-            records.append(record)
+    Args:
+        kind: 'execute', 'fetchone', 'fetchall' or 'commit'
+        statement: Registry key of the statement (not used by 'commit')
+        params: Bind values of the statement
 
-        return records
+    Returns:
+        Dict: Operation description accepted by run_pipeline
+    """
+    return {"kind": kind, "statement": statement, "params": params}
+
+
+def _pipeline_result(operation: Dict, rows=None, columns=None, error=None) -> Dict:
+    """Build the result entry of one pipeline operation"""
+    if rows is not None and columns is not None:
+        rows = [dict(zip(columns, row)) for row in rows]
+    return {
+        "kind": operation["kind"],
+        "statement": operation["statement"],
+        "rows": rows,
+        "error": error,
+    }
+
+
+def _build_driver_pipeline(operations: List[Dict]):
+    """Translate operation descriptions into a driver pipeline"""
+    pipeline = oracledb.create_pipeline()
+    for operation in operations:
+        kind = operation["kind"]
+        if kind == "commit":
+            pipeline.add_commit()
+            continue
+
+        sql = STATEMENTS[operation["statement"]]
+        params = operation["params"] or {}
+        if kind == "execute":
+            pipeline.add_execute(sql, params)
+        elif kind == "fetchone":
+            pipeline.add_fetchone(sql, params)
+        elif kind == "fetchall":
+            pipeline.add_fetchall(sql, params)
+        else:
+            raise ValueError(f"Unknown pipeline operation: {kind}")
+    return pipeline
+
+
+def _convert_driver_results(operations: List[Dict], results) -> List[Dict]:
+    """Convert driver pipeline results into result dictionaries"""
+    converted = []
+    for operation, result in zip(operations, results):
+        error = str(result.error) if result.error else None
+        rows = result.rows
+        if operation["kind"] == "fetchone" and rows is not None:
+            rows = rows[:1]
+        columns = (
+            [col.name.lower() for col in result.columns] if result.columns else None
+        )
+        converted.append(_pipeline_result(operation, rows, columns, error))
+    return converted
+
+
+async def _run_async_pipeline(operations: List[Dict], continue_on_error: bool):
+    """Run a pipeline over an asyncio connection (required by older drivers)"""
+    config = SHARDS[current_shard()]
+    dsn = f"{config['host']}:{config['port']}/{config['sid']}"
+    connection = await oracledb.connect_async(
+        user=config["username"],
+        password=config["password"],
+        dsn=dsn,
+        stmtcachesize=config["stmtcachesize"],
+    )
+    try:
+        pipeline = _build_driver_pipeline(operations)
+        return await connection.run_pipeline(
+            pipeline, continue_on_error=continue_on_error
+        )
+    finally:
+        await connection.close()
 
-    except Exception as e:
-        print(f"Error searching records: {e}")
-        return []
+
+def _run_sequential_pipeline(
+    operations: List[Dict], continue_on_error: bool
+) -> List[Dict]:
+    """Run the operations one round trip at a time on a single connection"""
+    connection = get_connection()
+    if not connection:
+        return [
+            _pipeline_result(operation, error="No database connection")
+            for operation in operations
+        ]
+
+    results = []
+    try:
+        cursor = connection.cursor()
+        for operation in operations:
+            if results and results[-1]["error"] and not continue_on_error:
+                results.append(_pipeline_result(operation, error="Skipped"))
+                continue
+
+            try:
+                if operation["kind"] == "commit":
+                    connection.commit()
+                    results.append(_pipeline_result(operation))
+                    continue
+
+                statement, params = operation["statement"], operation["params"] or {}
+                if operation["kind"] == "execute":
+                    execute_statement(cursor, statement, params)
+                    results.append(_pipeline_result(operation))
+                    continue
+
+                if operation["kind"] == "fetchone":
+                    row = fetchone_statement(cursor, statement, params)
+                    rows = [row] if row else []
+                else:
+                    rows = fetchall_statement(cursor, statement, params)
+                columns = [col[0].lower() for col in cursor.description]
+                results.append(_pipeline_result(operation, rows, columns))
+            except INTERRUPTIONS:
+                raise
+            except Exception as e:
+                results.append(_pipeline_result(operation, error=str(e)))
+        return results
     finally:
         cursor.close()
         connection.close()
 
 
+def run_pipeline(operations: List[Dict], continue_on_error: bool = True) -> List[Dict]:
+    """
+    Send several independent operations to the server in one round trip
+
+    Uses the driver pipelining support when available (Oracle Database 23ai
+    sends the whole batch at once; older servers are still handled by the
+    driver, one operation at a time) and falls back to running the operations
+    sequentially on a single connection otherwise.
+
+    Args:
+        operations: Operations built with pipeline_operation()
+        continue_on_error: Keep running the remaining operations after a failure
+
+    Returns:
+        List[Dict]: One result per operation with 'kind', 'statement', 'rows'
+        (list of record dictionaries for fetches) and 'error' (None on success)
+    """
+    if not operations:
+        return []
+
+    if not hasattr(oracledb, "create_pipeline"):
+        return _run_sequential_pipeline(operations, continue_on_error)
+
+    try:
+        connection = get_connection()
+        if connection and hasattr(connection, "run_pipeline"):
+            try:
+                pipeline = _build_driver_pipeline(operations)
+                results = connection.run_pipeline(
+                    pipeline, continue_on_error=continue_on_error
+                )
+            finally:
+                connection.close()
+        else:
+            if connection:
+                connection.close()
+            results = asyncio.run(_run_async_pipeline(operations, continue_on_error))
+        return _convert_driver_results(operations, results)
+    except oracledb.NotSupportedError as e:
+        # Raised before anything is sent (e.g. thick mode), so it is safe to retry
+        print(f"Pipelining unavailable, running sequentially: {e}")
+    except INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"Error running pipeline: {e}")
+        return [_pipeline_result(operation, error=str(e)) for operation in operations]
+
+    return _run_sequential_pipeline(operations, continue_on_error)
+
+
 # Example usage functions for testing
 def example_usage():
     """Example usage of the CRUD functions"""
@@ -412,6 +2712,12 @@ def example_usage():
     #     print(f"\n6. Deleting record {record_id}...")
     #     delete_agricultural_production(record_id)
 
+    print("\n7. Statement cache report...")
+    print_statement_cache_report()
+
+    print("\n8. Slow query report...")
+    print_slow_query_report()
+
 
 if __name__ == "__main__":
     example_usage()
@@ -4,10 +4,45 @@ Módulo para exportar dados da produção agrícola para formato CSV
 """
 
 import csv
+import io
+import json
 import os
+import sys
+import time
 from datetime import datetime
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional
 import db
+import profiling
+import report_cache
+import rollup
+import spill_aggregate
+import stage_pipeline
+
+
+SUMMARY_HEADERS = [
+    "product_name",
+    "total_quantity",
+    "total_cost",
+    "total_revenue",
+    "total_profit",
+    "total_roi_percent",
+    "count_planted",
+    "count_harvested",
+    "count_sold",
+    "avg_growth_period",
+]
+
+MONTHLY_HEADERS = [
+    "year_month",
+    "production_count",
+    "total_quantity",
+    "total_cost",
+    "total_revenue",
+    "total_profit",
+    "roi_percent",
+    "efficiency",
+    "avg_quantity_per_production",
+]
 
 
 def ensure_data_directory():
@@ -86,145 +121,409 @@ def calculate_metrics(record: Dict) -> Dict:
     return metrics
 
 
-def export_to_csv(filename: str = None) -> bool:
+DETAIL_HEADERS = [
+    "id",
+    "product_name",
+    "quantity",
+    "sale_price",
+    "cost_price",
+    "planting_date",
+    "harvest_date",
+    "production_status",
+    "created_at",
+    "updated_at",
+    # Métricas calculadas
+    "profit",
+    "roi_percent",
+    "production_efficiency",
+    "revenue_per_unit",
+    "cost_per_unit",
+    "growth_period_days",
+]
+
+EXPORT_BATCH_SIZE = 2000
+CHECKPOINT_SECONDS = 5.0
+
+
+def format_detail_rows(records: List[Dict]) -> str:
     """
-    Exporta todos os dados de produção agrícola para um arquivo CSV
+    Estágio de transformação: formata um lote de registros como texto CSV
 
     Args:
-        filename: Nome do arquivo CSV (opcional)
+        records: Lote de registros do banco
 
     Returns:
-        bool: True se exportação foi bem-sucedida, False caso contrário
+        str: Linhas CSV do lote, na ordem de DETAIL_HEADERS
     """
-    try:
-        # Busca todos os dados
-        productions = db.read_all_agricultural_production()
+    buffer = io.StringIO()
+    writer = csv.DictWriter(
+        buffer, fieldnames=DETAIL_HEADERS, extrasaction="ignore"
+    )
+    for record in records:
+        # Formata datas
+        record["planting_date"] = format_date_for_csv(record["planting_date"])
+        record["harvest_date"] = format_date_for_csv(record["harvest_date"])
+        record["created_at"] = format_date_for_csv(record["created_at"])
+        record["updated_at"] = format_date_for_csv(record["updated_at"])
+
+        # Adiciona métricas calculadas
+        metrics = calculate_metrics(record)
+        record.update(metrics)
+
+        writer.writerow(record)
+    return buffer.getvalue()
+
+
+def checkpoint_path(filepath: str) -> str:
+    """Arquivo lateral com o checkpoint de uma exportação"""
+    return f"{filepath}.checkpoint"
+
+
+def save_checkpoint(
+    filepath: str,
+    shard: str,
+    last_id,
+    offset: int,
+    rows: int,
+    include_archive: bool = True,
+):
+    """
+    Registra a posição consistente de uma exportação
 
-        if not productions:
-            print("❌ Nenhum dado encontrado para exportar!")
-            return False
+    Só deve ser chamado depois que os bytes até offset estão em disco; o
+    arquivo é trocado atomicamente, então sempre há um checkpoint íntegro.
+    """
+    path = checkpoint_path(filepath)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as checkpoint_file:
+        json.dump(
+            {
+                "filename": os.path.basename(filepath),
+                "shard": shard,
+                "include_archive": include_archive,
+                "last_id": last_id,
+                "offset": offset,
+                "rows": rows,
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+            },
+            checkpoint_file,
+        )
+    os.replace(f"{path}.tmp", path)
+
+
+def load_checkpoint(filepath: str = None) -> Optional[Dict]:
+    """
+    Lê o checkpoint de uma exportação interrompida
 
-        # Cria diretório se necessário
+    Args:
+        filepath: CSV a retomar (padrão: checkpoint mais recente em data/)
+
+    Returns:
+        Optional[Dict]: Checkpoint com 'filepath', ou None se não houver
+    """
+    if filepath is None:
         data_dir = ensure_data_directory()
+        candidates = [
+            os.path.join(data_dir, name)
+            for name in os.listdir(data_dir)
+            if name.endswith(".csv.checkpoint")
+        ]
+        if not candidates:
+            return None
+        path = max(candidates, key=os.path.getmtime)
+        filepath = path[: -len(".checkpoint")]
+    else:
+        path = checkpoint_path(filepath)
 
-        # Define nome do arquivo
-        if filename is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"agricultural_data_{timestamp}.csv"
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as checkpoint_file:
+        checkpoint = json.load(checkpoint_file)
+    checkpoint["filepath"] = filepath
+    return checkpoint
 
-        filepath = os.path.join(data_dir, filename)
 
-        # Cabeçalhos do CSV
-        headers = [
-            "id",
-            "product_name",
-            "quantity",
-            "sale_price",
-            "cost_price",
-            "planting_date",
-            "harvest_date",
-            "production_status",
-            "created_at",
-            "updated_at",
-            # Métricas calculadas
-            "profit",
-            "roi_percent",
-            "production_efficiency",
-            "revenue_per_unit",
-            "cost_per_unit",
-            "growth_period_days",
-        ]
+def export_to_csv(
+    filename: str = None, resume: bool = False, include_archive: bool = True
+) -> bool:
+    """
+    Exporta todos os dados de produção agrícola para um arquivo CSV
 
-        # Escreve dados no CSV
-        with open(filepath, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=headers)
-            writer.writeheader()
+    Busca, formatação e gravação rodam em paralelo (stage_pipeline): enquanto
+    um lote é gravado, o próximo é formatado e o seguinte já está sendo lido
+    do banco. Os shards (db.SHARDS) são lidos um depois do outro e, dentro de
+    cada um, os registros saem em ordem de id.
 
-            for record in productions:
-                # Formata datas
-                record["planting_date"] = format_date_for_csv(record["planting_date"])
-                record["harvest_date"] = format_date_for_csv(record["harvest_date"])
-                record["created_at"] = format_date_for_csv(record["created_at"])
-                record["updated_at"] = format_date_for_csv(record["updated_at"])
+    A cada CHECKPOINT_SECONDS o arquivo é sincronizado com o disco e o shard,
+    o último id e o tamanho gravado vão para um arquivo lateral
+    (.checkpoint). Com resume=True, uma exportação interrompida é truncada
+    nesse tamanho e continua a partir do id seguinte do mesmo shard, sem
+    refazer o que já foi gravado.
 
-                # Adiciona métricas calculadas
-                metrics = calculate_metrics(record)
-                record.update(metrics)
+    Como o resumo e a análise, a exportação cobre todo o histórico, inclusive
+    os registros arquivados (archive.py), salvo com include_archive=False.
 
-                writer.writerow(record)
+    Args:
+        filename: Nome do arquivo CSV (opcional)
+        resume: Retoma a exportação interrompida de filename (ou a mais recente)
+        include_archive: Inclui os registros arquivados (a retomada usa o
+            valor gravado no checkpoint)
+
+    Returns:
+        bool: True se exportação foi bem-sucedida, False caso contrário
+    """
+    try:
+        # Cria diretório se necessário
+        data_dir = ensure_data_directory()
+
+        if resume:
+            checkpoint = load_checkpoint(
+                os.path.join(data_dir, filename) if filename else None
+            )
+            if checkpoint is None:
+                print("❌ Nenhuma exportação interrompida para retomar!")
+                return False
+            filepath = checkpoint["filepath"]
+            include_archive = checkpoint.get("include_archive", True)
+            print(f"🔁 Retomando {filepath} após {checkpoint['rows']} registros")
+        else:
+            # Define nome do arquivo
+            if filename is None:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"agricultural_data_{timestamp}.csv"
+            filepath = os.path.join(data_dir, filename)
+            checkpoint = None
+
+        shards = list(db.SHARDS)
+        progress = {
+            "shard": checkpoint.get("shard", db.DEFAULT_SHARD)
+            if checkpoint
+            else shards[0],
+            "last_id": checkpoint["last_id"] if checkpoint else None,
+            "rows": checkpoint["rows"] if checkpoint else 0,
+            "offset": checkpoint["offset"] if checkpoint else 0,
+            "synced_at": time.monotonic(),
+        }
+
+        with open(filepath, "r+b" if checkpoint else "wb") as csvfile:
+            if checkpoint:
+                # Descarta o que foi gravado depois do último checkpoint
+                csvfile.truncate(checkpoint["offset"])
+                csvfile.seek(checkpoint["offset"])
+            else:
+                header = io.StringIO()
+                csv.DictWriter(header, fieldnames=DETAIL_HEADERS).writeheader()
+                csvfile.write(header.getvalue().encode("utf-8"))
+                progress["offset"] = csvfile.tell()
+                save_checkpoint(
+                    filepath,
+                    progress["shard"],
+                    None,
+                    progress["offset"],
+                    0,
+                    include_archive,
+                )
+
+            def sync_checkpoint():
+                # Só o que foi gravado por lotes completos entra no checkpoint
+                csvfile.flush()
+                os.fsync(csvfile.fileno())
+                save_checkpoint(
+                    filepath,
+                    progress["shard"],
+                    progress["last_id"],
+                    progress["offset"],
+                    progress["rows"],
+                    include_archive,
+                )
+                progress["synced_at"] = time.monotonic()
+
+            def format_batch(batch):
+                shard, records = batch
+                return (
+                    format_detail_rows(records).encode("utf-8"),
+                    shard,
+                    records[-1]["id"],
+                    len(records),
+                )
+
+            def write_batch(batch):
+                data, shard, last_id, count = batch
+                csvfile.write(data)
+                progress["offset"] = csvfile.tell()
+                progress["shard"] = shard
+                progress["last_id"] = last_id
+                progress["rows"] += count
+                if time.monotonic() - progress["synced_at"] >= CHECKPOINT_SECONDS:
+                    sync_checkpoint()
+
+            def shard_batches(start_shard, last_id):
+                # Retomada: os shards anteriores ao do checkpoint já estão no arquivo
+                for shard in shards[shards.index(start_shard) :]:
+                    ranges = {"id": (last_id + 1, None)} if last_id is not None else None
+                    for records in db.iterate_on_shard(
+                        shard,
+                        db.fetch_record_batches,
+                        ranges=ranges,
+                        batch_size=EXPORT_BATCH_SIZE,
+                        include_archive=include_archive,
+                    ):
+                        yield shard, records
+                    last_id = None
+
+            try:
+                busy = stage_pipeline.run_stages(
+                    shard_batches(progress["shard"], progress["last_id"]),
+                    [("transform", format_batch), ("write", write_batch)],
+                )
+            except Exception:
+                # Lotes gravados até aqui ficam registrados para o resume
+                sync_checkpoint()
+                print(f"⚠️ Exportação interrompida após {progress['rows']} registros")
+                print("   Use export_to_csv(resume=True) para continuar")
+                raise
+
+        os.remove(checkpoint_path(filepath))
+        exported = progress["rows"]
+        if not exported:
+            os.remove(filepath)
+            print("❌ Nenhum dado encontrado para exportar!")
+            return False
 
         print(f"✅ Dados exportados com sucesso!")
         print(f"📁 Arquivo: {filepath}")
-        print(f"📊 Total de registros: {len(productions)}")
+        print(f"📊 Total de registros: {exported}")
+        stage_pipeline.print_stage_report(busy)
 
         return True
 
+    except db.INTERRUPTIONS:
+        raise
     except Exception as e:
         print(f"❌ Erro ao exportar dados: {e}")
         return False
 
 
-def export_summary_csv() -> bool:
+def _new_product_summary(product_id: int) -> Dict:
+    """Estado inicial do resumo de um produto (o nome vem dos registros)"""
+    return {
+        "product_name": None,
+        "total_quantity": 0,
+        "total_cost": 0,
+        "total_revenue": 0,
+        "count_planted": 0,
+        "count_harvested": 0,
+        "count_sold": 0,
+        "avg_growth_period": 0,
+        "total_growth_periods": 0,
+        "growth_period_count": 0,
+    }
+
+
+def _update_product_summary(summary: Dict, record: Dict):
+    """Inclui um registro no resumo do seu produto"""
+    summary["product_name"] = record["product_name"]
+    summary["total_quantity"] += record["quantity"]
+    summary["total_cost"] += record["cost_price"]
+    summary["total_revenue"] += record["sale_price"]
+
+    # Conta status
+    status = record["production_status"]
+    if status == "PLANTED":
+        summary["count_planted"] += 1
+    elif status == "HARVESTED":
+        summary["count_harvested"] += 1
+    elif status == "SOLD":
+        summary["count_sold"] += 1
+
+    # Calcula período de crescimento médio
+    metrics = calculate_metrics(record)
+    if metrics["growth_period_days"] > 0:
+        summary["total_growth_periods"] += metrics["growth_period_days"]
+        summary["growth_period_count"] += 1
+
+
+def _merge_product_summaries(summary: Dict, other: Dict) -> Dict:
+    """Combina dois resumos parciais do mesmo produto"""
+    for key, value in other.items():
+        if key not in ("product_name", "avg_growth_period"):
+            summary[key] += value
+    return summary
+
+
+def _shard_product_summaries(
+    productions=None, max_bytes: int = spill_aggregate.MAX_BYTES_IN_MEMORY
+) -> Iterator[tuple]:
     """
-    Exporta um resumo dos dados por produto
+    Resumos dos produtos de um shard, agrupados por product_id
 
-    Returns:
-        bool: True se exportação foi bem-sucedida
+    Args:
+        productions: Registros do shard atual (padrão: lê o shard)
+        max_bytes: Orçamento dos resumos em memória
+
+    Yields:
+        tuple: (identidade do produto entre shards, resumo com o nome atual)
     """
-    try:
-        productions = db.read_all_agricultural_production()
+    if productions is None:
+        productions = db.stream_agricultural_production()
+
+    with spill_aggregate.SpillingAggregator(
+        key=lambda record: record["product_id"],
+        create=_new_product_summary,
+        update=_update_product_summary,
+        merge=_merge_product_summaries,
+        max_bytes=max_bytes,
+    ) as aggregator:
+        aggregator.add_all(productions)
+
+        for product_id, summary in aggregator.results():
+            key, summary["product_name"] = db.product_identity(
+                product_id, summary["product_name"]
+            )
+            yield key, summary
+
+
+def summarize_by_product(
+    productions=None, max_bytes: int = spill_aggregate.MAX_BYTES_IN_MEMORY
+) -> Iterator[Dict]:
+    """
+    Agrupa registros por produto com totais, contagens e médias
 
-        if not productions:
-            print("❌ Nenhum dado encontrado para exportar!")
-            return False
+    Os registros são agrupados pela chave inteira product_id; o nome só
+    entra na saída, com o nome atual do produto. Como product_id só vale
+    dentro de um shard, os resumos de shards diferentes são combinados pela
+    identidade do produto (db.product_identity).
 
-        data_dir = ensure_data_directory()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"agricultural_summary_{timestamp}.csv"
-        filepath = os.path.join(data_dir, filename)
+    Args:
+        productions: Registros de um único shard (lista ou fluxo de
+            db.stream_agricultural_production); padrão: lê todos os shards
+        max_bytes: Orçamento dos resumos em memória durante a leitura; acima
+            dele os parciais transbordam para disco (spill_aggregate)
 
-        # Agrupa dados por produto
-        product_summary = {}
-
-        for record in productions:
-            product = record["product_name"]
-
-            if product not in product_summary:
-                product_summary[product] = {
-                    "product_name": product,
-                    "total_quantity": 0,
-                    "total_cost": 0,
-                    "total_revenue": 0,
-                    "count_planted": 0,
-                    "count_harvested": 0,
-                    "count_sold": 0,
-                    "avg_growth_period": 0,
-                    "total_growth_periods": 0,
-                    "growth_period_count": 0,
-                }
-
-            summary = product_summary[product]
-            summary["total_quantity"] += record["quantity"]
-            summary["total_cost"] += record["cost_price"]
-            summary["total_revenue"] += record["sale_price"]
-
-            # Conta status
-            status = record["production_status"]
-            if status == "PLANTED":
-                summary["count_planted"] += 1
-            elif status == "HARVESTED":
-                summary["count_harvested"] += 1
-            elif status == "SOLD":
-                summary["count_sold"] += 1
-
-            # Calcula período de crescimento médio
-            metrics = calculate_metrics(record)
-            if metrics["growth_period_days"] > 0:
-                summary["total_growth_periods"] += metrics["growth_period_days"]
-                summary["growth_period_count"] += 1
+    Yields:
+        Dict: Resumo de cada produto, partição a partição (sem reunir todos)
+    """
+    if productions is None:
+        sources = [
+            db.iterate_on_shard(shard, _shard_product_summaries, None, max_bytes)
+            for shard in db.SHARDS
+        ]
+    else:
+        sources = [_shard_product_summaries(productions, max_bytes)]
+
+    # Combina os shards pela identidade do produto
+    with spill_aggregate.SpillingAggregator(
+        key=None,
+        create=None,
+        update=None,
+        merge=_merge_product_summaries,
+        max_bytes=max_bytes,
+    ) as products:
+        for source in sources:
+            for key, summary in source:
+                products.add_state(key, summary)
 
         # Finaliza cálculos
-        for product, summary in product_summary.items():
+        for key, summary in products.results():
             if summary["growth_period_count"] > 0:
                 summary["avg_growth_period"] = round(
                     summary["total_growth_periods"] / summary["growth_period_count"], 1
@@ -240,42 +539,101 @@ def export_summary_csv() -> bool:
             else:
                 summary["total_roi_percent"] = 0
 
-        # Headers para resumo
-        summary_headers = [
-            "product_name",
-            "total_quantity",
-            "total_cost",
-            "total_revenue",
-            "total_profit",
-            "total_roi_percent",
-            "count_planted",
-            "count_harvested",
-            "count_sold",
-            "avg_growth_period",
-        ]
+            # Remove campos auxiliares
+            summary.pop("total_growth_periods", None)
+            summary.pop("growth_period_count", None)
+            yield summary
+
 
-        # Escreve resumo
+def export_summary_csv(approximate: bool = False) -> bool:
+    """
+    Exporta um resumo dos dados por produto
+
+    Args:
+        approximate: Usa os sketches (rápido, com margem de erro) em vez de
+            ler todos os registros
+
+    Returns:
+        bool: True se exportação foi bem-sucedida
+    """
+    if approximate:
+        import sketches
+
+        return sketches.export_approximate_summary_csv()
+
+    try:
+        # Resumos em fluxo, reaproveitados enquanto os dados não mudarem
+        summaries = report_cache.get_or_stream("product_summary", summarize_by_product)
+
+        data_dir = ensure_data_directory()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"agricultural_summary_{timestamp}.csv"
+        filepath = os.path.join(data_dir, filename)
+
+        # Escreve resumo, um produto por vez
+        products = 0
         with open(filepath, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=summary_headers)
+            writer = csv.DictWriter(csvfile, fieldnames=SUMMARY_HEADERS)
             writer.writeheader()
 
-            for summary in product_summary.values():
-                # Remove campos auxiliares
-                summary.pop("total_growth_periods", None)
-                summary.pop("growth_period_count", None)
+            for summary in summaries:
                 writer.writerow(summary)
+                products += 1
+
+        if not products:
+            os.remove(filepath)
+            print("❌ Nenhum dado encontrado para exportar!")
+            return False
 
         print(f"✅ Resumo exportado com sucesso!")
         print(f"📁 Arquivo: {filepath}")
-        print(f"📊 Produtos únicos: {len(product_summary)}")
+        print(f"📊 Produtos únicos: {products}")
 
         return True
 
+    except db.INTERRUPTIONS:
+        raise
     except Exception as e:
         print(f"❌ Erro ao exportar resumo: {e}")
         return False
 
 
+def _monthly_cells() -> List[Dict]:
+    """Células mensais do cubo, ou da tabela base se o cubo falhar ou estiver vazio"""
+    try:
+        # Agrupa por mês de colheita a partir do cubo, sem ler a tabela base
+        cells = rollup.fetch_rollup(("period",), "month")
+    except db.INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"⚠️ Cubo indisponível ({e}), agregando a tabela base")
+        return rollup.fetch_monthly_from_base()
+
+    return cells or rollup.fetch_monthly_from_base()
+
+
+def monthly_analysis_rows() -> List[Dict]:
+    """
+    Totais por mês de colheita, ordenados por mês
+
+    Lê o cubo; se ele não existir ou estiver vazio (ainda não carregado),
+    agrega a tabela base.
+
+    Returns:
+        List[Dict]: Uma linha por mês com as colunas de MONTHLY_HEADERS
+
+    Raises:
+        Exception: Erros ao consultar a tabela base (não ficam no cache)
+    """
+    monthly_data = {}
+    cells = report_cache.get_or_compute("monthly_analysis", _monthly_cells)
+    for cell in cells:
+        cell["year_month"] = cell.pop("period")
+        monthly_data[cell["year_month"]] = cell
+
+    return [monthly_data[month_key] for month_key in sorted(monthly_data)]
+
+
 def export_monthly_analysis() -> bool:
     """
     Exporta análise mensal dos dados
@@ -284,9 +642,9 @@ def export_monthly_analysis() -> bool:
         bool: True se exportação foi bem-sucedida
     """
     try:
-        productions = db.read_all_agricultural_production()
+        monthly_data = monthly_analysis_rows()
 
-        if not productions:
+        if not monthly_data:
             print("❌ Nenhum dados encontrado para exportar!")
             return False
 
@@ -295,85 +653,13 @@ def export_monthly_analysis() -> bool:
         filename = f"monthly_analysis_{timestamp}.csv"
         filepath = os.path.join(data_dir, filename)
 
-        # Agrupa por mês de colheita
-        monthly_data = {}
-
-        for record in productions:
-            harvest_date = record.get("harvest_date")
-            if not harvest_date:
-                continue
-
-            # Extrai ano e mês
-            if isinstance(harvest_date, str):
-                if harvest_date:
-                    try:
-                        date_obj = datetime.strptime(harvest_date, "%Y-%m-%d")
-                        month_key = date_obj.strftime("%Y-%m")
-                    except:
-                        continue
-                else:
-                    continue
-            else:
-                month_key = harvest_date.strftime("%Y-%m")
-
-            if month_key not in monthly_data:
-                monthly_data[month_key] = {
-                    "year_month": month_key,
-                    "total_quantity": 0,
-                    "total_cost": 0,
-                    "total_revenue": 0,
-                    "production_count": 0,
-                }
-
-            monthly = monthly_data[month_key]
-            monthly["total_quantity"] += record["quantity"]
-            monthly["total_cost"] += record["cost_price"]
-            monthly["total_revenue"] += record["sale_price"]
-            monthly["production_count"] += 1
-
-        # Calcula métricas mensais
-        for month_key, monthly in monthly_data.items():
-            monthly["total_profit"] = monthly["total_revenue"] - monthly["total_cost"]
-
-            if monthly["total_cost"] > 0:
-                monthly["roi_percent"] = round(
-                    (monthly["total_profit"] / monthly["total_cost"]) * 100, 2
-                )
-                monthly["efficiency"] = round(
-                    monthly["total_quantity"] / monthly["total_cost"], 4
-                )
-            else:
-                monthly["roi_percent"] = 0
-                monthly["efficiency"] = 0
-
-            if monthly["production_count"] > 0:
-                monthly["avg_quantity_per_production"] = round(
-                    monthly["total_quantity"] / monthly["production_count"], 2
-                )
-            else:
-                monthly["avg_quantity_per_production"] = 0
-
-        # Headers mensais
-        monthly_headers = [
-            "year_month",
-            "production_count",
-            "total_quantity",
-            "total_cost",
-            "total_revenue",
-            "total_profit",
-            "roi_percent",
-            "efficiency",
-            "avg_quantity_per_production",
-        ]
-
         # Escreve dados mensais
         with open(filepath, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=monthly_headers)
+            writer = csv.DictWriter(
+                csvfile, fieldnames=MONTHLY_HEADERS, extrasaction="ignore"
+            )
             writer.writeheader()
-
-            # Ordena por mês
-            for month_key in sorted(monthly_data.keys()):
-                writer.writerow(monthly_data[month_key])
+            writer.writerows(monthly_data)
 
         print(f"✅ Análise mensal exportada com sucesso!")
         print(f"📁 Arquivo: {filepath}")
@@ -381,6 +667,8 @@ def export_monthly_analysis() -> bool:
 
         return True
 
+    except db.INTERRUPTIONS:
+        raise
     except Exception as e:
         print(f"❌ Erro ao exportar análise mensal: {e}")
         return False
@@ -391,14 +679,27 @@ def main():
     print("🌾 SISTEMA DE EXPORTAÇÃO CSV")
     print("=" * 40)
 
-    print("\n1. Exportando dados completos...")
-    export_to_csv()
-
-    print("\n2. Exportando resumo por produto...")
-    export_summary_csv()
-
-    print("\n3. Exportando análise mensal...")
-    export_monthly_analysis()
+    if "--resume" in sys.argv:
+        print("\nRetomando exportação interrompida...")
+        with profiling.profile_action("export_to_csv_resume"):
+            export_to_csv(resume=True)
+        return
+
+    import columnar_export
+    import stream_stats
+
+    # Com --profile, cada exportação gera um perfil em results/
+    steps = [
+        ("Exportando dados completos", export_to_csv),
+        ("Exportando resumo por produto", export_summary_csv),
+        ("Exportando análise mensal", export_monthly_analysis),
+        ("Exportando estatísticas por produto", stream_stats.export_statistics_csv),
+        ("Exportando formato colunar", columnar_export.export_all_columnar),
+    ]
+    for number, (title, export) in enumerate(steps, start=1):
+        print(f"\n{number}. {title}...")
+        with profiling.profile_action(export.__name__):
+            export()
 
     print("\n✅ Todas as exportações concluídas!")
 
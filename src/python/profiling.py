@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Modo de perfil (--profile) para as opções do app, as exportações e o setup
+
+Com --profile na linha de comando, cada ação envolvida por profile_action
+roda sob cProfile e tracemalloc. Ao final são gravados em results/:
+- <ação>_<data>.prof: perfil completo (abra com pstats ou snakeviz)
+- <ação>_<data>.txt: funções mais custosas e maiores alocações de memória
+
+e é impresso um resumo do tempo gasto esperando o banco, calculando em
+Python e lendo/gravando arquivos. A divisão usa o tempo próprio de cada
+função: leituras de socket e o driver contam como banco; chamadas de
+arquivo (io, fsync, open) como arquivos; o resto como Python. Threads
+iniciadas durante a ação (estágios do pipeline, workers da análise) ganham
+um perfil próprio, somado ao da thread principal ao fim da ação; threads que
+ainda estiverem rodando nesse momento ficam de fora (o resumo diz quantas) e
+têm o perfil desligado.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 20
+
+# Ordem de exibição das categorias do resumo
+CATEGORIES = {
+    "db": "banco",
+    "compute": "Python",
+    "file_io": "arquivos",
+    "wait": "espera (threads)",
+    "input": "digitação",
+}
+
+_enabled = "--profile" in sys.argv
+# Ação sendo perfilada (blocos aninhados entram no perfil da externa)
+_active = None
+
+
+def enabled() -> bool:
+    """Indica se o modo de perfil está ativo"""
+    return _enabled
+
+
+def enable(active: bool = True):
+    """Ativa ou desativa o modo de perfil (além da opção --profile)"""
+    global _enabled
+    _enabled = active
+
+
+def _category(filename: str, function: str) -> str:
+    """Categoria de uma função do perfil pelo arquivo e nome"""
+    if "input" in function and filename == "~":
+        return "input"
+    if "oracledb" in filename or "_socket.socket" in function or "_ssl." in function:
+        return "db"
+    if "select." in function or "poll" in function:
+        return "db"
+    if filename == "~" and (
+        "_thread.lock" in function or "acquire" in function or "time.sleep" in function
+    ):
+        return "wait"
+    if filename == "~" and (
+        "_io." in function
+        or "posix." in function
+        or "nt." in function
+        or "io.open" in function
+        or "mmap" in function
+    ):
+        return "file_io"
+    return "compute"
+
+
+def time_split(stats: pstats.Stats) -> Dict[str, float]:
+    """
+    Divide o tempo medido entre banco, Python, arquivos, espera e digitação
+
+    Returns:
+        Dict[str, float]: Segundos por categoria (ver CATEGORIES)
+    """
+    split = {category: 0.0 for category in CATEGORIES}
+    for (filename, _, function), (_, _, self_time, _, _) in stats.stats.items():
+        split[_category(filename, function)] += self_time
+    return split
+
+
+def _write_report(path: str, name: str, stats: pstats.Stats, snapshot, peak: int):
+    """Grava o texto com as funções mais custosas e as maiores alocações"""
+    buffer = io.StringIO()
+    stats.stream = buffer
+    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+    with open(path, "w", encoding="utf-8") as report:
+        report.write(f"Perfil: {name}\n")
+        report.write(f"Gerado em: {datetime.now():%d/%m/%Y %H:%M:%S}\n\n")
+        report.write("== Tempo por categoria (s) ==\n")
+        for category, seconds in time_split(stats).items():
+            report.write(f"{CATEGORIES[category]:<18} {seconds:10.3f}\n")
+        report.write(f"\n== Pico de memória: {peak / 1024 / 1024:.1f} MB ==\n")
+        report.write(f"\n== Maiores alocações (top {TOP_ALLOCATIONS}) ==\n")
+        for statistic in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+            report.write(f"{statistic}\n")
+        report.write(f"\n== Funções por tempo acumulado (top {TOP_FUNCTIONS}) ==\n")
+        report.write(buffer.getvalue())
+
+
+def print_summary(
+    name: str,
+    wall: float,
+    split: Dict[str, float],
+    peak: int,
+    paths,
+    threads: int = 0,
+    running: int = 0,
+):
+    """Imprime o resumo de uma ação perfilada"""
+    print(f"\n🔬 Perfil de '{name}': {wall:.2f}s, pico de memória {peak / 1024 / 1024:.1f} MB")
+    if threads:
+        print(f"   🧵 Inclui {threads} thread(s) além da principal")
+    if running:
+        print(f"   ⏭️ {running} thread(s) ainda em execução ficaram de fora")
+    measured = sum(split.values()) or 1
+    for category, seconds in split.items():
+        if seconds >= 0.005:
+            share = seconds / measured * 100
+            print(f"   {CATEGORIES[category]:<18} {seconds:8.2f}s ({share:5.1f}%)")
+    for path in paths:
+        print(f"   📄 {path}")
+
+
+def _profile_new_threads(
+    workers: List[Tuple[threading.Thread, cProfile.Profile]], finished: threading.Event
+):
+    """
+    Função para threading.setprofile que liga um cProfile em cada nova thread
+
+    A função roda no primeiro evento da thread e é trocada pelo perfil dela.
+    Quando o interpretador só aceita um perfil ativo por vez (Python 3.12+,
+    onde o perfil da thread principal já vê todas as threads), a thread segue
+    sem perfil próprio.
+
+    Um perfil só pode ser desligado pela própria thread: o relógio de cada
+    perfil confere finished e, depois do fim da ação, desliga o perfil no
+    próximo evento da thread (diário, fsync e executores sobrevivem à ação).
+    """
+    lock = threading.Lock()
+    removed = threading.local()
+
+    def timer() -> float:
+        # O relógio roda dentro do próprio perfil: a thread guarda uma
+        # referência a ele até terminar, para que setprofile(None) não o
+        # destrua no meio da chamada (a destruição também consulta o relógio)
+        if (
+            finished.is_set()
+            and getattr(removed, "profiler", None) is None
+            and sys.getprofile() is not None
+        ):
+            removed.profiler = sys.getprofile()
+            sys.setprofile(None)
+        return time.perf_counter()
+
+    def start_thread_profile(frame, event, arg):
+        sys.setprofile(None)
+        if finished.is_set():
+            return
+        profiler = cProfile.Profile(timer)
+        try:
+            profiler.enable()
+        except ValueError:
+            return
+        with lock:
+            workers.append((threading.current_thread(), profiler))
+
+    return start_thread_profile
+
+
+def _merged_stats(
+    profiler: cProfile.Profile, workers: List[Tuple[threading.Thread, cProfile.Profile]]
+) -> Tuple[pstats.Stats, int, int]:
+    """
+    Soma ao perfil principal os perfis das threads já encerradas
+
+    Returns:
+        Tuple[pstats.Stats, int, int]: Estatísticas combinadas, número de
+        threads somadas e de threads ainda em execução (deixadas de fora)
+    """
+    stats = pstats.Stats(profiler)
+    merged = 0
+    running = 0
+    for thread, worker_profiler in list(workers):
+        if thread.is_alive():
+            running += 1
+            continue
+        worker_profiler.create_stats()
+        if worker_profiler.stats:
+            stats.add(pstats.Stats(worker_profiler))
+            merged += 1
+    return stats, merged, running
+
+
+@contextmanager
+def profile_action(name: str):
+    """
+    Perfila o bloco quando o modo de perfil está ativo
+
+    Exemplo:
+        with profiling.profile_action("export_summary_csv"):
+            export_summary_csv()
+    """
+    global _active
+    if not _enabled or _active is not None:
+        yield
+        return
+
+    _active = name
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    workers: List[Tuple[threading.Thread, cProfile.Profile]] = []
+    finished = threading.Event()
+    threading.setprofile(_profile_new_threads(workers, finished))
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        threading.setprofile(None)
+        finished.set()
+        _active = None
+        wall = time.perf_counter() - started
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+        )
+        _, peak = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        base = os.path.join(RESULTS_DIR, f"{name}_{datetime.now():%Y%m%d_%H%M%S}")
+        stats, threads, running = _merged_stats(profiler, workers)
+        stats.dump_stats(f"{base}.prof")
+        _write_report(f"{base}.txt", name, stats, snapshot, peak)
+        print_summary(
+            name,
+            wall,
+            time_split(stats),
+            peak,
+            [f"{base}.prof", f"{base}.txt"],
+            threads,
+            running,
+        )
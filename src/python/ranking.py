@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Rankings (top-K) de produtos e produções por métrica
+
+Usa FETCH FIRST ... WITH TIES no banco e, como alternativa, um heap limitado
+a K elementos sobre o fluxo de registros, mantendo memória O(K).
+"""
+
+import heapq
+from typing import Dict, Iterable, List
+import db
+from export_csv import calculate_metrics
+
+
+# Métricas por produto (agregadas), com as mesmas regras de gerar_analise
+PRODUCT_METRICS_SQL = {
+    "roi": "(SUM(NVL(sale_price, 0)) - SUM(cost_price)) / SUM(cost_price) * 100",
+    "profit": "SUM(NVL(sale_price, 0)) - SUM(cost_price)",
+    "efficiency": "SUM(quantity) / SUM(cost_price)",
+    "revenue_per_unit": "SUM(NVL(sale_price, 0)) / SUM(quantity)",
+}
+
+# Métricas por produção (registro), com as mesmas regras de calculate_metrics
+PRODUCTION_METRICS_SQL = {
+    "roi": db.ROI_SQL,
+    "profit": (
+        "CASE WHEN cost_price > 0 AND sale_price > 0 "
+        "THEN sale_price - cost_price ELSE 0 END"
+    ),
+    "efficiency": "CASE WHEN cost_price > 0 THEN quantity / cost_price ELSE 0 END",
+    "revenue_per_unit": (
+        "CASE WHEN quantity > 0 AND sale_price > 0 "
+        "THEN sale_price / quantity ELSE 0 END"
+    ),
+}
+
+# Nome da métrica em calculate_metrics para o ranking por produção
+PRODUCTION_METRIC_KEYS = {
+    "roi": "roi_percent",
+    "profit": "profit",
+    "efficiency": "production_efficiency",
+    "revenue_per_unit": "revenue_per_unit",
+}
+
+
+def top_k(items: Iterable, k: int, key) -> List:
+    """
+    Seleciona os K maiores itens de um fluxo, incluindo empates com o K-ésimo
+
+    Args:
+        items: Fluxo de itens (consumido uma única vez)
+        k: Número de posições do ranking
+        key: Função que devolve o valor de ordenação (None ignora o item)
+
+    Returns:
+        List: Itens em ordem decrescente, estável para valores iguais
+    """
+    heap = []  # (valor, ordem de chegada, item) dos K melhores
+    ties = []  # itens empatados com o K-ésimo valor que não couberam no heap
+
+    if k <= 0:
+        return []
+
+    for order, item in enumerate(items):
+        value = key(item)
+        if value is None:
+            continue
+        if len(heap) < k:
+            heapq.heappush(heap, (value, -order, item))
+        elif value > heap[0][0]:
+            evicted = heapq.heapreplace(heap, (value, -order, item))
+            if evicted[0] == heap[0][0]:
+                ties.append(evicted)
+            else:
+                ties = []
+        elif value == heap[0][0]:
+            ties.append((value, -order, item))
+
+    ranked = sorted(heap + ties, key=lambda entry: (entry[0], entry[1]), reverse=True)
+    return [item for _, _, item in ranked]
+
+
+def rank_product_aggregates(aggregates: Iterable[Dict], metric: str, k: int) -> List[Dict]:
+    """
+    Calcula o ranking sobre agregados por produto já calculados
+
+    Args:
+        aggregates: Dicionários com product_name, quantity, investment,
+            revenue e production_count
+        metric: 'roi', 'profit', 'efficiency' ou 'revenue_per_unit'
+        k: Número de posições
+
+    Returns:
+        List[Dict]: Ranking com as chaves 'rank' e 'metric_value'
+    """
+    # Produtos sem investimento ficam fora do ranking, como em gerar_analise
+    candidates = (
+        _product_metrics(dict(stats)) for stats in aggregates if stats["investment"] > 0
+    )
+    ranked = top_k(candidates, k, key=lambda stats: stats[metric])
+    for stats in ranked:
+        stats["metric_value"] = stats[metric]
+    return _assign_ranks(ranked)
+
+
+def _product_rows(rows: Iterable[Dict]) -> List[Dict]:
+    """Agrega registros por produto (memória proporcional ao nº de produtos)"""
+    products = {}
+    for record in rows:
+        name = record["product_name"]
+        if name not in products:
+            products[name] = {
+                "product_name": name,
+                "quantity": 0,
+                "investment": 0,
+                "revenue": 0,
+                "production_count": 0,
+            }
+        stats = products[name]
+        stats["quantity"] += record["quantity"]
+        stats["investment"] += record["cost_price"]
+        stats["revenue"] += record["sale_price"] or 0
+        stats["production_count"] += 1
+
+    return list(products.values())
+
+
+def _product_metrics(stats: Dict) -> Dict:
+    """Completa as métricas derivadas de um agregado por produto"""
+    investment = stats["investment"]
+    quantity = stats["quantity"]
+    stats["profit"] = stats["revenue"] - investment
+    stats["roi"] = stats["profit"] / investment * 100 if investment > 0 else None
+    stats["efficiency"] = quantity / investment if investment > 0 else None
+    stats["revenue_per_unit"] = stats["revenue"] / quantity if quantity > 0 else None
+    return stats
+
+
+def rank_rows(rows: Iterable[Dict], metric: str, k: int, by: str = "product") -> List[Dict]:
+    """
+    Calcula o ranking sobre um fluxo de registros, sem consultar o banco
+
+    Args:
+        rows: Registros no formato de db.read_all_agricultural_production
+        metric: 'roi', 'profit', 'efficiency' ou 'revenue_per_unit'
+        k: Número de posições
+        by: 'product' (agregado por produto) ou 'production' (por registro)
+
+    Returns:
+        List[Dict]: Ranking com as chaves 'rank' e 'metric_value'
+    """
+    if by == "product":
+        return rank_product_aggregates(_product_rows(rows), metric, k)
+    else:
+        metric_key = PRODUCTION_METRIC_KEYS[metric]
+
+        def with_value(record):
+            record = dict(record)
+            record["metric_value"] = calculate_metrics(record)[metric_key]
+            return record
+
+        ranked = top_k(
+            (with_value(record) for record in rows),
+            k,
+            key=lambda record: record["metric_value"],
+        )
+
+    return _assign_ranks(ranked)
+
+
+def _assign_ranks(ranked: List[Dict]) -> List[Dict]:
+    """Numera o ranking; valores iguais recebem a mesma posição"""
+    previous = None
+    for position, entry in enumerate(ranked, 1):
+        if previous is None or entry["metric_value"] != previous["metric_value"]:
+            entry["rank"] = position
+        else:
+            entry["rank"] = previous["rank"]
+        previous = entry
+    return ranked
+
+
+def _ranking_statement(
+    metric: str, by: str, bounds: List[tuple], by_status: bool, limited: bool = True
+) -> str:
+    """
+    Registra (uma vez) o comando SQL de um formato de ranking
+
+    Com limited=False, o ranking por produto devolve os totais de todos os
+    produtos, sem métrica nem FETCH FIRST: com vários shards, o top-K só pode
+    ser escolhido depois de somar os totais de cada produto.
+    """
+    name = (
+        f"ranking[{by}:{metric}|{','.join(f'{c}:{s}' for c, s in bounds)}"
+        f"|{by_status}|{limited}]"
+    )
+    if name in db.STATEMENTS:
+        return name
+
+    predicates = [
+        f"{db.RANGE_COLUMNS[column]} {'>=' if side == 'min' else '<='} :{side}_{column}"
+        for column, side in bounds
+    ]
+    if by_status:
+        predicates.append("production_status = :production_status")
+    where = "WHERE " + " AND ".join(predicates) if predicates else ""
+    source = db.record_source_sql(bounds, by_status)
+
+    if by == "product" and not limited:
+        sql = f"""
+            SELECT product_name,
+                   SUM(quantity) AS quantity,
+                   SUM(cost_price) AS investment,
+                   SUM(NVL(sale_price, 0)) AS revenue,
+                   COUNT(*) AS production_count
+            FROM {source}
+            {where}
+            GROUP BY product_name
+            """
+    elif by == "product":
+        sql = f"""
+            SELECT product_name,
+                   SUM(quantity) AS quantity,
+                   SUM(cost_price) AS investment,
+                   SUM(NVL(sale_price, 0)) AS revenue,
+                   COUNT(*) AS production_count,
+                   {PRODUCT_METRICS_SQL[metric]} AS metric_value
+            FROM {source}
+            {where}
+            GROUP BY product_name
+            HAVING SUM(cost_price) > 0
+            ORDER BY metric_value DESC
+            FETCH FIRST :k ROWS WITH TIES
+            """
+    else:
+        sql = f"""
+            SELECT {db.RECORD_COLUMNS_SQL},
+                   {PRODUCTION_METRICS_SQL[metric]} AS metric_value
+            FROM {source}
+            {where}
+            ORDER BY metric_value DESC
+            FETCH FIRST :k ROWS WITH TIES
+            """
+    return db.register_statement(name, sql)
+
+
+def _fetch_ranking_rows(statement: str, params: Dict) -> List[Dict]:
+    """Linhas de um comando de ranking no shard atual"""
+    connection = db.get_connection()
+    if not connection:
+        raise ConnectionError("Could not connect to the database")
+
+    try:
+        cursor = connection.cursor()
+        rows = db.fetchall_statement(cursor, statement, params)
+        columns = [col[0].lower() for col in cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def _merge_product_totals(shard_rows: Iterable[List[Dict]]) -> List[Dict]:
+    """Soma os totais por produto de cada shard (nomes comparados pela chave de busca)"""
+    products = {}
+    for rows in shard_rows:
+        for row in rows:
+            key = db.product_search_key(row["product_name"])
+            if key not in products:
+                products[key] = row
+                continue
+            stats = products[key]
+            for column in ("quantity", "investment", "revenue", "production_count"):
+                stats[column] = (stats[column] or 0) + (row[column] or 0)
+    return list(products.values())
+
+
+def top_ranking(
+    metric: str = "roi",
+    k: int = 5,
+    by: str = "product",
+    production_status: str = None,
+    date_from: str = None,
+    date_to: str = None,
+) -> List[Dict]:
+    """
+    Ranking top-K por métrica, calculado no banco de cada shard
+
+    Os resultados dos shards são combinados com top_k. Se a consulta no banco
+    falhar, recorre ao fluxo de registros com heap limitado (memória O(K) por
+    produção, O(nº de produtos) por produto).
+
+    Args:
+        metric: 'roi', 'profit', 'efficiency' ou 'revenue_per_unit'
+        k: Número de posições (empates com a última posição são incluídos)
+        by: 'product' (agregado por produto) ou 'production' (por registro)
+        production_status: Filtra pelo status
+        date_from, date_to: Filtra pela data de colheita ('YYYY-MM-DD')
+
+    Returns:
+        List[Dict]: Ranking com as chaves 'rank' e 'metric_value'
+    """
+    if metric not in PRODUCT_METRICS_SQL or by not in ("product", "production"):
+        print(f"❌ Ranking inválido: {by}/{metric}")
+        return []
+
+    # Período filtrado pela data de colheita
+    ranges = {"harvest_date": (date_from, date_to)} if date_from or date_to else {}
+    bounds, params = db.build_range_binds(ranges)
+    params["k"] = k
+    if production_status:
+        params["production_status"] = production_status
+
+    # Totais por produto só se somam antes do top-K; por produção, o top-K
+    # geral está contido na união dos top-K de cada shard
+    merge_totals = by == "product" and len(db.SHARDS) > 1
+    statement = _ranking_statement(
+        metric, by, bounds, bool(production_status), limited=not merge_totals
+    )
+    try:
+        results = db.scatter_gather(_fetch_ranking_rows, statement, params)
+    except db.INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"⚠️ Ranking no banco indisponível, usando fluxo de registros: {e}")
+        rows = db.stream_across_shards(
+            db.stream_agricultural_production, ranges, production_status
+        )
+        return rank_rows(rows, metric, k, by)
+
+    if merge_totals:
+        return rank_product_aggregates(
+            _merge_product_totals(results.values()), metric, k
+        )
+    if by == "product":
+        ranked = [_product_metrics(stats) for rows in results.values() for stats in rows]
+        return _assign_ranks(ranked)
+
+    for shard, rows in results.items():
+        for record in rows:
+            record["shard"] = shard
+    ranked = top_k(
+        (record for rows in results.values() for record in rows),
+        k,
+        key=lambda record: record["metric_value"],
+    )
+    return _assign_ranks(ranked)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Cache de resultados de relatórios, indexado pela versão dos dados
+
+A chave de cada entrada inclui db.get_data_versions() (nº de registros, maior
+updated_at e contador de alterações de cada shard), então qualquer escrita,
+em qualquer banco, gera chaves novas e os resultados antigos deixam de ser
+usados. Só são guardados resultados de funções que levantam exceção quando
+falham, e nunca resultados vazios: uma falha ou uma tabela momentaneamente
+vazia não fica presa no cache até a próxima escrita. As entradas ficam em
+src/data/cache e as menos usadas recentemente são removidas quando o total
+passa de MAX_CACHE_BYTES.
+
+get_or_stream é a versão em fluxo, para relatórios grandes demais para a
+memória: os itens são gravados um a um enquanto passam para quem os consome.
+"""
+
+import hashlib
+import os
+import pickle
+from typing import Callable, Dict, Iterator
+import db
+
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "cache")
+MAX_CACHE_BYTES = 50 * 1024 * 1024
+
+
+def _cache_path(report_name: str, params: Dict, version: tuple) -> str:
+    """Arquivo da entrada de um relatório para uma versão dos dados"""
+    key = repr((report_name, sorted((params or {}).items()), version))
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(CACHE_DIR, f"{report_name}_{digest}.pickle")
+
+
+def _evict(max_bytes: int = MAX_CACHE_BYTES):
+    """Remove as entradas menos usadas até o cache caber no limite"""
+    entries = []
+    for filename in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, filename)
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def get_or_compute(
+    report_name: str,
+    compute: Callable,
+    params: Dict = None,
+    is_empty: Callable = None,
+):
+    """
+    Devolve o resultado em cache ou calcula e guarda
+
+    Args:
+        report_name: Nome do relatório (prefixo dos arquivos de cache)
+        compute: Função sem argumentos que calcula o resultado; deve levantar
+            exceção em caso de erro (nunca devolver um resultado vazio)
+        params: Parâmetros que mudam o resultado (fazem parte da chave)
+        is_empty: Diz se um resultado está vazio e não deve ser guardado
+            (padrão: not resultado)
+
+    Returns:
+        O resultado de compute(), possivelmente vindo do cache
+    """
+    version = db.get_data_versions()
+    if version is None:
+        # Sem versão dos dados não há como validar o cache
+        return compute()
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(report_name, params, version)
+
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as cache_file:
+                result = pickle.load(cache_file)
+            os.utime(path)  # marca como usado recentemente
+            return result
+        except (OSError, pickle.PickleError, EOFError):
+            pass
+
+    result = compute()
+    if is_empty(result) if is_empty else not result:
+        return result
+
+    try:
+        # Grava em arquivo temporário e renomeia: leitores nunca veem meia entrada
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as cache_file:
+            pickle.dump(result, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+        _evict()
+    except OSError as e:
+        print(f"⚠️ Não foi possível gravar o cache de {report_name}: {e}")
+
+    return result
+
+
+def _read_items(path: str) -> Iterator:
+    """Itens de uma entrada gravada por get_or_stream"""
+    with open(path, "rb") as cache_file:
+        while True:
+            try:
+                yield pickle.load(cache_file)
+            except EOFError:
+                return
+
+
+def get_or_stream(report_name: str, produce: Callable, params: Dict = None) -> Iterator:
+    """
+    Versão em fluxo de get_or_compute: nenhum dos caminhos reúne os itens
+
+    Args:
+        report_name: Nome do relatório (prefixo dos arquivos de cache)
+        produce: Função sem argumentos que devolve um iterador de itens; deve
+            levantar exceção em caso de erro
+        params: Parâmetros que mudam o resultado (fazem parte da chave)
+
+    Yields:
+        Os itens de produce(), possivelmente vindos do cache. A entrada só é
+        publicada se o fluxo for consumido até o fim, sem erro e com itens.
+    """
+    version = db.get_data_versions()
+    if version is None:
+        yield from produce()
+        return
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(report_name, params, version)
+
+    if os.path.exists(path):
+        try:
+            os.utime(path)  # marca como usado recentemente
+            yield from _read_items(path)
+            return
+        except FileNotFoundError:
+            pass  # removida por _evict entre a verificação e a leitura
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    cache_file = None
+    try:
+        try:
+            cache_file = open(temp_path, "wb")
+        except OSError as e:
+            print(f"⚠️ Não foi possível gravar o cache de {report_name}: {e}")
+
+        count = 0
+        for item in produce():
+            if cache_file is not None:
+                try:
+                    pickle.dump(item, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+                except OSError as e:
+                    print(f"⚠️ Cache de {report_name} não gravado: {e}")
+                    cache_file.close()
+                    cache_file = None
+            count += 1
+            yield item
+
+        if cache_file is not None and count:
+            cache_file.close()
+            cache_file = None
+            try:
+                os.replace(temp_path, path)
+                _evict()
+            except OSError as e:
+                print(f"⚠️ Cache de {report_name} não gravado: {e}")
+    finally:
+        if cache_file is not None:
+            cache_file.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def clear_cache():
+    """Remove todas as entradas do cache"""
+    if os.path.isdir(CACHE_DIR):
+        _evict(max_bytes=0)
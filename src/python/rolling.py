@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Análises em janela móvel por produto e mês de colheita
+
+- ROI acumulado dos últimos N meses (trailing ROI)
+- Médias móveis de quantidade e custo
+- Variação mês a mês de quantidade e custo
+
+O caminho principal usa funções de janela no banco sobre o cubo
+production_rollup; o caminho em fluxo usa um acumulador de janela deslizante
+com custo O(1) por passo. Com vários shards, as células mensais de todos são
+somadas antes de aplicar a janela. Meses sem produção contam como zero.
+"""
+
+import csv
+import os
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List
+import db
+import rollup
+from export_csv import ensure_data_directory
+
+
+# Índice do mês (ano * 12 + mês) torna a janela RANGE imune a meses faltantes
+MONTH_INDEX_SQL = (
+    "TO_NUMBER(SUBSTR(year_month, 1, 4)) * 12 + TO_NUMBER(SUBSTR(year_month, 6, 2))"
+)
+
+ROLLING_HEADERS = [
+    "product_name",
+    "year_month",
+    "total_quantity",
+    "total_cost",
+    "total_revenue",
+    "trailing_roi_percent",
+    "moving_avg_quantity",
+    "moving_avg_cost",
+    "quantity_delta",
+    "cost_delta",
+]
+
+
+def _rolling_statement(window: int) -> str:
+    """Registra (uma vez) o comando com funções de janela para N meses"""
+    name = f"rolling[{window}]"
+    if name in db.STATEMENTS:
+        return name
+
+    frame = f"RANGE BETWEEN {window - 1} PRECEDING AND CURRENT ROW"
+    previous = "RANGE BETWEEN 1 PRECEDING AND 1 PRECEDING"
+    sql = f"""
+        WITH monthly AS (
+            SELECT product_name, year_month,
+                   {MONTH_INDEX_SQL} AS month_index,
+                   SUM(total_quantity) AS total_quantity,
+                   SUM(total_cost) AS total_cost,
+                   SUM(total_revenue) AS total_revenue
+            FROM production_rollup
+            WHERE year_month <> 'N/A'
+              AND (:product_name IS NULL OR product_name = :product_name)
+            GROUP BY product_name, year_month
+        ),
+        windowed AS (
+            SELECT product_name, year_month, month_index,
+                   total_quantity, total_cost, total_revenue,
+                   SUM(total_revenue) OVER (
+                       PARTITION BY product_name ORDER BY month_index {frame}
+                   ) AS window_revenue,
+                   SUM(total_cost) OVER (
+                       PARTITION BY product_name ORDER BY month_index {frame}
+                   ) AS window_cost,
+                   SUM(total_quantity) OVER (
+                       PARTITION BY product_name ORDER BY month_index {frame}
+                   ) AS window_quantity,
+                   NVL(SUM(total_quantity) OVER (
+                       PARTITION BY product_name ORDER BY month_index {previous}
+                   ), 0) AS previous_quantity,
+                   NVL(SUM(total_cost) OVER (
+                       PARTITION BY product_name ORDER BY month_index {previous}
+                   ), 0) AS previous_cost
+            FROM monthly
+        )
+        SELECT product_name, year_month, total_quantity, total_cost, total_revenue,
+               CASE WHEN window_cost > 0
+                    THEN ROUND((window_revenue - window_cost) / window_cost * 100, 2)
+                    ELSE 0 END AS trailing_roi_percent,
+               ROUND(window_quantity / {window}, 2) AS moving_avg_quantity,
+               ROUND(window_cost / {window}, 2) AS moving_avg_cost,
+               total_quantity - previous_quantity AS quantity_delta,
+               total_cost - previous_cost AS cost_delta
+        FROM windowed
+        ORDER BY product_name, month_index
+        """
+    return db.register_statement(name, sql)
+
+
+def _fetch_rolling_rows(window: int, product_name: str = None) -> List[Dict]:
+    """Linhas do comando com funções de janela no shard atual"""
+    connection = db.get_connection()
+    if not connection:
+        raise ConnectionError("Could not connect to the database")
+
+    try:
+        cursor = connection.cursor()
+        rows = db.fetchall_statement(
+            cursor, _rolling_statement(window), {"product_name": product_name}
+        )
+        columns = [col[0].lower() for col in cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def rolling_metrics(window: int = 12, product_name: str = None) -> List[Dict]:
+    """
+    Calcula as métricas em janela móvel de todos os shards
+
+    Com um único shard, as janelas são calculadas no banco. Janelas de
+    shards diferentes não se somam: com vários shards, as células mensais
+    de cada um são somadas (rollup.fetch_rollup) e a janela é aplicada aqui.
+
+    Args:
+        window: Tamanho da janela em meses
+        product_name: Limita a um produto (nome exato)
+
+    Returns:
+        List[Dict]: Uma linha por produto e mês, com as colunas ROLLING_HEADERS
+    """
+    try:
+        if len(db.SHARDS) == 1:
+            results = db.scatter_gather(_fetch_rolling_rows, window, product_name)
+            return next(iter(results.values()))
+
+        cells = rollup.fetch_rollup(
+            ("product_name", "period"), "month", product_name=product_name
+        )
+        return list(rolling_from_cells(cells, window))
+
+    except db.INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"❌ Erro ao calcular janelas móveis: {e}")
+        return []
+
+
+class TrailingWindow:
+    """
+    Acumulador de janela deslizante de N meses com custo O(1) por passo
+
+    Mantém somas correntes; a cada mês adicionado, os meses que saíram da
+    janela são subtraídos, sem recalcular a janela inteira.
+    """
+
+    FIELDS = ("total_quantity", "total_cost", "total_revenue")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.entries = deque()  # (índice do mês, valores)
+        self.sums = dict.fromkeys(self.FIELDS, 0)
+
+    def push(self, month_index: int, values: Dict) -> Dict:
+        """Adiciona um mês e devolve as somas da janela que termina nele"""
+        while self.entries and self.entries[0][0] <= month_index - self.window:
+            _, expired = self.entries.popleft()
+            for field in self.FIELDS:
+                self.sums[field] -= expired[field]
+
+        self.entries.append((month_index, values))
+        for field in self.FIELDS:
+            self.sums[field] += values[field]
+        return dict(self.sums)
+
+
+def _month_index(year_month: str) -> int:
+    """Converte 'YYYY-MM' no índice ano * 12 + mês"""
+    return int(year_month[:4]) * 12 + int(year_month[5:7])
+
+
+def monthly_cells_from_rows(rows: Iterable[Dict]) -> List[Dict]:
+    """
+    Agrupa registros por produto e mês de colheita, ordenados para a janela
+
+    Args:
+        rows: Registros no formato de db.read_all_agricultural_production
+
+    Returns:
+        List[Dict]: Células no formato de rollup.query_rollup
+    """
+    cells = {}
+    for record in rows:
+        harvest_date = record.get("harvest_date")
+        if not harvest_date:
+            continue
+        if isinstance(harvest_date, str):
+            harvest_date = datetime.strptime(harvest_date, "%Y-%m-%d")
+
+        key = (record["product_name"], harvest_date.strftime("%Y-%m"))
+        if key not in cells:
+            cells[key] = {
+                "product_name": key[0],
+                "period": key[1],
+                "total_quantity": 0,
+                "total_cost": 0,
+                "total_revenue": 0,
+            }
+        cell = cells[key]
+        cell["total_quantity"] += record["quantity"]
+        cell["total_cost"] += record["cost_price"] or 0
+        cell["total_revenue"] += record["sale_price"] or 0
+
+    return [cells[key] for key in sorted(cells)]
+
+
+def rolling_from_cells(cells: Iterable[Dict], window: int = 12):
+    """
+    Calcula as métricas em janela móvel sobre células ordenadas
+
+    Args:
+        cells: Células por produto e mês, ordenadas por produto e período
+            (rollup.query_rollup ou monthly_cells_from_rows)
+        window: Tamanho da janela em meses
+
+    Yields:
+        Dict: Uma linha por produto e mês, com as colunas ROLLING_HEADERS
+    """
+    current_product = None
+    accumulator = None
+    previous = None
+
+    for cell in cells:
+        if cell["product_name"] != current_product:
+            current_product = cell["product_name"]
+            accumulator = TrailingWindow(window)
+            previous = None
+
+        month_index = _month_index(cell["period"])
+        sums = accumulator.push(month_index, cell)
+
+        # Mês anterior sem produção conta como zero
+        if previous is None or previous[0] != month_index - 1:
+            previous_quantity, previous_cost = 0, 0
+        else:
+            previous_quantity = previous[1]["total_quantity"]
+            previous_cost = previous[1]["total_cost"]
+        previous = (month_index, cell)
+
+        window_cost = sums["total_cost"]
+        yield {
+            "product_name": current_product,
+            "year_month": cell["period"],
+            "total_quantity": cell["total_quantity"],
+            "total_cost": cell["total_cost"],
+            "total_revenue": cell["total_revenue"],
+            "trailing_roi_percent": (
+                round((sums["total_revenue"] - window_cost) / window_cost * 100, 2)
+                if window_cost > 0
+                else 0
+            ),
+            "moving_avg_quantity": round(sums["total_quantity"] / window, 2),
+            "moving_avg_cost": round(window_cost / window, 2),
+            "quantity_delta": cell["total_quantity"] - previous_quantity,
+            "cost_delta": cell["total_cost"] - previous_cost,
+        }
+
+
+def export_rolling_csv(window: int = 12) -> bool:
+    """
+    Exporta as métricas em janela móvel para CSV
+
+    Args:
+        window: Tamanho da janela em meses
+
+    Returns:
+        bool: True se exportação foi bem-sucedida
+    """
+    try:
+        rows = rolling_metrics(window)
+        if not rows:
+            # Sem funções de janela no banco: janela deslizante sobre o cubo
+            cells = rollup.query_rollup(("product_name", "period"), "month")
+            rows = list(rolling_from_cells(cells, window))
+
+        if not rows:
+            print("❌ Nenhum dado encontrado para exportar!")
+            return False
+
+        data_dir = ensure_data_directory()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filepath = os.path.join(data_dir, f"rolling_{window}m_{timestamp}.csv")
+
+        with open(filepath, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=ROLLING_HEADERS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+        print(f"✅ Janelas móveis exportadas com sucesso!")
+        print(f"📁 Arquivo: {filepath}")
+        print(f"📊 Linhas: {len(rows)}")
+
+        return True
+
+    except db.INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"❌ Erro ao exportar janelas móveis: {e}")
+        return False
+
+
+def main():
+    """Exporta o ROI dos últimos 12 meses e médias móveis por produto"""
+    print("📈 ANÁLISE EM JANELA MÓVEL")
+    print("=" * 40)
+    export_rolling_csv(12)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Cubo de agregação por produto × mês de colheita × status
+
+A tabela production_rollup é mantida pelo trigger trg_agri_prod_rollup a cada
+escrita e pode ser reconstruída sob demanda. As consultas deste módulo
+respondem qualquer agregação (mês, trimestre, ano, produto, status, totais)
+sem ler a tabela agricultural_production. O cubo cobre também os registros
+arquivados (archive.py), que o trigger não retira do cubo ao movê-los.
+
+Cada shard (db.SHARDS) tem o seu cubo; as consultas leem todos em paralelo e
+somam as células de mesma chave antes de calcular as métricas.
+"""
+
+from typing import Dict, List
+import db
+
+
+DIMENSIONS = ("product_name", "period", "production_status")
+
+# Colunas somáveis do cubo: os parciais de cada shard são combinados por soma
+MEASURES = (
+    "production_count",
+    "total_quantity",
+    "total_cost",
+    "total_revenue",
+    "growth_days_total",
+    "growth_days_count",
+)
+
+PERIOD_SQL = {
+    "month": "year_month",
+    "quarter": (
+        "CASE WHEN year_month = 'N/A' THEN 'N/A' ELSE SUBSTR(year_month, 1, 4) "
+        "|| '-Q' || TO_CHAR(CEIL(TO_NUMBER(SUBSTR(year_month, 6, 2)) / 3)) END"
+    ),
+    "year": "CASE WHEN year_month = 'N/A' THEN 'N/A' ELSE SUBSTR(year_month, 1, 4) END",
+}
+
+db.register_statement("rollup_clear", "DELETE FROM production_rollup")
+db.register_statement(
+    "rollup_rebuild",
+    f"""
+    INSERT INTO production_rollup
+    SELECT product_name,
+           NVL(TO_CHAR(harvest_date, 'YYYY-MM'), 'N/A'),
+           production_status,
+           COUNT(*),
+           SUM(quantity),
+           SUM(NVL(cost_price, 0)),
+           SUM(NVL(sale_price, 0)),
+           SUM(CASE WHEN harvest_date - planting_date > 0
+                    THEN harvest_date - planting_date ELSE 0 END),
+           SUM(CASE WHEN harvest_date - planting_date > 0 THEN 1 ELSE 0 END)
+    FROM {db.record_source_sql()}
+    GROUP BY product_name, NVL(TO_CHAR(harvest_date, 'YYYY-MM'), 'N/A'),
+             production_status
+    """,
+)
+
+# Mesmas células mensais do cubo, agregadas da tabela base (fallback quando o
+# cubo não existe ou ainda não foi carregado)
+db.register_statement(
+    "rollup_base_month",
+    f"""
+    SELECT TO_CHAR(harvest_date, 'YYYY-MM') AS period,
+           COUNT(*) AS production_count,
+           SUM(quantity) AS total_quantity,
+           SUM(NVL(cost_price, 0)) AS total_cost,
+           SUM(NVL(sale_price, 0)) AS total_revenue,
+           SUM(CASE WHEN harvest_date - planting_date > 0
+                    THEN harvest_date - planting_date ELSE 0 END) AS growth_days_total,
+           SUM(CASE WHEN harvest_date - planting_date > 0 THEN 1 ELSE 0 END)
+               AS growth_days_count
+    FROM {db.record_source_sql()}
+    WHERE harvest_date IS NOT NULL
+    GROUP BY TO_CHAR(harvest_date, 'YYYY-MM')
+    """,
+)
+
+
+def rebuild_rollup() -> bool:
+    """
+    Reconstrói o cubo de cada shard a partir da tabela base
+
+    Returns:
+        bool: True se a reconstrução foi bem-sucedida em todos os shards
+    """
+    return all(db.scatter_gather(_rebuild_shard_rollup).values())
+
+
+def _rebuild_shard_rollup() -> bool:
+    """Reconstrói o cubo do shard atual em uma única transação"""
+    connection = db.get_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+        db.execute_statement(cursor, "rollup_clear")
+        db.execute_statement(cursor, "rollup_rebuild")
+        connection.commit()
+        print(f"✅ Cubo de {db.current_shard()} reconstruído: {cursor.rowcount} células")
+        return True
+
+    except db.INTERRUPTIONS:
+        connection.rollback()
+        raise
+    except Exception as e:
+        print(f"❌ Erro ao reconstruir cubo de {db.current_shard()}: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def _rollup_statement(
+    dimensions: tuple, period: str, filters: tuple, include_unharvested: bool
+) -> str:
+    """Registra (uma vez) o comando SQL de um formato de consulta ao cubo"""
+    name = (
+        f"rollup[{','.join(dimensions)}|{period}|{','.join(filters)}"
+        f"|{include_unharvested}]"
+    )
+    if name in db.STATEMENTS:
+        return name
+
+    select = []
+    for dimension in dimensions:
+        if dimension == "period":
+            select.append(f"{PERIOD_SQL[period]} AS period")
+        else:
+            select.append(dimension)
+
+    predicates = []
+    if not include_unharvested:
+        predicates.append("year_month <> 'N/A'")
+    for name_filter in filters:
+        if name_filter == "period_from":
+            predicates.append("year_month >= :period_from")
+        elif name_filter == "period_to":
+            predicates.append("year_month <= :period_to")
+        else:
+            predicates.append(f"{name_filter} = :{name_filter}")
+
+    group_by = [
+        PERIOD_SQL[period] if dimension == "period" else dimension
+        for dimension in dimensions
+    ]
+    sql = f"""
+        SELECT {"".join(f"{column}, " for column in select)}
+               SUM(production_count) AS production_count,
+               SUM(total_quantity) AS total_quantity,
+               SUM(total_cost) AS total_cost,
+               SUM(total_revenue) AS total_revenue,
+               SUM(growth_days_total) AS growth_days_total,
+               SUM(growth_days_count) AS growth_days_count
+        FROM production_rollup
+        {"WHERE " + " AND ".join(predicates) if predicates else ""}
+        {"GROUP BY " + ", ".join(group_by) if group_by else ""}
+        {"ORDER BY " + ", ".join(group_by) if group_by else ""}
+        """
+    return db.register_statement(name, sql)
+
+
+def _derived_metrics(cell: Dict) -> Dict:
+    """Calcula lucro, ROI, eficiência e médias de uma célula agregada"""
+    cell["total_profit"] = cell["total_revenue"] - cell["total_cost"]
+    if cell["total_cost"] > 0:
+        cell["roi_percent"] = round(cell["total_profit"] / cell["total_cost"] * 100, 2)
+        cell["efficiency"] = round(cell["total_quantity"] / cell["total_cost"], 4)
+    else:
+        cell["roi_percent"] = 0
+        cell["efficiency"] = 0
+
+    if cell["production_count"] > 0:
+        cell["avg_quantity_per_production"] = round(
+            cell["total_quantity"] / cell["production_count"], 2
+        )
+    else:
+        cell["avg_quantity_per_production"] = 0
+
+    growth_count = cell.pop("growth_days_count")
+    growth_total = cell.pop("growth_days_total")
+    cell["avg_growth_period"] = (
+        round(growth_total / growth_count, 1) if growth_count else 0
+    )
+    return cell
+
+
+def _fetch_cells(statement: str, params: Dict) -> List[Dict]:
+    """Células de uma consulta ao cubo do shard atual, sem as métricas derivadas"""
+    connection = db.get_connection()
+    if not connection:
+        raise ConnectionError("Could not connect to the database")
+
+    try:
+        cursor = connection.cursor()
+        rows = db.fetchall_statement(cursor, statement, params)
+        columns = [col[0].lower() for col in cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def fetch_rollup(
+    dimensions: List[str] = ("period",),
+    period: str = "month",
+    product_name: str = None,
+    production_status: str = None,
+    period_from: str = None,
+    period_to: str = None,
+    include_unharvested: bool = False,
+) -> List[Dict]:
+    """
+    Consulta o cubo agregando pelas dimensões pedidas
+
+    Args:
+        dimensions: Qualquer combinação de 'product_name', 'period' e
+            'production_status'; vazio devolve apenas os totais
+        period: Granularidade do período: 'month', 'quarter' ou 'year'
+        product_name: Filtra por produto (nome exato)
+        production_status: Filtra por status
+        period_from, period_to: Faixa de meses de colheita ('YYYY-MM')
+        include_unharvested: Inclui produções sem data de colheita
+            (período 'N/A')
+
+    Returns:
+        List[Dict]: Uma linha por combinação, com somas, contagens e métricas
+
+    Raises:
+        ValueError: Dimensões ou granularidade inválidas
+        Exception: Erros de conexão ou da consulta (ao contrário de
+            query_rollup, que os transforma em lista vazia)
+    """
+    dimensions = tuple(dimensions)
+    if set(dimensions) - set(DIMENSIONS) or period not in PERIOD_SQL:
+        raise ValueError(f"Consulta inválida ao cubo: {dimensions}/{period}")
+
+    params = {}
+    for key, value in (
+        ("product_name", product_name),
+        ("production_status", production_status),
+        ("period_from", period_from),
+        ("period_to", period_to),
+    ):
+        if value:
+            params[key] = value
+
+    statement = _rollup_statement(
+        dimensions, period, tuple(params), include_unharvested
+    )
+    return _gather_cells(statement, params, dimensions)
+
+
+def _gather_cells(statement: str, params: Dict, dimensions: tuple) -> List[Dict]:
+    """Células de todos os shards, somadas por chave, com as métricas derivadas"""
+    cells = {}
+    for shard_cells in db.scatter_gather(_fetch_cells, statement, params).values():
+        for cell in shard_cells:
+            key = tuple(cell[dimension] for dimension in dimensions)
+            if key in cells:
+                for column in MEASURES:
+                    cells[key][column] = (cells[key][column] or 0) + (cell[column] or 0)
+            else:
+                cells[key] = cell
+
+    return [
+        _derived_metrics(cells[key])
+        for key in sorted(cells)
+        if cells[key]["production_count"]
+    ]
+
+
+def fetch_monthly_from_base() -> List[Dict]:
+    """
+    Totais por mês de colheita lidos da tabela base, sem o cubo
+
+    Mesmo formato de fetch_rollup(("period",), "month"); serve de fallback
+    quando o cubo não existe ou está vazio.
+
+    Raises:
+        Exception: Erros de conexão ou da consulta
+    """
+    return _gather_cells("rollup_base_month", {}, ("period",))
+
+
+def query_rollup(*args, **kwargs) -> List[Dict]:
+    """
+    Como fetch_rollup, mas devolve lista vazia em caso de erro
+
+    Returns:
+        List[Dict]: Células do cubo (vazia se o banco estiver indisponível)
+    """
+    try:
+        return fetch_rollup(*args, **kwargs)
+    except db.INTERRUPTIONS:
+        raise
+    except ValueError as e:
+        print(f"❌ {e}")
+        return []
+    except Exception as e:
+        print(f"❌ Erro ao consultar cubo: {e}")
+        return []
+
+
+def best_periods(period: str = "month", top: int = 3) -> Dict[str, List[Dict]]:
+    """
+    Responde "quando vale mais a pena produzir e vender?" por produto
+
+    Args:
+        period: 'month', 'quarter' ou 'year'
+        top: Quantos períodos listar por produto
+
+    Returns:
+        Dict[str, List[Dict]]: Para cada produto, os períodos vendidos de
+        maior ROI
+    """
+    cells = query_rollup(("product_name", "period"), period, production_status="SOLD")
+
+    by_product = {}
+    for cell in cells:
+        by_product.setdefault(cell["product_name"], []).append(cell)
+
+    return {
+        product: sorted(product_cells, key=lambda c: c["roi_percent"], reverse=True)[
+            :top
+        ]
+        for product, product_cells in by_product.items()
+    }
+
+
+def main():
+    """Reconstrói o cubo e mostra os melhores meses por produto"""
+    print("🧊 CUBO DE PRODUÇÃO")
+    print("=" * 40)
+
+    rebuild_rollup()
+
+    for product, cells in best_periods().items():
+        months = ", ".join(f"{c['period']} ({c['roi_percent']:.1f}%)" for c in cells)
+        print(f"🌱 {product}: {months}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), "src", "python"))
 
 # Agora pode importar o módulo db
 import db
+import profiling
+import sketches
 
 
 def create_sample_data():
@@ -78,43 +80,47 @@ def create_sample_data():
                 }
             )
 
-    # Insere dados no banco
+    # Insere todos os dados em uma única ida ao banco
+    operations = [
+        db.pipeline_operation("execute", "insert", db.build_insert_params(**data))
+        for data in sample_data
+    ]
+    operations.append(db.pipeline_operation("execute", "bump_data_version"))
+    operations.append(db.pipeline_operation("commit"))
+    results = db.run_pipeline(operations)
+
     success_count = 0
-    for data in sample_data:
-        if db.create_agricultural_production(**data):
+    for data, result in zip(sample_data, results):
+        if result["error"] is None:
             success_count += 1
         else:
-            print(f"❌ Falha ao inserir: {data['product_name']}")
+            print(f"❌ Falha ao inserir: {data['product_name']} ({result['error']})")
 
     print(f"✅ Dados criados: {success_count}/{len(sample_data)} registros")
     return success_count > 0
 
 
 def test_database_connection():
-    """Testa a conexão com o banco de dados"""
+    """
+    Testa a conexão com o banco de dados
+
+    Returns:
+        Número de registros existentes, ou None se a conexão falhar
+    """
     print("🔌 TESTANDO CONEXÃO COM BANCO")
     print("=" * 35)
 
-    connection = db.get_connection()
-    if connection:
+    # A contagem também confirma que a conexão funciona
+    result = db.run_pipeline([db.pipeline_operation("fetchone", "count_all")])[0]
+    if result["error"] is None:
         print("✅ Conexão estabelecida com sucesso!")
-
-        # Testa operações básicas
-        try:
-            cursor = connection.cursor()
-            cursor.execute("SELECT COUNT(*) FROM agricultural_production")
-            count = cursor.fetchone()[0]
-            print(f"📊 Registros existentes: {count}")
-            cursor.close()
-            connection.close()
-            return True
-        except Exception as e:
-            print(f"❌ Erro ao consultar dados: {e}")
-            return False
+        count = list(result["rows"][0].values())[0]
+        print(f"📊 Registros existentes: {count}")
+        return count
     else:
-        print("❌ Falha na conexão!")
+        print(f"❌ Falha na conexão! ({result['error']})")
         print("💡 Verifique as configurações em db.py")
-        return False
+        return None
 
 
 def run_export_test():
@@ -163,26 +169,25 @@ def main():
     # 1. Configurar diretórios
     setup_directories()
 
-    # 2. Testar conexão
-    if not test_database_connection():
+    # 2. Testar conexão e verificar se há dados
+    with profiling.profile_action("test_database_connection"):
+        existing_records = test_database_connection()
+    if existing_records is None:
         print("\n❌ SETUP INTERROMPIDO - Problema na conexão com banco!")
         sys.exit(1)
 
-    # 3. Verificar se há dados
-    connection = db.get_connection()
-    cursor = connection.cursor()
-    cursor.execute("SELECT COUNT(*) FROM agricultural_production")
-    existing_records = cursor.fetchone()[0]
-    cursor.close()
-    connection.close()
-
     if existing_records == 0:
         print(f"\n💡 Banco de dados vazio ({existing_records} registros)")
         create_sample = input("Deseja criar dados de exemplo? (s/N): ").strip().lower()
 
         if create_sample in ["s", "sim", "y", "yes"]:
-            if create_sample_data():
+            with profiling.profile_action("create_sample_data"):
+                created = create_sample_data()
+            if created:
                 print("\n✅ Dados de exemplo criados com sucesso!")
+                # Inserções em lote não passam pelos sketches do modo aproximado
+                with profiling.profile_action("rebuild_sketches"):
+                    sketches.rebuild_sketches()
             else:
                 print("\n❌ Falha ao criar dados de exemplo")
         else:
@@ -191,7 +196,8 @@ def main():
         print(f"\n📊 Banco contém {existing_records} registros existentes")
 
     # 4. Testar exportação
-    run_export_test()
+    with profiling.profile_action("run_export_test"):
+        run_export_test()
 
     # 5. Instruções finais
     print("\n🎉 SETUP CONCLUÍDO!")
@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+"""
+Modo aproximado de análise com sketches probabilísticos
+
+- HyperLogLog: número de produtos distintos
+- Count-min: produtos com maior quantidade produzida (heavy hitters)
+- Amostra por reservatório: estimativas de totais e médias com intervalo
+
+Os sketches são atualizados a cada escrita (via db.add_write_listener) e
+persistidos na tabela production_sketches de cada shard. Cada processo
+acumula um delta local por shard e o combina com o estado persistido sob
+bloqueio de linha, de modo que vários clientes podem cadastrar ao mesmo tempo.
+Os relatórios leem uma linha por shard, combinam os sketches e respondem em
+milissegundos; o modo exato continua sendo o padrão.
+
+Alterações e exclusões corrigem a contagem e as somas do count-min (que
+continua uma superestimativa, pois as somas reais nunca ficam negativas), mas
+o HyperLogLog e a amostra não conseguem esquecer registros. A partir da
+primeira delas os sketches ficam "desatualizados": os relatórios mostram as
+estimativas sem margem de erro até rebuild_sketches() recriá-los.
+"""
+
+import atexit
+import base64
+import csv
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+from datetime import datetime
+from typing import Dict
+import oracledb
+import db
+
+
+SKETCH_NAME = "production"
+FLUSH_EVERY = 50
+HLL_PRECISION = 12
+CMS_WIDTH = 2048
+CMS_DEPTH = 4
+HEAVY_HITTER_CANDIDATES = 50
+RESERVOIR_SIZE = 500
+
+# Campos guardados em cada linha da amostra
+SAMPLE_FIELDS = ("product_name", "quantity", "cost_price", "sale_price", "production_status")
+
+db.register_statement(
+    "sketch_select",
+    "SELECT payload FROM production_sketches WHERE sketch_name = :sketch_name",
+)
+db.register_statement(
+    "sketch_select_for_update",
+    """
+    SELECT payload FROM production_sketches
+    WHERE sketch_name = :sketch_name
+    FOR UPDATE
+    """,
+)
+db.register_statement(
+    "sketch_save",
+    """
+    UPDATE production_sketches
+       SET payload = :payload, updated_at = SYSDATE
+     WHERE sketch_name = :sketch_name
+    """,
+)
+
+
+def _hash64(value: str, salt: bytes = b"") -> int:
+    """Hash de 64 bits estável entre processos"""
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8, salt=salt)
+    return int.from_bytes(digest.digest(), "big")
+
+
+class HyperLogLog:
+    """Contagem aproximada de valores distintos com 2^p registradores"""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: bytes = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers or self.size)
+
+    def add(self, value: str):
+        """Inclui um valor"""
+        hashed = _hash64(value)
+        index = hashed >> (64 - self.precision)
+        remaining = (hashed << self.precision) & ((1 << 64) - 1)
+        rank = 64 - self.precision + 1
+        if remaining:
+            rank = min(rank, 64 - remaining.bit_length() + 1)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        """Combina com outro HyperLogLog de mesma precisão"""
+        for index, rank in enumerate(other.registers):
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+
+    def estimate(self) -> float:
+        """Número estimado de valores distintos"""
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        raw = alpha * self.size**2 / sum(2.0**-rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * self.size and zeros:
+            # Correção para cardinalidades pequenas (linear counting)
+            return self.size * math.log(self.size / zeros)
+        return raw
+
+    @property
+    def relative_error(self) -> float:
+        """Erro padrão relativo da estimativa"""
+        return 1.04 / math.sqrt(self.size)
+
+
+class CountMinSketch:
+    """Somas aproximadas por chave; nunca subestima"""
+
+    def __init__(self, width: int = CMS_WIDTH, depth: int = CMS_DEPTH, table=None):
+        self.width = width
+        self.depth = depth
+        self.table = table or [[0.0] * width for _ in range(depth)]
+        self.total = 0.0
+
+    def _indexes(self, key: str):
+        """Posição da chave em cada linha (hash duplo de Kirsch-Mitzenmacher)"""
+        first = _hash64(key, b"cms-a")
+        second = _hash64(key, b"cms-b") | 1
+        return [(first + row * second) % self.width for row in range(self.depth)]
+
+    def add(self, key: str, amount: float):
+        """Soma amount à chave"""
+        self.total += amount
+        for row, index in enumerate(self._indexes(key)):
+            self.table[row][index] += amount
+
+    def merge(self, other: "CountMinSketch"):
+        """Combina com outro sketch de mesmas dimensões"""
+        self.total += other.total
+        for row in range(self.depth):
+            for index, amount in enumerate(other.table[row]):
+                self.table[row][index] += amount
+
+    def estimate(self, key: str) -> float:
+        """Soma estimada da chave"""
+        return min(self.table[row][index] for row, index in enumerate(self._indexes(key)))
+
+    @property
+    def error_bound(self) -> float:
+        """Superestimativa máxima (e/largura × total) com probabilidade 1 - e^-profundidade"""
+        return math.e / self.width * self.total
+
+
+class Reservoir:
+    """Amostra aleatória uniforme de tamanho fixo, combinável"""
+
+    def __init__(self, size: int = RESERVOIR_SIZE, items=None, seen: int = 0):
+        self.size = size
+        self.items = items or []
+        self.seen = seen
+        self._random = random.Random()
+
+    def add(self, item: Dict):
+        """Inclui um item no fluxo"""
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+        else:
+            slot = self._random.randrange(self.seen)
+            if slot < self.size:
+                self.items[slot] = item
+
+    def merge(self, other: "Reservoir"):
+        """Combina amostras escolhendo cada posição na proporção dos fluxos"""
+        total = self.seen + other.seen
+        if not other.seen:
+            return
+        if total <= self.size:
+            self.items = self.items + other.items
+        else:
+            mine, theirs = list(self.items), list(other.items)
+            self._random.shuffle(mine)
+            self._random.shuffle(theirs)
+            merged = []
+            while len(merged) < self.size and (mine or theirs):
+                pick_mine = self._random.random() < self.seen / total
+                source = mine if (pick_mine and mine) or not theirs else theirs
+                merged.append(source.pop())
+            self.items = merged
+        self.seen = total
+
+
+class ProductionSketches:
+    """Conjunto de sketches da tabela agricultural_production"""
+
+    def __init__(self):
+        self.products = HyperLogLog()
+        self.quantity = CountMinSketch()
+        self.candidates = {}  # produto -> quantidade estimada (heavy hitters)
+        self.sample = Reservoir()
+        self.row_count = 0
+        # Alterações e exclusões que o HLL e a amostra não refletem
+        self.stale_changes = 0
+
+    def add(self, record: Dict, sample: bool = True):
+        """Inclui um registro (sample=False: fora da amostra)"""
+        name = record["product_name"]
+        self.row_count += 1
+        self.products.add(name)
+        self.quantity.add(name, float(record["quantity"]))
+        self._track_candidate(name)
+        if sample:
+            self.sample.add({field: record.get(field) for field in SAMPLE_FIELDS})
+
+    def remove(self, record: Dict):
+        """Retira um registro excluído (ou a versão anterior de um alterado)"""
+        name = record["product_name"]
+        self.row_count -= 1
+        self.quantity.add(name, -float(record["quantity"]))
+        if name in self.candidates:
+            self.candidates[name] = self.quantity.estimate(name)
+        self.stale_changes += 1
+
+    def replace(self, before: Dict, after: Dict):
+        """Troca a versão anterior de um registro alterado pela nova"""
+        self.remove(before)
+        # A amostra não pode trocar o item antigo: não recebe o novo
+        self.add(after, sample=False)
+
+    def _track_candidate(self, name: str):
+        """Mantém os produtos de maior quantidade estimada"""
+        estimate = self.quantity.estimate(name)
+        if name in self.candidates or len(self.candidates) < HEAVY_HITTER_CANDIDATES:
+            self.candidates[name] = estimate
+            return
+        smallest = min(self.candidates, key=self.candidates.get)
+        if estimate > self.candidates[smallest]:
+            del self.candidates[smallest]
+            self.candidates[name] = estimate
+
+    def merge(self, other: "ProductionSketches"):
+        """Combina com outro conjunto de sketches"""
+        self.products.merge(other.products)
+        self.quantity.merge(other.quantity)
+        self.sample.merge(other.sample)
+        self.row_count += other.row_count
+        self.stale_changes += other.stale_changes
+
+        names = set(self.candidates) | set(other.candidates)
+        estimates = {name: self.quantity.estimate(name) for name in names}
+        top = sorted(estimates, key=estimates.get, reverse=True)
+        self.candidates = {name: estimates[name] for name in top[:HEAVY_HITTER_CANDIDATES]}
+
+    def to_json(self) -> str:
+        """Serializa para persistência"""
+        return json.dumps(
+            {
+                "row_count": self.row_count,
+                "hll": base64.b64encode(bytes(self.products.registers)).decode("ascii"),
+                "cms": self.quantity.table,
+                "cms_total": self.quantity.total,
+                "candidates": self.candidates,
+                "sample": self.sample.items,
+                "sample_seen": self.sample.seen,
+                "stale_changes": self.stale_changes,
+            },
+            default=str,
+        )
+
+    @classmethod
+    def from_json(cls, payload: str) -> "ProductionSketches":
+        """Reconstrói a partir do conteúdo persistido"""
+        sketches = cls()
+        data = json.loads(payload) if payload else {}
+        if not data:
+            return sketches
+        sketches.row_count = data["row_count"]
+        sketches.products = HyperLogLog(registers=base64.b64decode(data["hll"]))
+        sketches.quantity = CountMinSketch(table=data["cms"])
+        sketches.quantity.total = data["cms_total"]
+        sketches.candidates = data["candidates"]
+        sketches.sample = Reservoir(items=data["sample"], seen=data["sample_seen"])
+        sketches.stale_changes = data.get("stale_changes", 0)
+        return sketches
+
+
+# Delta local ainda não persistido, por shard. As escritas chegam da thread
+# principal e da thread de envio do diário (write_journal), então o dicionário
+# e os deltas só são lidos ou alterados com _pending_lock
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def _read_payload(value) -> str:
+    """Lê o conteúdo de um CLOB (ou string) devolvido pelo driver"""
+    return value.read() if hasattr(value, "read") else value
+
+
+def _save(replace: ProductionSketches = None) -> bool:
+    """
+    Combina o delta local do shard atual com o persistido
+
+    Com replace, o persistido é substituído pela reconstrução, somada ao
+    delta das escritas feitas durante a leitura.
+    """
+    connection = db.get_connection()
+    if not connection:
+        return False
+
+    shard = db.current_shard()
+    with _pending_lock:
+        pending = _pending.pop(shard, ProductionSketches())
+
+    try:
+        cursor = connection.cursor()
+        params = {"sketch_name": SKETCH_NAME}
+        row = db.fetchone_statement(cursor, "sketch_select_for_update", params)
+
+        if replace is not None:
+            sketches = replace
+        else:
+            sketches = ProductionSketches.from_json(_read_payload(row[0]) if row else "")
+        sketches.merge(pending)
+
+        cursor.setinputsizes(payload=oracledb.DB_TYPE_CLOB)
+        db.execute_statement(
+            cursor, "sketch_save", {**params, "payload": sketches.to_json()}
+        )
+        connection.commit()
+        return True
+
+    except db.INTERRUPTIONS:
+        connection.rollback()
+        _restore_pending(shard, pending)
+        raise
+    except Exception as e:
+        print(f"❌ Erro ao salvar sketches: {e}")
+        connection.rollback()
+        _restore_pending(shard, pending)
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def _restore_pending(shard: str, pending: ProductionSketches):
+    """Devolve ao delta local o que não pôde ser persistido"""
+    with _pending_lock:
+        pending.merge(_pending.pop(shard, ProductionSketches()))
+        _pending[shard] = pending
+
+
+def _has_changes(pending: ProductionSketches) -> bool:
+    """Se o delta local tem algo a persistir"""
+    return bool(pending.sample.seen or pending.stale_changes)
+
+
+def flush() -> bool:
+    """Persiste as escritas acumuladas localmente, em cada shard"""
+    saved = True
+    with _pending_lock:
+        shards = [shard for shard, pending in _pending.items() if _has_changes(pending)]
+    for shard in shards:
+        with db.use_shard(shard):
+            saved = _save() and saved
+    return saved
+
+
+def _on_write(operation: str, before, after):
+    """Atualiza os sketches do shard atual a cada escrita"""
+    with _pending_lock:
+        pending = _pending.setdefault(db.current_shard(), ProductionSketches())
+        if operation == "insert":
+            pending.add(after)
+        elif operation == "update":
+            pending.replace(before, after)
+        elif operation == "delete":
+            pending.remove(before)
+        full = pending.sample.seen + pending.stale_changes >= FLUSH_EVERY
+    if full:
+        _save()
+
+
+db.add_write_listener(_on_write)
+atexit.register(flush)
+
+
+def rebuild_sketches() -> bool:
+    """
+    Reconstrói os sketches lendo todos os registros (modo exato → aproximado)
+
+    Returns:
+        bool: True se a reconstrução foi bem-sucedida em todos os shards
+    """
+    return all(db.scatter_gather(_rebuild_shard_sketches).values())
+
+
+def _rebuild_shard_sketches() -> bool:
+    """Reconstrói os sketches do shard atual"""
+    shard = db.current_shard()
+    # A leitura vê o banco como no início da consulta: o delta já acumulado
+    # entra por ela e é descartado; as escritas feitas durante a leitura vão
+    # para um delta novo, somado à reconstrução em _save
+    with _pending_lock:
+        discarded = _pending.pop(shard, None)
+
+    sketches = ProductionSketches()
+    try:
+        for record in db.stream_agricultural_production():
+            sketches.add(record)
+    except db.INTERRUPTIONS:
+        if discarded is not None:
+            _restore_pending(shard, discarded)
+        raise
+    except Exception as e:
+        # Uma leitura incompleta não pode substituir os sketches persistidos
+        print(f"❌ Erro ao reconstruir sketches: {e}")
+        if discarded is not None:
+            _restore_pending(shard, discarded)
+        return False
+    if _save(replace=sketches):
+        print(f"✅ Sketches de {shard} reconstruídos: {sketches.row_count} registros")
+        return True
+    if discarded is not None:
+        _restore_pending(shard, discarded)
+    return False
+
+
+def load_sketches() -> ProductionSketches:
+    """Carrega o estado persistido de todos os shards combinado com o delta local"""
+    sketches = ProductionSketches()
+    for shard_sketches in db.scatter_gather(_load_shard_sketches).values():
+        sketches.merge(shard_sketches)
+    with _pending_lock:
+        for pending in _pending.values():
+            sketches.merge(pending)
+    return sketches
+
+
+def _load_shard_sketches() -> ProductionSketches:
+    """Estado persistido dos sketches do shard atual (vazio se indisponível)"""
+    sketches = ProductionSketches()
+
+    connection = db.get_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            row = db.fetchone_statement(
+                cursor, "sketch_select", {"sketch_name": SKETCH_NAME}
+            )
+            if row:
+                sketches = ProductionSketches.from_json(_read_payload(row[0]))
+        except db.INTERRUPTIONS:
+            raise
+        except Exception as e:
+            print(f"❌ Erro ao carregar sketches: {e}")
+        finally:
+            cursor.close()
+            connection.close()
+    return sketches
+
+
+def _sample_total(sketches: ProductionSketches, field: str) -> Dict:
+    """Estimativa do total de um campo a partir da amostra, com IC de 95%"""
+    values = [float(item[field] or 0) for item in sketches.sample.items]
+    n = len(values)
+    if n == 0:
+        return {"estimate": 0, "margin": 0}
+    mean = sum(values) / n
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1) if n > 1 else 0
+    if sketches.stale_changes:
+        # A amostra pode conter versões alteradas ou excluídas: a estimativa
+        # ainda é útil, mas o intervalo de confiança deixa de valer
+        return {"estimate": sketches.row_count * mean, "margin": None}
+    population = sketches.sample.seen
+    # Correção de população finita: amostra completa não tem erro
+    correction = math.sqrt(max(population - n, 0) / max(population - 1, 1))
+    margin = 1.96 * population * math.sqrt(variance / n) * correction
+    return {"estimate": population * mean, "margin": margin}
+
+
+def approximate_report(top: int = 5) -> Dict:
+    """
+    Relatório aproximado com limites de erro
+
+    Args:
+        top: Número de produtos no ranking de quantidade
+
+    Returns:
+        Dict: Estimativas de produtos distintos, totais, maiores produtos e
+        ROI, cada uma com sua margem de erro (None quando os sketches estão
+        desatualizados, ver stale_changes)
+    """
+    sketches = load_sketches()
+
+    heavy_hitters = sorted(
+        sketches.candidates, key=sketches.quantity.estimate, reverse=True
+    )[:top]
+
+    sold = [
+        item
+        for item in sketches.sample.items
+        if (item["cost_price"] or 0) > 0 and (item["sale_price"] or 0) > 0
+    ]
+    roi_values = [
+        (item["sale_price"] - item["cost_price"]) / item["cost_price"] * 100
+        for item in sold
+    ]
+
+    distinct = sketches.products.estimate()
+    return {
+        "row_count": sketches.row_count,
+        "stale_changes": sketches.stale_changes,
+        "distinct_products": {
+            "estimate": distinct,
+            # O HLL ainda conta produtos de registros excluídos ou renomeados
+            "margin": None
+            if sketches.stale_changes
+            else 1.96 * sketches.products.relative_error * distinct,
+        },
+        "total_cost": _sample_total(sketches, "cost_price"),
+        "total_revenue": _sample_total(sketches, "sale_price"),
+        "heavy_hitters": [
+            {
+                "product_name": name,
+                "quantity": sketches.quantity.estimate(name),
+                "overestimate_bound": sketches.quantity.error_bound,
+            }
+            for name in heavy_hitters
+        ],
+        "avg_roi": {
+            "estimate": sum(roi_values) / len(roi_values) if roi_values else 0,
+            "sample_size": len(roi_values),
+        },
+    }
+
+
+def print_approximate_report():
+    """Mostra o relatório aproximado no terminal"""
+    report = approximate_report()
+
+    print(f"\n⚡ ANÁLISE APROXIMADA - ~{report['row_count']} registros")
+    print("=" * 50)
+
+    distinct = report["distinct_products"]
+    totals = (("Investimento Total", "total_cost"), ("Receita Total", "total_revenue"))
+    if report["stale_changes"]:
+        print(
+            f"⚠️ {report['stale_changes']} alterações/exclusões desde a última "
+            "reconstrução: estimativas sem margem de erro (use rebuild_sketches)"
+        )
+        print(f"Produtos distintos: até ~{distinct['estimate']:.0f}")
+        for label, key in totals:
+            print(f"{label}: R$ ~{report[key]['estimate']:,.2f}")
+    else:
+        print(f"Produtos distintos: {distinct['estimate']:.0f} ± {distinct['margin']:.0f}")
+        for label, key in totals:
+            total = report[key]
+            print(f"{label}: R$ {total['estimate']:,.2f} ± {total['margin']:,.2f} (IC 95%)")
+
+    roi = report["avg_roi"]
+    print(f"ROI médio: {roi['estimate']:.1f}% (amostra de {roi['sample_size']})")
+
+    print("\n🏆 PRODUTOS COM MAIOR QUANTIDADE:")
+    for i, hitter in enumerate(report["heavy_hitters"], 1):
+        print(
+            f"{i}. {hitter['product_name']}: ~{hitter['quantity']:.1f} "
+            f"(superestimativa máx. {hitter['overestimate_bound']:.1f})"
+        )
+
+
+def export_approximate_summary_csv() -> bool:
+    """
+    Exporta o resumo aproximado por produto (maiores quantidades)
+
+    Returns:
+        bool: True se exportação foi bem-sucedida
+    """
+    from export_csv import ensure_data_directory
+
+    try:
+        report = approximate_report(top=HEAVY_HITTER_CANDIDATES)
+        if not report["row_count"]:
+            print("❌ Nenhum dado encontrado para exportar!")
+            return False
+
+        data_dir = ensure_data_directory()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filepath = os.path.join(data_dir, f"agricultural_summary_approx_{timestamp}.csv")
+
+        with open(filepath, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(
+                csvfile,
+                fieldnames=["product_name", "quantity", "overestimate_bound"],
+            )
+            writer.writeheader()
+            writer.writerows(report["heavy_hitters"])
+
+        print(f"✅ Resumo aproximado exportado com sucesso!")
+        print(f"📁 Arquivo: {filepath}")
+        return True
+
+    except db.INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"❌ Erro ao exportar resumo aproximado: {e}")
+        return False
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+Snapshot colunar da produção agrícola para análise offline
+
+O snapshot é um arquivo binário com colunas de largura fixa:
+
+    [8 bytes]  assinatura b"AGSNAP1\\0"
+    [8 bytes]  deslocamento do início dos dados (uint64, little-endian)
+    [4 bytes]  tamanho do cabeçalho (uint32)
+    [N bytes]  cabeçalho JSON: esquema, nº de registros, dicionários
+    [...]      colunas contíguas, cada uma alinhada em 64 bytes
+
+product_name e production_status são codificados por dicionário; datas de
+plantio/colheita são dias desde 1970-01-01 e created_at/updated_at segundos
+desde 1970-01-01, com NULL_DATE/NULL_TIMESTAMP para valores ausentes. Preços
+ausentes viram NaN.
+
+A leitura mapeia o arquivo em memória (mmap) e expõe as colunas como views
+NumPy sem cópia; abrir um snapshot custa só a leitura do cabeçalho. Sem NumPy
+as colunas são memoryviews e a análise recorre ao caminho por registros.
+"""
+
+import array
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+import analysis_engine
+import db
+import spill_aggregate
+import stream_stats
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional
+    np = None
+
+
+MAGIC = b"AGSNAP1\0"
+PREFIX = struct.Struct("<8sQI")
+ALIGNMENT = 64
+FLUSH_ROWS = 65536
+
+NULL_DATE = -(2**31)
+NULL_TIMESTAMP = -(2**63)
+EPOCH = datetime(1970, 1, 1)
+
+# (coluna, typecode do módulo array, dtype NumPy)
+COLUMNS = [
+    ("id", "q", "<i8"),
+    ("product_code", "I", "<u4"),
+    ("status_code", "B", "u1"),
+    ("quantity", "d", "<f8"),
+    ("sale_price", "d", "<f8"),
+    ("cost_price", "d", "<f8"),
+    ("planting_date", "i", "<i4"),
+    ("harvest_date", "i", "<i4"),
+    ("created_at", "q", "<i8"),
+    ("updated_at", "q", "<i8"),
+]
+
+def snapshot_directory() -> str:
+    """Diretório padrão dos snapshots (src/data/snapshots)"""
+    directory = os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "data", "snapshots"
+    )
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def latest_snapshot() -> str:
+    """Caminho do snapshot mais recente (None se não houver)"""
+    directory = snapshot_directory()
+    files = [
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(".agsnap")
+    ]
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def _align(offset: int) -> int:
+    """Arredonda o deslocamento para o próximo múltiplo de ALIGNMENT"""
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _encode_date(value) -> int:
+    """Data como dias desde 1970-01-01"""
+    if value is None:
+        return NULL_DATE
+    if isinstance(value, str):
+        value = datetime.strptime(value, "%Y-%m-%d")
+    return (value - EPOCH).days
+
+
+def _encode_timestamp(value) -> int:
+    """Data e hora como segundos desde 1970-01-01"""
+    if value is None:
+        return NULL_TIMESTAMP
+    return int((value - EPOCH).total_seconds())
+
+
+def _encode_price(value) -> float:
+    """Preço com NaN para ausente"""
+    return float("nan") if value is None else float(value)
+
+
+class _ColumnSpool:
+    """Acumula uma coluna em lotes num arquivo temporário"""
+
+    def __init__(self, typecode: str, directory: str):
+        self.typecode = typecode
+        self.buffer = array.array(typecode)
+        self.file = tempfile.TemporaryFile(dir=directory)
+        self.nbytes = 0
+
+    def extend(self, values):
+        self.buffer.extend(values)
+
+    def flush(self):
+        if sys.byteorder == "big":
+            self.buffer.byteswap()
+        self.buffer.tofile(self.file)
+        self.nbytes += len(self.buffer) * self.buffer.itemsize
+        self.buffer = array.array(self.typecode)
+
+    def copy_to(self, target):
+        self.flush()
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(1024 * 1024)
+            if not chunk:
+                break
+            target.write(chunk)
+        self.file.close()
+
+
+def _rows_to_batches(rows: Iterator[Dict], size: int = FLUSH_ROWS) -> Iterator[Dict]:
+    """Agrupa registros (dicionários) em lotes colunares"""
+    names = ["id", "product_name", "quantity", "sale_price", "cost_price",
+             "planting_date", "harvest_date", "production_status",
+             "created_at", "updated_at"]
+    batch = []
+    for record in rows:
+        batch.append(record)
+        if len(batch) == size:
+            yield {name: [record[name] for record in batch] for name in names}
+            batch = []
+    if batch:
+        yield {name: [record[name] for record in batch] for name in names}
+
+
+def write_snapshot(path: str = None, rows: Iterator[Dict] = None) -> str:
+    """
+    Grava um snapshot colunar lendo os registros em fluxo
+
+    Por padrão lê o banco em lotes colunares
+    (db.stream_agricultural_production_columns), sem criar um dicionário por
+    registro. Cada coluna é acumulada em um arquivo temporário, então a
+    memória usada não depende do tamanho da tabela. O arquivo final só
+    aparece quando está completo (gravação em arquivo temporário + rename).
+
+    Args:
+        path: Arquivo de destino (padrão: snapshot_directory()/production_<data>.agsnap)
+        rows: Registros a gravar, como dicionários (padrão: lê o banco)
+
+    Returns:
+        str: Caminho do snapshot gravado
+    """
+    if path is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(snapshot_directory(), f"production_{timestamp}.agsnap")
+    if rows is None:
+        batches = db.stream_agricultural_production_columns(batch_size=FLUSH_ROWS)
+    else:
+        batches = _rows_to_batches(rows)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    spools = {name: _ColumnSpool(typecode, directory) for name, typecode, _ in COLUMNS}
+    dictionaries = {"product_name": {}, "production_status": {}}
+    row_count = 0
+
+    for batch in batches:
+        products = dictionaries["product_name"]
+        statuses = dictionaries["production_status"]
+
+        spools["id"].extend(map(int, batch["id"]))
+        spools["product_code"].extend(
+            products.setdefault(name, len(products)) for name in batch["product_name"]
+        )
+        spools["status_code"].extend(
+            statuses.setdefault(status, len(statuses))
+            for status in batch["production_status"]
+        )
+        spools["quantity"].extend(map(float, batch["quantity"]))
+        spools["sale_price"].extend(map(_encode_price, batch["sale_price"]))
+        spools["cost_price"].extend(map(_encode_price, batch["cost_price"]))
+        spools["planting_date"].extend(map(_encode_date, batch["planting_date"]))
+        spools["harvest_date"].extend(map(_encode_date, batch["harvest_date"]))
+        spools["created_at"].extend(map(_encode_timestamp, batch["created_at"]))
+        spools["updated_at"].extend(map(_encode_timestamp, batch["updated_at"]))
+
+        row_count += len(batch["id"])
+        for spool in spools.values():
+            spool.flush()
+
+    # Deslocamentos relativos ao início dos dados, cada coluna alinhada
+    columns = []
+    offset = 0
+    for name, typecode, dtype in COLUMNS:
+        columns.append(
+            {"name": name, "typecode": typecode, "dtype": dtype,
+             "offset": offset, "nbytes": spools[name].nbytes}
+        )
+        offset = _align(offset + spools[name].nbytes)
+
+    header = json.dumps(
+        {
+            "version": 1,
+            "row_count": row_count,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "columns": columns,
+            "dictionaries": {
+                key: sorted(values, key=values.get) for key, values in dictionaries.items()
+            },
+        }
+    ).encode("utf-8")
+    data_offset = _align(PREFIX.size + len(header))
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as target:
+        target.write(PREFIX.pack(MAGIC, data_offset, len(header)))
+        target.write(header)
+        for column in columns:
+            target.write(b"\0" * (data_offset + column["offset"] - target.tell()))
+            spools[column["name"]].copy_to(target)
+    os.replace(temp_path, path)
+    return path
+
+
+class Snapshot:
+    """
+    Snapshot aberto via mmap; as colunas são views sem cópia
+
+    Uso:
+        with Snapshot(path) as snapshot:
+            quantities = snapshot.column("quantity")
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, data_offset, header_size = PREFIX.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Arquivo não é um snapshot: {path}")
+        header = json.loads(self._mmap[PREFIX.size : PREFIX.size + header_size])
+
+        self.row_count = header["row_count"]
+        self.created_at = header["created_at"]
+        self.dictionaries = header["dictionaries"]
+        self._data_offset = data_offset
+        self._columns = {column["name"]: column for column in header["columns"]}
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Fecha o mapeamento (mantido enquanto houver views em uso)"""
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # views NumPy ainda referenciam o mapeamento
+        self._file.close()
+
+    def column(self, name: str):
+        """
+        View de uma coluna, sem cópia
+
+        Returns:
+            numpy.ndarray somente leitura com NumPy; memoryview tipada sem ele
+        """
+        column = self._columns[name]
+        start = self._data_offset + column["offset"]
+        if np is not None:
+            return np.frombuffer(
+                self._mmap, dtype=column["dtype"], count=self.row_count, offset=start
+            )
+
+        view = memoryview(self._mmap)[start : start + column["nbytes"]]
+        if sys.byteorder == "big":
+            values = array.array(column["typecode"], view)
+            values.byteswap()
+            return memoryview(values)
+        return view.cast(column["typecode"])
+
+    def dictionary(self, name: str) -> List[str]:
+        """Valores de uma coluna codificada ('product_name' ou 'production_status')"""
+        return self.dictionaries[name]
+
+    def iter_records(self) -> Iterator[Dict]:
+        """Registros no formato de db.stream_agricultural_production (sem 'roi')"""
+        columns = {name: self.column(name) for name, _, _ in COLUMNS}
+        products = self.dictionary("product_name")
+        statuses = self.dictionary("production_status")
+
+        def date(days):
+            return None if days == NULL_DATE else EPOCH + timedelta(days=int(days))
+
+        def timestamp(seconds):
+            return None if seconds == NULL_TIMESTAMP else EPOCH + timedelta(seconds=int(seconds))
+
+        def price(value):
+            return None if value != value else float(value)  # NaN -> None
+
+        for i in range(self.row_count):
+            yield {
+                "id": int(columns["id"][i]),
+                # Código do produto no snapshot, no lugar da chave do banco
+                "product_id": int(columns["product_code"][i]),
+                "product_name": products[columns["product_code"][i]],
+                "quantity": float(columns["quantity"][i]),
+                "sale_price": price(columns["sale_price"][i]),
+                "cost_price": price(columns["cost_price"][i]),
+                "planting_date": date(columns["planting_date"][i]),
+                "harvest_date": date(columns["harvest_date"][i]),
+                "production_status": statuses[columns["status_code"][i]],
+                "created_at": timestamp(columns["created_at"][i]),
+                "updated_at": timestamp(columns["updated_at"][i]),
+            }
+
+
+def _fill_moments(moments: stream_stats.RunningMoments, values):
+    """Preenche um acumulador de Welford a partir de um vetor"""
+    moments.count = int(values.size)
+    if moments.count:
+        moments.mean = float(values.mean())
+        moments.m2 = float(((values - moments.mean) ** 2).sum())
+
+
+def _fill_sketch(sketch: stream_stats.QuantileSketch, values):
+    """
+    Preenche um sketch de quantis a partir de um vetor
+
+    Os valores ordenados são amostrados a cada 2^nível posições, com o menor
+    nível que cabe em k itens, que é o estado de um sketch compactado.
+    """
+    sketch.count = int(values.size)
+    if not sketch.count:
+        return
+    ordered = np.sort(values)
+    level = 0
+    while -(-ordered.size // 2**level) > sketch.k:
+        level += 1
+    sketch.levels = [[] for _ in range(level)] + [ordered[:: 2**level].tolist()]
+
+
+def _vector_statistics(
+    cost, sale, growth_days, roi, priced
+) -> stream_stats.ProductionStatistics:
+    """ProductionStatistics equivalente a adicionar os registros um a um"""
+    statistics = stream_stats.ProductionStatistics()
+    _fill_moments(statistics.cost, cost)
+    _fill_moments(statistics.revenue, sale)
+    covariance = statistics.cost_revenue
+    _fill_moments(covariance.x, cost)
+    _fill_moments(covariance.y, sale)
+    if cost.size:
+        covariance.c2 = float(((cost - cost.mean()) * (sale - sale.mean())).sum())
+    _fill_sketch(statistics.roi, roi[priced])
+    _fill_sketch(statistics.growth_days, growth_days[growth_days > 0])
+    return statistics
+
+
+def _vector_partial(snapshot: Snapshot, directory: str) -> Dict:
+    """Agregado parcial (formato de analysis_engine.map_rows) com NumPy"""
+    names = snapshot.dictionary("product_name")
+    statuses = snapshot.dictionary("production_status")
+    product_code = snapshot.column("product_code")
+    status_code = snapshot.column("status_code")
+    quantity = snapshot.column("quantity")
+    cost = np.nan_to_num(snapshot.column("cost_price"))
+    sale = np.nan_to_num(snapshot.column("sale_price"))
+    planting = snapshot.column("planting_date")
+    harvest = snapshot.column("harvest_date")
+
+    dated = (planting != NULL_DATE) & (harvest != NULL_DATE)
+    growth_days = np.where(dated, harvest.astype(np.int64) - planting, 0)
+    priced = (cost > 0) & (sale > 0)
+    roi = np.where(priced, np.round((sale - cost) / np.where(priced, cost, 1) * 100, 2), 0)
+
+    partial = analysis_engine.empty_partial()
+    partial["row_count"] = len(snapshot)
+    partial["total_investment"] = float(cost.sum())
+    partial["total_revenue"] = float(sale.sum())
+
+    status_totals = np.bincount(status_code, minlength=len(statuses))
+    partial["status_count"] = {
+        statuses[code]: int(count) for code, count in enumerate(status_totals) if count
+    }
+
+    size = len(names)
+    counts = np.bincount(product_code, minlength=size)
+    totals = {
+        "quantity": np.bincount(product_code, weights=quantity, minlength=size),
+        "investment": np.bincount(product_code, weights=cost, minlength=size),
+        "revenue": np.bincount(product_code, weights=sale, minlength=size),
+    }
+
+    # Registros agrupados por produto: uma ordenação, depois fatias contíguas
+    order = np.argsort(product_code, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(counts)))
+    partial["statistics"] = _vector_statistics(cost, sale, growth_days, roi, priced)
+
+    def product_groups():
+        for code, name in enumerate(names):
+            if not counts[code]:
+                continue
+            rows = order[starts[code] : starts[code + 1]]
+            yield db.product_search_key(name), {
+                "totals": {
+                    "product_name": name,
+                    "production_count": int(counts[code]),
+                    **{key: float(values[code]) for key, values in totals.items()},
+                },
+                "statistics": _vector_statistics(
+                    cost[rows], sale[rows], growth_days[rows], roi[rows], priced[rows]
+                ),
+            }
+
+    # Estados gerados um produto por vez direto para as partições
+    partial["product_parts"].append(
+        spill_aggregate.write_partitions(product_groups(), directory)
+    )
+    return partial
+
+
+def analyze_snapshot(path: str = None) -> Dict:
+    """
+    Análise quantitativa sobre um snapshot, sem acessar o banco
+
+    Args:
+        path: Arquivo do snapshot (padrão: latest_snapshot())
+
+    Returns:
+        Dict: Mesmo formato de analysis_engine.run_analysis
+    """
+    path = path or latest_snapshot()
+    if path is None:
+        raise FileNotFoundError("Nenhum snapshot encontrado")
+
+    directory = tempfile.mkdtemp(prefix="analysis_")
+    try:
+        with Snapshot(path) as snapshot:
+            if np is not None:
+                partial = _vector_partial(snapshot, directory)
+            else:
+                partial = analysis_engine.map_rows(
+                    snapshot.iter_records(),
+                    directory,
+                    identity=lambda code, name: (db.product_search_key(name), name),
+                )
+        return analysis_engine.finish_analysis(partial)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def print_snapshot_analysis(path: str = None):
+    """Imprime o resumo financeiro e os rankings de um snapshot"""
+    analysis = analyze_snapshot(path)
+    row_count = analysis["row_count"]
+    total_investment = analysis["total_investment"]
+    total_revenue = analysis["total_revenue"]
+    overall_roi = (
+        (total_revenue - total_investment) / total_investment * 100
+        if total_investment > 0
+        else 0
+    )
+
+    print(f"\n📊 ANÁLISE DO SNAPSHOT - {row_count} registros")
+    print("=" * 50)
+    print(f"Investimento Total: R$ {total_investment:,.2f}")
+    print(f"Receita Total: R$ {total_revenue:,.2f}")
+    print(f"ROI Geral: {overall_roi:.1f}%")
+
+    print("\n🏆 TOP 5 PRODUTOS POR ROI:")
+    for entry in analysis["top_roi"]:
+        print(f"{entry['rank']}. {entry['product_name']}: {entry['roi']:.1f}% ROI")
+
+    print("\n📊 STATUS DAS PRODUÇÕES:")
+    for status, count in sorted(analysis["status_count"].items()):
+        print(f"{status}: {count} ({count / row_count * 100:.1f}%)")
+
+
+def main():
+    """
+    Uso:
+        python snapshot.py               cria um snapshot do banco
+        python snapshot.py analyze [arq] analisa um snapshot sem acessar o banco
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == "analyze":
+        print_snapshot_analysis(sys.argv[2] if len(sys.argv) > 2 else None)
+        return
+
+    print("📸 SNAPSHOT COLUNAR")
+    print("=" * 40)
+    path = write_snapshot()
+    with Snapshot(path) as snapshot:
+        print(f"✅ Snapshot gravado: {path}")
+        print(f"📊 Registros: {len(snapshot)}")
+        print(f"💾 Tamanho: {os.path.getsize(path) / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
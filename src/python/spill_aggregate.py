@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Agregação por grupo com orçamento de memória e transbordo para disco
+
+Enquanto os grupos em memória cabem em max_bytes, a agregação é um
+dicionário comum. O tamanho é estimado a cada SIZE_CHECK_EVERY registros
+serializando uma amostra dos estados. Quando passa do limite, os estados são
+distribuídos por hash da chave entre N partições gravadas em arquivos
+temporários, e a memória é liberada. No final cada partição é lida e
+combinada sozinha; uma partição que ainda não caiba é reparticionada com
+outra semente de hash. O resultado é o mesmo do caminho em memória, só a
+ordem dos grupos muda.
+
+results() produz os grupos partição a partição: quem os consome em fluxo
+(gravando linhas de relatório, por exemplo) nunca tem mais do que uma
+partição em memória. Parciais que precisam ser combinados depois, em outro
+processo, são gravados com write_partitions e combinados partição a
+partição com merge_partitions.
+"""
+
+import hashlib
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Tuple
+
+
+# Orçamento dos estados em memória, pelo tamanho serializado (o objeto Python
+# ocupa algumas vezes mais, então o limite é conservador)
+MAX_BYTES_IN_MEMORY = 64 * 1024 * 1024
+SIZE_CHECK_EVERY = 1000
+SIZE_SAMPLE = 32
+SPILL_PARTITIONS = 16
+MAX_DEPTH = 4
+
+
+def _partition_of(key: Hashable, partitions: int, depth: int) -> int:
+    """Partição estável da chave (hash() do Python varia entre processos)"""
+    digest = hashlib.blake2b(repr((depth, key)).encode("utf-8"), digest_size=8)
+    return int.from_bytes(digest.digest(), "little") % partitions
+
+
+class SpillingAggregator:
+    """
+    Group-by com estados combináveis e transbordo para disco
+
+    Uso:
+        with SpillingAggregator(
+            key=lambda r: r["product_name"],
+            create=lambda key: {"quantity": 0},
+            update=lambda state, r: state.update(quantity=state["quantity"] + r["quantity"]),
+            merge=lambda a, b: {"quantity": a["quantity"] + b["quantity"]},
+        ) as aggregator:
+            aggregator.add_all(rows)
+            for key, state in aggregator.results():
+                ...
+
+    O bloco with remove os arquivos temporários mesmo se a leitura falhar.
+
+    Args:
+        key: Extrai a chave de grupo de um registro
+        create: Cria o estado inicial de um grupo a partir da chave
+        update: Atualiza o estado com um registro (altera o estado no lugar)
+        merge: Combina dois estados do mesmo grupo e devolve o resultado
+        max_bytes: Tamanho (serializado) dos estados em memória antes de
+            transbordar
+        partitions: Número de partições em disco
+    """
+
+    def __init__(
+        self,
+        key: Callable,
+        create: Callable,
+        update: Callable,
+        merge: Callable,
+        max_bytes: int = MAX_BYTES_IN_MEMORY,
+        partitions: int = SPILL_PARTITIONS,
+        depth: int = 0,
+        directory: str = None,
+    ):
+        self.key = key
+        self.create = create
+        self.update = update
+        self.merge = merge
+        self.max_bytes = max_bytes
+        self.partitions = partitions
+        self.depth = depth
+        self.groups = {}
+        self.spills = 0
+        self._directory = directory
+        self._files = None
+        self._since_check = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def estimated_bytes(self) -> int:
+        """Tamanho serializado estimado dos grupos em memória (por amostra)"""
+        if not self.groups:
+            return 0
+        sample = list(itertools.islice(self.groups.items(), SIZE_SAMPLE))
+        sample_bytes = sum(
+            len(pickle.dumps(item, pickle.HIGHEST_PROTOCOL)) for item in sample
+        )
+        return sample_bytes * len(self.groups) // len(sample)
+
+    def _check_budget(self):
+        """Transborda se os estados passarem do orçamento (verificado a intervalos)"""
+        self._since_check += 1
+        if self._since_check < SIZE_CHECK_EVERY:
+            return
+        self._since_check = 0
+        if self.estimated_bytes() > self.max_bytes:
+            self._spill()
+
+    def add(self, record: Dict):
+        """Inclui um registro"""
+        group_key = self.key(record)
+        state = self.groups.get(group_key)
+        if state is None:
+            state = self.groups[group_key] = self.create(group_key)
+        self.update(state, record)
+        self._check_budget()
+
+    def add_all(self, records: Iterable[Dict]):
+        """Inclui todos os registros de um fluxo"""
+        for record in records:
+            self.add(record)
+
+    def add_state(self, group_key: Hashable, state):
+        """Inclui um estado parcial já agregado (releitura ou parcial de outra fonte)"""
+        current = self.groups.get(group_key)
+        if current is None:
+            self.groups[group_key] = state
+        else:
+            self.groups[group_key] = self.merge(current, state)
+        self._check_budget()
+
+    def _spill(self):
+        """Grava os grupos em memória nas partições e esvazia a memória"""
+        if self._files is None:
+            self._directory = tempfile.mkdtemp(prefix="spill_", dir=self._directory)
+            self._files = [
+                open(os.path.join(self._directory, f"part_{index}.pickle"), "w+b")
+                for index in range(self.partitions)
+            ]
+        for group_key, state in self.groups.items():
+            partition = _partition_of(group_key, self.partitions, self.depth)
+            pickle.dump((group_key, state), self._files[partition], pickle.HIGHEST_PROTOCOL)
+        self.groups = {}
+        self.spills += 1
+
+    def _read_partition(self, spill_file) -> Iterator[Tuple[Hashable, object]]:
+        """Lê os estados parciais gravados em uma partição"""
+        spill_file.flush()
+        spill_file.seek(0)
+        while True:
+            try:
+                yield pickle.load(spill_file)
+            except EOFError:
+                return
+
+    def results(self) -> Iterator[Tuple[Hashable, object]]:
+        """
+        Produz (chave, estado) de cada grupo, uma única vez
+
+        Sem transbordo, devolve os grupos na ordem em que apareceram.
+        """
+        if self._files is None:
+            yield from self.groups.items()
+            return
+
+        self._spill()
+        try:
+            for spill_file in self._files:
+                if self.depth >= MAX_DEPTH:
+                    # Limite de reparticionamento: combina a partição em memória
+                    merged = {}
+                    for group_key, state in self._read_partition(spill_file):
+                        current = merged.get(group_key)
+                        merged[group_key] = (
+                            state if current is None else self.merge(current, state)
+                        )
+                    yield from merged.items()
+                    continue
+
+                # Cada partição é combinada sozinha; se ainda não couber,
+                # transborda de novo com outra semente de hash
+                child = SpillingAggregator(
+                    self.key,
+                    self.create,
+                    self.update,
+                    self.merge,
+                    self.max_bytes,
+                    self.partitions,
+                    self.depth + 1,
+                    self._directory,
+                )
+                for group_key, state in self._read_partition(spill_file):
+                    child.add_state(group_key, state)
+                yield from child.results()
+        finally:
+            self.close()
+
+    def close(self):
+        """Remove os arquivos temporários"""
+        if self._files is not None:
+            for spill_file in self._files:
+                spill_file.close()
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._files = None
+
+
+def aggregate(
+    records: Iterable[Dict],
+    key: Callable,
+    create: Callable,
+    update: Callable,
+    merge: Callable,
+    max_bytes: int = MAX_BYTES_IN_MEMORY,
+) -> Iterator[Tuple[Hashable, object]]:
+    """Atalho: agrega um fluxo e produz (chave, estado) de cada grupo"""
+    with SpillingAggregator(key, create, update, merge, max_bytes) as aggregator:
+        aggregator.add_all(records)
+        yield from aggregator.results()
+
+
+def _read_file(path: str) -> Iterator[Tuple[Hashable, object]]:
+    """Lê os pares (chave, estado) de um arquivo de partição"""
+    with open(path, "rb") as partition_file:
+        while True:
+            try:
+                yield pickle.load(partition_file)
+            except EOFError:
+                return
+
+
+def write_partitions(
+    items: Iterable[Tuple[Hashable, object]],
+    directory: str,
+    partitions: int = SPILL_PARTITIONS,
+) -> List[str]:
+    """
+    Grava pares (chave, estado) em arquivos de partição, por hash da chave
+
+    Parciais gravados com o mesmo número de partições podem ser combinados
+    com merge_partitions em outro processo, uma partição por vez.
+
+    Args:
+        items: Pares (chave, estado), por exemplo de SpillingAggregator.results()
+        directory: Diretório onde criar os arquivos (quem o criou o remove)
+        partitions: Número de partições
+
+    Returns:
+        List[str]: Arquivo de cada partição
+    """
+    target = tempfile.mkdtemp(prefix="parts_", dir=directory)
+    paths = [
+        os.path.join(target, f"part_{index}.pickle") for index in range(partitions)
+    ]
+    files = [open(path, "wb") for path in paths]
+    try:
+        for group_key, state in items:
+            partition = _partition_of(group_key, partitions, 0)
+            pickle.dump((group_key, state), files[partition], pickle.HIGHEST_PROTOCOL)
+    finally:
+        for partition_file in files:
+            partition_file.close()
+    return paths
+
+
+def merge_partitions(
+    partials: List[List[str]],
+    merge: Callable,
+    max_bytes: int = MAX_BYTES_IN_MEMORY,
+) -> Iterator[Tuple[Hashable, object]]:
+    """
+    Combina parciais gravados por write_partitions, partição a partição
+
+    Args:
+        partials: Arquivos de cada parcial (retornos de write_partitions)
+        merge: Combina dois estados do mesmo grupo
+        max_bytes: Orçamento de cada partição (acima dele, transborda de novo)
+
+    Yields:
+        Tuple: (chave, estado) de cada grupo, uma única vez
+    """
+    if not partials:
+        return
+    for index in range(len(partials[0])):
+        # Profundidade 1: se transbordar, usa outra semente que a de write_partitions
+        with SpillingAggregator(
+            None, None, None, merge, max_bytes, depth=1
+        ) as aggregator:
+            for paths in partials:
+                for group_key, state in _read_file(paths[index]):
+                    aggregator.add_state(group_key, state)
+            yield from aggregator.results()
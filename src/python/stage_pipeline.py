@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Pipeline de estágios em threads ligados por filas limitadas
+
+Cada estágio roda em sua própria thread e passa lotes adiante por uma
+queue.Queue de tamanho fixo: se um estágio atrasa, a fila enche e os
+anteriores esperam (backpressure), então a memória fica limitada a
+queue_size lotes por ligação. Com filas de 2 posições, um estágio trabalha
+em um lote enquanto o seguinte consome o anterior (buffer duplo).
+
+O tempo ocupado de cada estágio exclui as esperas nas filas, de modo que o
+estágio com maior tempo ocupado é o gargalo.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+
+_END = object()
+_POLL_SECONDS = 0.1
+
+
+class PipelineError(Exception):
+    """Falha em um estágio; a exceção original fica em __cause__"""
+
+
+def _put(channel: queue.Queue, item, stop: threading.Event) -> bool:
+    """Enfileira respeitando o cancelamento; False se o pipeline parou"""
+    while not stop.is_set():
+        try:
+            channel.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(channel: queue.Queue, stop: threading.Event):
+    """Desenfileira respeitando o cancelamento; _END se o pipeline parou"""
+    while not stop.is_set():
+        try:
+            return channel.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def run_stages(
+    source: Iterable,
+    stages: List[Tuple[str, Callable]],
+    source_name: str = "fetch",
+    queue_size: int = 2,
+) -> Dict[str, float]:
+    """
+    Executa source -> estágio 1 -> ... -> estágio N em threads paralelas
+
+    Args:
+        source: Iterável que produz os lotes (consumido em uma thread própria)
+        stages: Lista de (nome, função); cada função recebe um lote e devolve
+            o lote do próximo estágio (o retorno do último é descartado)
+        source_name: Nome do estágio de origem no relatório
+        queue_size: Lotes em espera entre dois estágios
+
+    Returns:
+        Dict[str, float]: Segundos ocupados por estágio, mais 'wall' (total)
+
+    Raises:
+        PipelineError: Se algum estágio falhar. Falhas de um estágio
+        interrompem os demais; falhas da origem deixam os lotes já
+        produzidos terminarem o percurso antes do erro.
+    """
+    stop = threading.Event()
+    errors = []
+    busy = {source_name: 0.0, **{name: 0.0 for name, _ in stages}}
+    channels = [queue.Queue(maxsize=queue_size) for _ in stages]
+
+    def fail(name, error):
+        errors.append((name, error))
+        stop.set()
+
+    def produce():
+        iterator = iter(source)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    busy[source_name] += time.perf_counter() - started
+                if not _put(channels[0], item, stop):
+                    return
+            _put(channels[0], _END, stop)
+        except Exception as e:
+            # Os lotes já produzidos ainda passam pelos estágios seguintes
+            errors.append((source_name, e))
+            _put(channels[0], _END, stop)
+        finally:
+            # Libera recursos da origem (ex.: conexão de um gerador)
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def consume(index, name, function):
+        inbound = channels[index]
+        outbound = channels[index + 1] if index + 1 < len(channels) else None
+        try:
+            while True:
+                item = _get(inbound, stop)
+                if item is _END:
+                    break
+                started = time.perf_counter()
+                result = function(item)
+                busy[name] += time.perf_counter() - started
+                if outbound is not None and not _put(outbound, result, stop):
+                    return
+            if outbound is not None:
+                _put(outbound, _END, stop)
+        except Exception as e:
+            fail(name, e)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=produce, name=source_name, daemon=True)]
+    for index, (name, function) in enumerate(stages):
+        threads.append(
+            threading.Thread(
+                target=consume, args=(index, name, function), name=name, daemon=True
+            )
+        )
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    busy["wall"] = time.perf_counter() - started
+    if errors:
+        name, error = errors[0]
+        raise PipelineError(f"Falha no estágio '{name}': {error}") from error
+    return busy
+
+
+def print_stage_report(busy: Dict[str, float]):
+    """Imprime o tempo ocupado de cada estágio e aponta o gargalo"""
+    wall = busy.get("wall", 0)
+    stages = {name: seconds for name, seconds in busy.items() if name != "wall"}
+    bottleneck = max(stages, key=stages.get) if stages else None
+    print(f"⏱️ Tempo total: {wall:.2f}s")
+    for name, seconds in stages.items():
+        share = seconds / wall * 100 if wall else 0
+        marker = " ← gargalo" if name == bottleneck else ""
+        print(f"   {name:<10} {seconds:8.2f}s ({share:5.1f}% ocupado){marker}")
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Estatísticas em uma única passada, sem materializar os registros
+
+- Média e variância (Welford)
+- Covariância e correlação de Pearson entre investimento e retorno
+- Quantis aproximados (sketch KLL) de ROI e dias de crescimento
+
+Todos os acumuladores usam memória constante e podem ser combinados (merge)
+entre partições ou shards processados separadamente.
+"""
+
+import csv
+import math
+import os
+import random
+from datetime import datetime
+from typing import Dict, Iterable, List
+import db
+import report_cache
+from export_csv import calculate_metrics, ensure_data_directory
+
+
+class RunningMoments:
+    """Média e variância pelo método de Welford, combináveis entre partições"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # soma dos quadrados das diferenças para a média
+
+    def add(self, value: float):
+        """Inclui um valor"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other: "RunningMoments"):
+        """Combina com outro acumulador (fórmula paralela de Chan)"""
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.mean += delta * other.count / total
+        self.count = total
+
+    @property
+    def variance(self) -> float:
+        """Variância amostral"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self) -> float:
+        """Desvio padrão amostral"""
+        return math.sqrt(self.variance)
+
+
+class RunningCovariance:
+    """Covariância e correlação de Pearson em uma passada, combináveis"""
+
+    def __init__(self):
+        self.x = RunningMoments()
+        self.y = RunningMoments()
+        self.c2 = 0.0  # co-momento: soma de (x - média x) * (y - média y)
+
+    def add(self, x: float, y: float):
+        """Inclui um par (x, y)"""
+        delta_x = x - self.x.mean
+        self.x.add(x)
+        self.y.add(y)
+        self.c2 += delta_x * (y - self.y.mean)
+
+    def merge(self, other: "RunningCovariance"):
+        """Combina com outro acumulador"""
+        if other.x.count == 0:
+            return
+        count_a, count_b = self.x.count, other.x.count
+        total = count_a + count_b
+        delta_x = other.x.mean - self.x.mean
+        delta_y = other.y.mean - self.y.mean
+        self.c2 += other.c2 + delta_x * delta_y * count_a * count_b / total
+        self.x.merge(other.x)
+        self.y.merge(other.y)
+
+    @property
+    def covariance(self) -> float:
+        """Covariância amostral"""
+        return self.c2 / (self.x.count - 1) if self.x.count > 1 else 0.0
+
+    @property
+    def correlation(self) -> float:
+        """Correlação de Pearson (0 quando indefinida)"""
+        denominator = math.sqrt(self.x.m2 * self.y.m2)
+        return self.c2 / denominator if denominator > 0 else 0.0
+
+
+class QuantileSketch:
+    """
+    Sketch KLL de quantis aproximados, com memória O(k) e combinável
+
+    Cada nível guarda itens com peso 2^nível; quando um nível enche, é
+    ordenado e metade dos itens (posições pares ou ímpares, ao acaso) sobe
+    para o nível seguinte. O erro de posição fica em torno de 1.7/k.
+    """
+
+    def __init__(self, k: int = 200, seed: int = None):
+        self.k = k
+        self.count = 0
+        self.levels = [[]]
+        self._random = random.Random(seed)
+
+    def _capacity(self, level: int) -> int:
+        """Capacidade de um nível: os mais altos guardam mais itens"""
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        """Compacta níveis cheios até todos caberem na capacidade"""
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items = sorted(self.levels[level])
+                offset = self._random.randint(0, 1)
+                self.levels[level + 1].extend(items[offset::2])
+                self.levels[level] = []
+            level += 1
+
+    def add(self, value: float):
+        """Inclui um valor"""
+        self.count += 1
+        self.levels[0].append(value)
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other: "QuantileSketch"):
+        """Combina com outro sketch"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self._compress()
+
+    def quantile(self, q: float):
+        """Valor aproximado do quantil q (0 a 1); None se vazio"""
+        weighted = sorted(
+            (value, 2**level)
+            for level, items in enumerate(self.levels)
+            for value in items
+        )
+        if not weighted:
+            return None
+        target = q * sum(weight for _, weight in weighted)
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
+
+
+class ProductionStatistics:
+    """Acumuladores de um produto (ou do total) sobre o fluxo de registros"""
+
+    def __init__(self, sketch_size: int = 200):
+        self.cost = RunningMoments()
+        self.revenue = RunningMoments()
+        self.cost_revenue = RunningCovariance()
+        self.roi = QuantileSketch(sketch_size)
+        self.growth_days = QuantileSketch(sketch_size)
+
+    def add(self, record: Dict):
+        """Inclui um registro"""
+        cost = record["cost_price"] or 0
+        revenue = record["sale_price"] or 0
+        self.cost.add(cost)
+        self.revenue.add(revenue)
+        self.cost_revenue.add(cost, revenue)
+
+        metrics = calculate_metrics(record)
+        # ROI só existe para produções vendidas com custo informado
+        if cost > 0 and revenue > 0:
+            self.roi.add(metrics["roi_percent"])
+        if metrics["growth_period_days"] > 0:
+            self.growth_days.add(metrics["growth_period_days"])
+
+    def merge(self, other: "ProductionStatistics"):
+        """Combina com os acumuladores de outra partição"""
+        self.cost.merge(other.cost)
+        self.revenue.merge(other.revenue)
+        self.cost_revenue.merge(other.cost_revenue)
+        self.roi.merge(other.roi)
+        self.growth_days.merge(other.growth_days)
+
+    def summary(self) -> Dict:
+        """Resume os acumuladores em um dicionário"""
+        return {
+            "count": self.cost.count,
+            "mean_cost": round(self.cost.mean, 2),
+            "stddev_cost": round(self.cost.stddev, 2),
+            "mean_revenue": round(self.revenue.mean, 2),
+            "stddev_revenue": round(self.revenue.stddev, 2),
+            "cost_revenue_covariance": round(self.cost_revenue.covariance, 4),
+            "cost_revenue_correlation": round(self.cost_revenue.correlation, 4),
+            "roi_p25": self.roi.quantile(0.25),
+            "roi_median": self.roi.quantile(0.5),
+            "roi_p90": self.roi.quantile(0.9),
+            "growth_days_median": self.growth_days.quantile(0.5),
+            "growth_days_p90": self.growth_days.quantile(0.9),
+        }
+
+
+def collect_statistics(rows: Iterable[Dict]) -> Dict[str, ProductionStatistics]:
+    """
+    Consome um fluxo de registros em uma passada
+
+    Args:
+        rows: Registros (por exemplo db.stream_agricultural_production())
+
+    Returns:
+        Dict[str, ProductionStatistics]: Acumuladores por produto, mais o
+        total geral na chave None
+    """
+    statistics = {None: ProductionStatistics()}
+    for record in rows:
+        name = record["product_name"]
+        if name not in statistics:
+            statistics[name] = ProductionStatistics()
+        statistics[name].add(record)
+        statistics[None].add(record)
+    return statistics
+
+
+def merge_statistics(partials: Iterable[Dict[str, ProductionStatistics]]) -> Dict:
+    """
+    Combina resultados de collect_statistics de várias partições
+
+    Args:
+        partials: Resultados parciais de collect_statistics
+
+    Returns:
+        Dict[str, ProductionStatistics]: Acumuladores combinados
+    """
+    merged = {}
+    for partial in partials:
+        for name, stats in partial.items():
+            if name not in merged:
+                merged[name] = ProductionStatistics()
+            merged[name].merge(stats)
+    return merged
+
+
+def statistics_rows(statistics: Dict[str, ProductionStatistics]) -> List[Dict]:
+    """Linhas de resumo ordenadas por produto, com o total geral por último"""
+    rows = []
+    for name in sorted(key for key in statistics if key is not None):
+        rows.append({"product_name": name, **statistics[name].summary()})
+    if None in statistics:
+        rows.append({"product_name": "TOTAL", **statistics[None].summary()})
+    return rows
+
+
+def export_statistics_csv() -> bool:
+    """
+    Exporta as estatísticas por produto para CSV
+
+    Returns:
+        bool: True se exportação foi bem-sucedida
+    """
+    try:
+        statistics = report_cache.get_or_compute(
+            "statistics",
+            lambda: collect_statistics(
+                db.stream_across_shards(db.stream_agricultural_production)
+            ),
+            is_empty=lambda statistics: statistics[None].cost.count == 0,
+        )
+        if statistics[None].cost.count == 0:
+            print("❌ Nenhum dado encontrado para exportar!")
+            return False
+
+        rows = statistics_rows(statistics)
+
+        data_dir = ensure_data_directory()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filepath = os.path.join(data_dir, f"statistics_{timestamp}.csv")
+
+        with open(filepath, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+
+        print(f"✅ Estatísticas exportadas com sucesso!")
+        print(f"📁 Arquivo: {filepath}")
+        print(f"📊 Produtos analisados: {len(rows) - 1}")
+
+        return True
+
+    except db.INTERRUPTIONS:
+        raise
+    except Exception as e:
+        print(f"❌ Erro ao exportar estatísticas: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    export_statistics_csv()
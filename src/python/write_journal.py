@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Diário local de escritas (write-behind) para cadastro sem depender da rede
+
+Cadastros, atualizações e exclusões são gravados primeiro em um arquivo
+local só de acréscimo (uma linha JSON por operação) e confirmados assim que
+chegam ao disco: o fsync é feito em grupo por uma thread própria, então
+várias escritas próximas dividem um único fsync. Uma segunda thread envia o
+diário ao banco em lotes, cada lote em uma transação (db.apply_write_batch),
+na ordem em que as operações foram registradas.
+
+Cada operação leva uma chave de idempotência gravada no banco na mesma
+transação: se o envio falhar depois do commit, o lote é reenviado e as
+operações já aplicadas são ignoradas. Com o banco lento ou fora do ar, as
+operações ficam pendentes no arquivo e o envio é retomado sozinho, inclusive
+depois de reiniciar o programa.
+"""
+
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, List
+import db
+
+
+JOURNAL_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "journal")
+JOURNAL_FILE = "journal.log"
+APPLIED_FILE = "journal.applied"
+
+FLUSH_BATCH_SIZE = 100
+FLUSH_INTERVAL = 1.0
+RETRY_MAX_SECONDS = 60.0
+# Com tudo enviado, o diário é reiniciado quando passa deste tamanho
+COMPACT_BYTES = 4 * 1024 * 1024
+
+
+class WriteJournal:
+    """
+    Arquivo de operações pendentes com fsync em grupo
+
+    Args:
+        directory: Pasta do diário (padrão: src/data/journal)
+    """
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or JOURNAL_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, JOURNAL_FILE)
+        self.applied_path = os.path.join(self.directory, APPLIED_FILE)
+
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._closed = False
+
+        applied = self._load_applied()
+        self._applied_offset = applied["offset"]
+        self._applied_seq = applied["seq"]
+        self._last_seq, end = self._recover()
+
+        self._file = open(self.path, "ab")
+        self._file.truncate(end)
+        self._written_seq = self._last_seq
+        self._synced_seq = self._last_seq
+
+        self._syncer = threading.Thread(
+            target=self._sync_loop, name="journal-fsync", daemon=True
+        )
+        self._syncer.start()
+
+    def _load_applied(self) -> Dict:
+        """Posição (bytes) e número da última operação enviada ao banco"""
+        try:
+            with open(self.applied_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"offset": 0, "seq": 0}
+
+    def _recover(self) -> tuple:
+        """
+        Lê o diário a partir da última operação enviada
+
+        Uma linha incompleta no fim (queda no meio da gravação) é descartada:
+        ela nunca foi confirmada a quem a registrou.
+
+        Returns:
+            tuple: (número da última operação completa, tamanho válido em bytes)
+        """
+        last_seq = self._applied_seq
+        end = self._applied_offset
+        if (
+            not os.path.exists(self.path)
+            or os.path.getsize(self.path) < self._applied_offset
+        ):
+            # Arquivo removido ou reiniciado: recomeça do início
+            self._applied_offset = 0
+            return last_seq, 0
+
+        with open(self.path, "rb") as f:
+            f.seek(self._applied_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    last_seq = json.loads(line)["seq"]
+                except ValueError:
+                    break
+                end += len(line)
+        return last_seq, end
+
+    def _sync_loop(self):
+        """Thread de fsync: uma chamada cobre todas as escritas acumuladas"""
+        with self._lock:
+            while True:
+                while self._synced_seq == self._written_seq and not self._closed:
+                    self._synced.wait()
+                if self._synced_seq == self._written_seq:
+                    return
+                target = self._written_seq
+                self._file.flush()
+                fd = self._file.fileno()
+                # O fsync roda fora do lock para novas escritas entrarem no próximo grupo
+                self._lock.release()
+                try:
+                    os.fsync(fd)
+                finally:
+                    self._lock.acquire()
+                self._synced_seq = target
+                self._synced.notify_all()
+
+    def append(self, operation: str, params: Dict, key: str = None) -> Dict:
+        """
+        Registra uma operação e espera ela chegar ao disco
+
+        Args:
+            operation: 'insert', 'update' ou 'delete'
+            params: Argumentos da função correspondente em db.py
+            key: Chave de idempotência (padrão: UUID novo)
+
+        Returns:
+            Dict: A entrada registrada (seq, key, operation, params, logged_at)
+        """
+        entry = {
+            "key": key or str(uuid.uuid4()),
+            "operation": operation,
+            "params": params,
+            "logged_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Diário de escritas fechado")
+            self._last_seq += 1
+            entry["seq"] = self._last_seq
+            line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+            self._file.write(line.encode("utf-8"))
+            self._written_seq = entry["seq"]
+            self._synced.notify_all()
+            while self._synced_seq < entry["seq"]:
+                self._synced.wait()
+        return entry
+
+    def pending(self, limit: int = FLUSH_BATCH_SIZE) -> List[Dict]:
+        """
+        Próximas operações ainda não enviadas, em ordem
+
+        Returns:
+            List[Dict]: Entradas com 'end' (posição após a linha no arquivo)
+        """
+        with self._lock:
+            offset = self._applied_offset
+            synced = self._synced_seq
+
+        entries = []
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                entry = json.loads(line)
+                if entry["seq"] > synced:
+                    break
+                entry["end"] = offset
+                entries.append(entry)
+                if len(entries) >= limit:
+                    break
+        return entries
+
+    def mark_applied(self, entry: Dict):
+        """Registra que esta entrada e as anteriores foram enviadas"""
+        state = {"offset": entry["end"], "seq": entry["seq"]}
+        temp_path = self.applied_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.applied_path)
+
+        with self._lock:
+            self._applied_offset = state["offset"]
+            self._applied_seq = state["seq"]
+            self._compact()
+
+    def _compact(self):
+        """Reinicia o arquivo quando tudo foi enviado (chamado com o lock)"""
+        if (
+            self._applied_seq != self._last_seq
+            or self._applied_offset < COMPACT_BYTES
+        ):
+            return
+        self._file.truncate(0)
+        self._applied_offset = 0
+        temp_path = self.applied_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"offset": 0, "seq": self._applied_seq}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.applied_path)
+
+    def backlog(self) -> int:
+        """Número de operações registradas e ainda não enviadas"""
+        with self._lock:
+            return self._last_seq - self._applied_seq
+
+    def close(self):
+        """Termina o fsync pendente e fecha o arquivo"""
+        with self._lock:
+            self._closed = True
+            self._synced.notify_all()
+        self._syncer.join()
+        self._file.close()
+
+
+def _shard_of(entry: Dict) -> str:
+    """Shard da fazenda dona da operação"""
+    return db.shard_for_farm(entry["params"].get("farm_id"))
+
+
+class JournalFlusher:
+    """
+    Thread que envia o diário ao banco em lotes
+
+    Args:
+        journal: Diário a esvaziar
+        batch_size: Operações por transação
+        interval: Espera entre verificações quando não há pendências
+    """
+
+    def __init__(
+        self,
+        journal: WriteJournal,
+        batch_size: int = FLUSH_BATCH_SIZE,
+        interval: float = FLUSH_INTERVAL,
+    ):
+        self.journal = journal
+        self.batch_size = batch_size
+        self.interval = interval
+        self.last_error = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def flush_once(self) -> int:
+        """
+        Envia um lote
+
+        Returns:
+            int: Operações enviadas (0 se não havia pendências)
+
+        Raises:
+            Exception: Erros do banco; o lote continua pendente
+        """
+        entries = self.journal.pending(self.batch_size)
+        if not entries:
+            return 0
+
+        # Uma transação só alcança um banco: o lote para na primeira
+        # operação de uma fazenda de outro shard, mantendo a ordem
+        shard = _shard_of(entries[0])
+        for index, entry in enumerate(entries):
+            if _shard_of(entry) != shard:
+                entries = entries[:index]
+                break
+
+        with db.use_shard(shard):
+            results = db.apply_write_batch(entries)
+        for entry, result in zip(entries, results):
+            if result["status"] in ("not_found", "conflict", "rejected"):
+                print(
+                    f"⚠️ Operação {entry['operation']} do diário não aplicada "
+                    f"({result['status']}): {entry['params']}"
+                )
+        self.journal.mark_applied(entries[-1])
+        return len(entries)
+
+    def drain(self) -> int:
+        """Envia lotes até esvaziar o diário (para no primeiro erro)"""
+        total = 0
+        while True:
+            sent = self.flush_once()
+            if not sent:
+                return total
+            total += sent
+
+    def _run(self):
+        delay = self.interval
+        while not self._stop.is_set():
+            try:
+                sent = self.flush_once()
+                self.last_error = None
+                delay = self.interval
+            except Exception as e:
+                # Banco lento ou inacessível: tenta de novo com espera crescente
+                if self.last_error is None:
+                    print(f"\n⚠️ Envio do diário adiado: {e}")
+                self.last_error = e
+                sent = 0
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+            if not sent:
+                self._wake.wait(delay)
+                self._wake.clear()
+
+    def notify(self):
+        """Acorda a thread (nova operação registrada)"""
+        self._wake.set()
+
+    def start(self):
+        """Inicia a thread de envio"""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="journal-flusher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """Para a thread de envio (o que ficar pendente segue no arquivo)"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+_journal = None
+_flusher = None
+
+
+def get_journal() -> WriteJournal:
+    """Diário compartilhado do processo (aberto no primeiro uso)"""
+    global _journal
+    if _journal is None:
+        _journal = WriteJournal()
+    return _journal
+
+
+def get_flusher() -> JournalFlusher:
+    """Enviador compartilhado do processo (criado no primeiro uso)"""
+    global _flusher
+    if _flusher is None:
+        _flusher = JournalFlusher(get_journal())
+    return _flusher
+
+
+def start_flusher():
+    """Inicia o envio em segundo plano"""
+    get_flusher().start()
+
+
+def stop_flusher(timeout: float = 5.0) -> int:
+    """
+    Tenta enviar o que falta e para o envio em segundo plano
+
+    Returns:
+        int: Operações que continuam pendentes no arquivo
+    """
+    flusher = get_flusher()
+    flusher.stop(timeout)
+    try:
+        flusher.drain()
+    except Exception as e:
+        print(f"⚠️ Diário não enviado agora: {e}")
+    return backlog_size()
+
+
+def submit(operation: str, params: Dict) -> Dict:
+    """Registra uma operação e avisa o enviador"""
+    entry = get_journal().append(operation, params)
+    if _flusher is not None:
+        _flusher.notify()
+    return entry
+
+
+def create_production(**params) -> Dict:
+    """Registra um cadastro (mesmos argumentos de db.create_agricultural_production)"""
+    return submit("insert", params)
+
+
+def update_production(record_id: int, **params) -> Dict:
+    """Registra uma atualização (mesmos argumentos de db.update_agricultural_production_returning)"""
+    fields = {name: value for name, value in params.items() if value is not None}
+    return submit("update", {"record_id": record_id, **fields})
+
+
+def delete_production(
+    record_id: int, expected_updated_at: datetime = None, farm_id: str = None
+) -> Dict:
+    """Registra uma exclusão"""
+    params = {"record_id": record_id}
+    if expected_updated_at is not None:
+        params["expected_updated_at"] = expected_updated_at
+    if farm_id is not None:
+        params["farm_id"] = farm_id
+    return submit("delete", params)
+
+
+def backlog_size() -> int:
+    """Operações registradas e ainda não enviadas ao banco"""
+    return get_journal().backlog()
+
+
+def main():
+    """Envia ao banco tudo o que estiver pendente no diário"""
+    print("📤 ENVIO DO DIÁRIO DE ESCRITAS")
+    print("=" * 40)
+    print(f"⏳ Pendentes: {backlog_size()}")
+
+    try:
+        sent = get_flusher().drain()
+        print(f"✅ Operações enviadas: {sent}")
+    except Exception as e:
+        print(f"❌ Erro ao enviar o diário (pendências mantidas): {e}")
+
+    print(f"⏳ Restantes: {backlog_size()}")
+
+
+if __name__ == "__main__":
+    main()
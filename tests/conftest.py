@@ -0,0 +1,8 @@
+"""Configuração dos testes: os módulos de src/python são importados pelo nome"""
+
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "python")
+)
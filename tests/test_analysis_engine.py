@@ -0,0 +1,114 @@
+"""Testes das faixas de id e do map-reduce da análise (sem banco)"""
+
+import random
+
+import pytest
+
+import analysis_engine
+from analysis_engine import finish_analysis, map_rows, merge_partials, partition_ids
+
+
+def _identity(product_id, name):
+    """Identidade de teste: o nome em maiúsculas, sem consultar o banco"""
+    return name.upper(), name
+
+
+def _rows(count, seed=9):
+    generator = random.Random(seed)
+    names = {1: "Milho", 2: "Soja", 3: "Café"}
+    rows = []
+    for record_id in range(1, count + 1):
+        product_id = generator.choice(list(names))
+        cost = generator.randint(50, 500)
+        rows.append(
+            {
+                "id": record_id,
+                "product_id": product_id,
+                "product_name": names[product_id],
+                "quantity": generator.randint(1, 100),
+                "cost_price": cost,
+                "sale_price": generator.choice([0, cost * 2]),
+                "planting_date": "2024-01-01",
+                "harvest_date": "2024-04-01",
+                "production_status": generator.choice(["PLANTED", "SOLD"]),
+            }
+        )
+    return rows
+
+
+@pytest.mark.parametrize(
+    "min_id, max_id, partitions",
+    [(1, 100, 4), (1, 10, 3), (5, 5, 4), (1, 3, 8), (10, 1_000_003, 7)],
+)
+def test_partition_ids_covers_the_range_without_overlap(min_id, max_id, partitions):
+    ranges = partition_ids(min_id, max_id, partitions)
+
+    assert ranges[0][0] == min_id
+    assert ranges[-1][1] == max_id
+    assert len(ranges) <= partitions
+    for (_, previous_end), (start, end) in zip(ranges, ranges[1:]):
+        assert start == previous_end + 1
+        assert start <= end
+
+
+def test_partition_ids_sizes_are_balanced():
+    sizes = [end - start + 1 for start, end in partition_ids(1, 1000, 7)]
+    assert max(sizes) - min(sizes) <= max(sizes) // 2
+
+
+def test_partial_merge_equals_a_single_pass(tmp_path):
+    rows = _rows(600)
+    single = finish_analysis(map_rows(rows, str(tmp_path), identity=_identity))
+    merged = finish_analysis(
+        merge_partials(
+            map_rows(part, str(tmp_path), identity=_identity)
+            for part in (rows[:100], rows[100:350], rows[350:])
+        )
+    )
+
+    for key in ("row_count", "total_investment", "total_revenue", "status_count"):
+        assert merged[key] == single[key]
+    assert [row["product_name"] for row in merged["statistics_rows"]] == [
+        "Café",
+        "Milho",
+        "Soja",
+        "TOTAL",
+    ]
+    for expected, actual in zip(single["statistics_rows"], merged["statistics_rows"]):
+        assert actual["count"] == expected["count"]
+        assert actual["mean_cost"] == pytest.approx(expected["mean_cost"], abs=0.01)
+    assert [entry["product_name"] for entry in merged["top_roi"]] == [
+        entry["product_name"] for entry in single["top_roi"]
+    ]
+
+
+def test_product_groups_spill_and_still_combine(tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis_engine.spill_aggregate, "SIZE_CHECK_EVERY", 10)
+    rows = _rows(300)
+    partial = map_rows(rows, str(tmp_path), max_bytes=1, identity=_identity)
+    result = finish_analysis(partial, max_bytes=1)
+
+    counts = {row["product_name"]: row["count"] for row in result["statistics_rows"]}
+    assert counts["TOTAL"] == 300
+    assert sum(count for name, count in counts.items() if name != "TOTAL") == 300
+
+
+def test_products_are_combined_by_identity_across_partials(tmp_path):
+    # Mesmo produto com ids diferentes (como em dois shards) e grafias diferentes
+    north = [dict(record, product_id=1, product_name="Milho") for record in _rows(5)]
+    south = [dict(record, product_id=7, product_name="MILHO") for record in _rows(5)]
+
+    result = finish_analysis(
+        merge_partials(
+            map_rows(rows, str(tmp_path), identity=_identity) for rows in (north, south)
+        )
+    )
+    assert len(result["statistics_rows"]) == 2
+    assert result["statistics_rows"][0]["product_name"] in ("Milho", "MILHO")
+    assert result["statistics_rows"][0]["count"] == 10
+
+
+def test_empty_partial_finishes_with_only_the_total(tmp_path):
+    result = finish_analysis(merge_partials([]))
+    assert result["row_count"] == 0
+    assert [row["product_name"] for row in result["statistics_rows"]] == ["TOTAL"]
@@ -0,0 +1,152 @@
+"""Testes dos buracos na sequência do feed de alterações (log em memória)"""
+
+import pytest
+
+import change_feed
+import db
+from change_feed import ChangeSubscriber
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeConnection:
+    def cursor(self):
+        return self
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    """Log de alterações em memória e checkpoints gravados, sem banco"""
+    state = {"log": [], "checkpoints": []}
+    clock = FakeClock()
+    monkeypatch.setattr(change_feed.time, "monotonic", clock)
+    monkeypatch.setattr(ChangeSubscriber, "_load_checkpoint", lambda self: 0)
+
+    def fetch_changes(self, statement, params):
+        if statement == "changes_after":
+            visible = [
+                change_id
+                for change_id in sorted(state["log"])
+                if change_id > params["last_change_id"]
+            ][: params["batch_size"]]
+        else:
+            wanted = {value for value in params.values() if value is not None}
+            visible = [
+                change_id for change_id in sorted(state["log"]) if change_id in wanted
+            ]
+        return [{"change_id": change_id, "shard": self.shard} for change_id in visible]
+
+    def execute_statement(cursor, name, params):
+        state["checkpoints"].append(params["last_change_id"])
+
+    monkeypatch.setattr(ChangeSubscriber, "_fetch_changes", fetch_changes)
+    monkeypatch.setattr(db, "get_connection", lambda shard=None: FakeConnection())
+    monkeypatch.setattr(db, "execute_statement", execute_statement)
+    state["clock"] = clock
+    return state
+
+
+def _ids(changes):
+    return [change["change_id"] for change in changes]
+
+
+def test_contiguous_changes_are_delivered_in_order(feed):
+    feed["log"] = [1, 2, 3]
+    subscriber = ChangeSubscriber("teste", gap_timeout=5)
+
+    assert _ids(subscriber.poll()) == [1, 2, 3]
+    assert subscriber.poll() == []
+    assert subscriber.commit()
+    assert feed["checkpoints"] == [3]
+
+
+def test_a_gap_waits_for_the_timeout_before_skipping(feed):
+    feed["log"] = [1, 3, 4]
+    subscriber = ChangeSubscriber("teste", gap_timeout=5)
+
+    assert _ids(subscriber.poll()) == [1]
+    # Id 2 ainda pode ser de uma transação sem commit: espera
+    assert subscriber.poll() == []
+    feed["clock"].now += 5
+    assert _ids(subscriber.poll()) == [3, 4]
+    assert set(subscriber._skipped) == {2}
+
+
+def test_a_skipped_change_is_delivered_late_when_it_appears(feed):
+    feed["log"] = [1, 3]
+    subscriber = ChangeSubscriber("teste", gap_timeout=0)
+    assert _ids(subscriber.poll()) == [1, 3]
+
+    feed["log"] = [1, 2, 3, 4]
+    changes = subscriber.poll()
+    assert _ids(changes) == [2, 4]
+    assert changes[0]["late"] is True
+    assert "late" not in changes[1]
+    assert subscriber._skipped == {}
+
+
+def test_commit_does_not_pass_skipped_ids(feed):
+    feed["log"] = [1, 2, 5, 6]
+    subscriber = ChangeSubscriber("teste", gap_timeout=0)
+    assert _ids(subscriber.poll()) == [1, 2, 5, 6]
+
+    subscriber.commit()
+    assert feed["checkpoints"] == [2]
+
+    # Quando os ids aparecem, o checkpoint avança até a posição lida
+    feed["log"] = [1, 2, 3, 4, 5, 6]
+    assert _ids(subscriber.poll()) == [3, 4]
+    subscriber.commit()
+    assert feed["checkpoints"] == [2, 6]
+
+
+def test_skipped_ids_are_given_up_after_the_recheck_window(feed):
+    feed["log"] = [1, 3]
+    subscriber = ChangeSubscriber("teste", gap_timeout=0, gap_recheck=60)
+    subscriber.poll()
+
+    feed["clock"].now += 61
+    assert subscriber.poll() == []
+    assert subscriber._skipped == {}
+    subscriber.commit()
+    assert feed["checkpoints"] == [3]
+
+
+def test_recheck_queries_many_skipped_ids_in_chunks(feed):
+    feed["log"] = [1, 50]
+    subscriber = ChangeSubscriber("teste", gap_timeout=0)
+    subscriber.poll()
+    assert len(subscriber._skipped) == 48
+
+    feed["log"] = list(range(1, 51))
+    late = subscriber.poll()
+    assert _ids(late) == list(range(2, 50))
+    assert all(change["late"] for change in late)
+
+
+def test_rewind_restores_the_committed_position_and_skipped_ids(feed):
+    feed["log"] = [1, 3]
+    subscriber = ChangeSubscriber("teste", gap_timeout=0)
+    subscriber.poll()
+    subscriber.commit()
+
+    feed["log"] = [1, 2, 3, 4]
+    assert _ids(subscriber.poll()) == [2, 4]
+    subscriber.rewind()
+    # Sem commit, o lote é relido inteiro
+    assert _ids(subscriber.poll()) == [2, 4]
@@ -0,0 +1,148 @@
+"""Testes do checkpoint e da retomada da exportação CSV (registros em memória)"""
+
+import csv
+import json
+import os
+
+import pytest
+
+import db
+import export_csv
+
+
+def _record(record_id, archived=False):
+    return {
+        "id": record_id,
+        "product_name": "Milho",
+        "quantity": 10,
+        "sale_price": 200,
+        "cost_price": 100,
+        "planting_date": "2024-01-01",
+        "harvest_date": "2024-03-01",
+        "production_status": "SOLD",
+        "created_at": "2024-01-01",
+        "updated_at": "2024-03-01",
+        "archived": archived,
+    }
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """Dois shards em memória; 'fail_after' interrompe a leitura após N lotes"""
+    state = {
+        "records": {
+            "main": [_record(i) for i in range(1, 8)] + [_record(8, archived=True)],
+            "north": [_record(i) for i in range(1, 6)],
+        },
+        "fail_after": None,
+        "batches": 0,
+        "include_archive": [],
+    }
+    monkeypatch.setattr(export_csv, "ensure_data_directory", lambda: str(tmp_path))
+    monkeypatch.setattr(export_csv, "EXPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(export_csv, "CHECKPOINT_SECONDS", 0)
+    monkeypatch.setattr(db, "SHARDS", {"main": {}, "north": {}})
+    monkeypatch.setattr(db, "DEFAULT_SHARD", "main")
+
+    def iterate_on_shard(
+        shard, function, ranges=None, batch_size=2, include_archive=True
+    ):
+        state["include_archive"].append(include_archive)
+        first_id = ranges["id"][0] if ranges else 1
+        records = [
+            dict(record)
+            for record in state["records"][shard]
+            if record["id"] >= first_id and (include_archive or not record["archived"])
+        ]
+        for start in range(0, len(records), batch_size):
+            if (
+                state["fail_after"] is not None
+                and state["batches"] >= state["fail_after"]
+            ):
+                raise ConnectionError("conexão perdida")
+            state["batches"] += 1
+            yield records[start : start + batch_size]
+
+    monkeypatch.setattr(db, "iterate_on_shard", iterate_on_shard)
+    state["dir"] = tmp_path
+    return state
+
+
+def _read(path):
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def test_export_without_interruption_removes_the_checkpoint(source):
+    assert export_csv.export_to_csv("full.csv")
+
+    path = source["dir"] / "full.csv"
+    rows = _read(path)
+    assert rows[0] == export_csv.DETAIL_HEADERS
+    assert len(rows) == 1 + 8 + 5
+    assert not os.path.exists(export_csv.checkpoint_path(str(path)))
+
+
+def test_resume_after_an_interruption_writes_each_row_once(source):
+    source["fail_after"] = 5
+    assert not export_csv.export_to_csv("partial.csv")
+    path = str(source["dir"] / "partial.csv")
+    checkpoint = export_csv.load_checkpoint(path)
+    # O pipeline pode gravar lotes já lidos antes de a falha chegar
+    assert 0 < checkpoint["rows"] < 13
+
+    source["fail_after"] = None
+    assert export_csv.export_to_csv("partial.csv", resume=True)
+
+    rows = _read(path)
+    assert rows.count(export_csv.DETAIL_HEADERS) == 1
+    ids = [row[0] for row in rows[1:]]
+    assert ids == [str(i) for i in range(1, 9)] + [str(i) for i in range(1, 6)]
+    assert not os.path.exists(export_csv.checkpoint_path(path))
+
+
+def test_resume_truncates_bytes_written_after_the_checkpoint(source):
+    source["fail_after"] = 2
+    export_csv.export_to_csv("torn.csv")
+    path = str(source["dir"] / "torn.csv")
+    with open(path, "ab") as csv_file:
+        csv_file.write(b"99,linha incomple")
+
+    source["fail_after"] = None
+    assert export_csv.export_to_csv("torn.csv", resume=True)
+    ids = [row[0] for row in _read(path)[1:]]
+    assert "99" not in ids
+    assert ids == [str(i) for i in range(1, 9)] + [str(i) for i in range(1, 6)]
+
+
+def test_resume_keeps_the_archive_setting_of_the_checkpoint(source):
+    source["fail_after"] = 1
+    export_csv.export_to_csv("hot.csv", include_archive=False)
+
+    source["fail_after"] = None
+    source["include_archive"].clear()
+    assert export_csv.export_to_csv("hot.csv", resume=True)
+    assert set(source["include_archive"]) == {False}
+    assert len(_read(str(source["dir"] / "hot.csv"))) == 1 + 7 + 5
+
+
+def test_checkpoint_without_the_archive_key_resumes_with_the_archive(source):
+    source["fail_after"] = 1
+    export_csv.export_to_csv("old.csv")
+    path = str(source["dir"] / "old.csv")
+    checkpoint_file = export_csv.checkpoint_path(path)
+    with open(checkpoint_file, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    del checkpoint["include_archive"]
+    with open(checkpoint_file, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+
+    source["fail_after"] = None
+    source["include_archive"].clear()
+    assert export_csv.export_to_csv("old.csv", resume=True)
+    assert set(source["include_archive"]) == {True}
+    assert len(_read(path)) == 1 + 8 + 5
+
+
+def test_resume_without_a_checkpoint_fails(source):
+    assert not export_csv.export_to_csv("missing.csv", resume=True)
@@ -0,0 +1,56 @@
+"""Testes do modo de perfil: relatórios e soma dos perfis das threads"""
+
+import sys
+import threading
+
+import pytest
+
+import profiling
+
+
+@pytest.fixture
+def profiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "RESULTS_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "_enabled", True)
+    return tmp_path
+
+
+def _work():
+    return sum(i * i for i in range(20000))
+
+
+def test_profile_action_writes_the_reports(profiled, capsys):
+    with profiling.profile_action("soma"):
+        _work()
+
+    names = sorted(path.suffix for path in profiled.iterdir())
+    assert names == [".prof", ".txt"]
+    assert "Perfil de 'soma'" in capsys.readouterr().out
+
+
+def test_nested_actions_use_the_outer_profile(profiled):
+    with profiling.profile_action("externa"):
+        with profiling.profile_action("interna"):
+            _work()
+
+    assert all(path.name.startswith("externa_") for path in profiled.iterdir())
+
+
+@pytest.mark.skipif(
+    sys.version_info >= (3, 12),
+    reason="a partir do 3.12 o perfil principal já vê todas as threads",
+)
+def test_finished_threads_are_merged_and_running_ones_counted(profiled, capsys):
+    release = threading.Event()
+    with profiling.profile_action("threads"):
+        worker = threading.Thread(target=_work)
+        worker.start()
+        worker.join()
+        waiting = threading.Thread(target=release.wait)
+        waiting.start()
+    release.set()
+    waiting.join()
+
+    out = capsys.readouterr().out
+    assert "Inclui 1 thread(s)" in out
+    assert "1 thread(s) ainda em execução" in out
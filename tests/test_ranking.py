@@ -0,0 +1,80 @@
+"""Testes do top-K em fluxo e da numeração do ranking (sem banco)"""
+
+import random
+
+from ranking import _assign_ranks, rank_product_aggregates, top_k
+
+
+def _naive_top_k(items, k, key):
+    """Referência: ordena tudo e inclui os empates com o K-ésimo valor"""
+    valued = [item for item in items if key(item) is not None]
+    ordered = sorted(valued, key=key, reverse=True)
+    if len(ordered) <= k:
+        return ordered
+    threshold = key(ordered[k - 1])
+    return [item for item in ordered if key(item) >= threshold]
+
+
+def test_top_k_keeps_largest_in_descending_order():
+    assert top_k([5, 1, 9, 3, 7], 3, key=lambda value: value) == [9, 7, 5]
+
+
+def test_top_k_includes_ties_with_the_last_position():
+    items = [("a", 10), ("b", 8), ("c", 8), ("d", 8), ("e", 1)]
+    ranked = top_k(items, 2, key=lambda item: item[1])
+    assert [name for name, _ in ranked] == ["a", "b", "c", "d"]
+
+
+def test_top_k_drops_ties_that_fall_below_a_new_threshold():
+    # Os 3 primeiros empatam; depois valores maiores empurram o limite para cima
+    items = [("a", 1), ("b", 1), ("c", 1), ("d", 5), ("e", 6)]
+    ranked = top_k(items, 2, key=lambda item: item[1])
+    assert [name for name, _ in ranked] == ["e", "d"]
+
+
+def test_top_k_is_stable_for_equal_values():
+    items = [("first", 3), ("second", 3), ("third", 3)]
+    assert top_k(items, 3, key=lambda item: item[1]) == items
+
+
+def test_top_k_skips_none_and_handles_small_inputs():
+    items = [None, 4, None, 2]
+    assert top_k(items, 5, key=lambda value: value) == [4, 2]
+    assert top_k([], 3, key=lambda value: value) == []
+    assert top_k([1, 2], 0, key=lambda value: value) == []
+
+
+def test_top_k_matches_sorting_on_random_streams():
+    generator = random.Random(8)
+    for _ in range(200):
+        values = [generator.randint(0, 15) for _ in range(generator.randint(0, 40))]
+        k = generator.randint(1, 10)
+        key = lambda value: value
+        assert top_k(values, k, key) == _naive_top_k(values, k, key)
+
+
+def test_assign_ranks_gives_ties_the_same_position():
+    ranked = _assign_ranks([{"metric_value": value} for value in (9, 7, 7, 3)])
+    assert [entry["rank"] for entry in ranked] == [1, 2, 2, 4]
+
+
+def test_rank_product_aggregates_ignores_products_without_investment():
+    aggregates = [
+        {
+            "product_name": "Milho",
+            "quantity": 10,
+            "investment": 100,
+            "revenue": 150,
+            "production_count": 1,
+        },
+        {
+            "product_name": "Soja",
+            "quantity": 5,
+            "investment": 0,
+            "revenue": 50,
+            "production_count": 1,
+        },
+    ]
+    ranked = rank_product_aggregates(aggregates, "roi", 5)
+    assert [entry["product_name"] for entry in ranked] == ["Milho"]
+    assert ranked[0]["metric_value"] == 50
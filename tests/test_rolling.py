@@ -0,0 +1,119 @@
+"""Testes da janela deslizante e das métricas em janela móvel (sem banco)"""
+
+from datetime import date
+
+import pytest
+
+from rolling import TrailingWindow, monthly_cells_from_rows, rolling_from_cells
+
+
+def _values(quantity, cost=0, revenue=0):
+    return {"total_quantity": quantity, "total_cost": cost, "total_revenue": revenue}
+
+
+def _cell(product, period, quantity, cost, revenue):
+    return {
+        "product_name": product,
+        "period": period,
+        **_values(quantity, cost, revenue),
+    }
+
+
+def test_trailing_window_sums_the_last_months():
+    window = TrailingWindow(3)
+    sums = [
+        window.push(month, _values(month))["total_quantity"] for month in range(1, 6)
+    ]
+    assert sums == [1, 3, 6, 9, 12]
+
+
+def test_trailing_window_treats_missing_months_as_zero():
+    window = TrailingWindow(3)
+    window.push(1, _values(10))
+    window.push(2, _values(20))
+    # Mês 5: os meses 1 e 2 saíram da janela (3..5), 3 e 4 não tiveram produção
+    assert window.push(5, _values(5))["total_quantity"] == 5
+
+
+def test_trailing_window_returns_a_copy_of_the_sums():
+    window = TrailingWindow(2)
+    first = window.push(1, _values(1))
+    window.push(2, _values(2))
+    assert first["total_quantity"] == 1
+
+
+def test_rolling_from_cells_restarts_for_each_product():
+    cells = [
+        _cell("Milho", "2024-01", 10, 100, 150),
+        _cell("Milho", "2024-02", 20, 100, 50),
+        _cell("Soja", "2024-02", 5, 50, 100),
+    ]
+    rows = list(rolling_from_cells(cells, window=2))
+
+    assert [row["trailing_roi_percent"] for row in rows] == [50.0, 0.0, 100.0]
+    assert [row["moving_avg_quantity"] for row in rows] == [5.0, 15.0, 2.5]
+    # Primeiro mês de cada produto compara com zero
+    assert [row["quantity_delta"] for row in rows] == [10, 10, 5]
+
+
+def test_rolling_from_cells_delta_after_a_gap_compares_with_zero():
+    cells = [
+        _cell("Milho", "2024-01", 10, 100, 0),
+        _cell("Milho", "2024-03", 4, 40, 0),
+    ]
+    rows = list(rolling_from_cells(cells, window=12))
+    assert rows[1]["quantity_delta"] == 4
+    assert rows[1]["cost_delta"] == 40
+
+
+def test_rolling_from_cells_spans_year_boundaries():
+    cells = [
+        _cell("Milho", "2023-12", 10, 100, 100),
+        _cell("Milho", "2024-01", 10, 100, 300),
+    ]
+    rows = list(rolling_from_cells(cells, window=2))
+    assert rows[1]["trailing_roi_percent"] == pytest.approx(100.0)
+    assert rows[1]["quantity_delta"] == 0
+
+
+def test_monthly_cells_from_rows_groups_and_sorts():
+    rows = [
+        {
+            "product_name": "Soja",
+            "harvest_date": date(2024, 2, 10),
+            "quantity": 1,
+            "cost_price": 10,
+            "sale_price": None,
+        },
+        {
+            "product_name": "Milho",
+            "harvest_date": "2024-01-05",
+            "quantity": 2,
+            "cost_price": 20,
+            "sale_price": 30,
+        },
+        {
+            "product_name": "Milho",
+            "harvest_date": "2024-01-20",
+            "quantity": 3,
+            "cost_price": None,
+            "sale_price": 10,
+        },
+        {
+            "product_name": "Milho",
+            "harvest_date": None,
+            "quantity": 9,
+            "cost_price": 1,
+            "sale_price": 1,
+        },
+    ]
+    cells = monthly_cells_from_rows(rows)
+
+    assert [(cell["product_name"], cell["period"]) for cell in cells] == [
+        ("Milho", "2024-01"),
+        ("Soja", "2024-02"),
+    ]
+    assert cells[0]["total_quantity"] == 5
+    assert cells[0]["total_cost"] == 20
+    assert cells[0]["total_revenue"] == 40
+    assert cells[1]["total_revenue"] == 0
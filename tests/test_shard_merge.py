@@ -0,0 +1,147 @@
+"""Testes da ordenação e da paginação entre shards e da soma do ranking"""
+
+import pytest
+
+import db
+import ranking
+
+SHARD_RECORDS = {
+    # Mesmos ids e vários instantes repetidos nos dois shards
+    "main": [
+        (created_at, record_id)
+        for record_id, created_at in enumerate([1, 2, 2, 2, 3, 5, 5, 7, 8, 8], start=1)
+    ],
+    "north": [
+        (created_at, record_id)
+        for record_id, created_at in enumerate([2, 2, 3, 5, 5, 5, 6, 8], start=1)
+    ],
+}
+
+
+@pytest.fixture
+def shards(monkeypatch):
+    """Dois shards com páginas lidas de listas em memória"""
+    monkeypatch.setattr(db, "SHARDS", {"main": {}, "north": {}})
+    monkeypatch.setattr(db, "DEFAULT_SHARD", "main")
+
+    def read_page(page_size=20, after=None, before=None, from_date=None):
+        rows = sorted(SHARD_RECORDS[db.current_shard()], reverse=True)
+        if after:
+            rows = [row for row in rows if row < tuple(after)]
+        elif before:
+            rows = sorted(row for row in rows if row > tuple(before))
+        records = [{"created_at": c, "id": i} for c, i in rows[: page_size + 1]]
+        has_more = len(records) > page_size
+        records = records[:page_size]
+        if before:
+            records.reverse()
+        return {"records": records, "has_more": has_more}
+
+    monkeypatch.setattr(db, "read_agricultural_production_page", read_page)
+
+
+def _expected_order():
+    return sorted(
+        (
+            (created_at, shard, record_id)
+            for shard, rows in SHARD_RECORDS.items()
+            for created_at, record_id in rows
+        ),
+        reverse=True,
+    )
+
+
+def _cursor(record):
+    return (record["created_at"], record["shard"], record["id"])
+
+
+def test_sort_key_breaks_ties_by_shard_before_id():
+    rows = [
+        {"value": 1, "shard": "north", "id": 1},
+        {"value": 1, "shard": "main", "id": 2},
+        {"value": None, "shard": "main", "id": 0},
+        {"value": 0, "shard": "north", "id": 9},
+    ]
+    ordered = sorted(rows, key=db.sort_key("value"))
+    assert [(row["shard"], row["id"]) for row in ordered] == [
+        ("north", 9),
+        ("main", 2),
+        ("north", 1),
+        ("main", 0),
+    ]
+
+
+def test_shard_page_cursor_only_compares_ids_on_the_cursor_shard():
+    cursor = (5, "main", 7)
+    assert db._shard_page_cursor(None, "main") is None
+    assert db._shard_page_cursor(cursor, "main") == (5, 7)
+    # "north" vem depois de "main": no instante 5, todos os seus registros
+    # estão antes do cursor (mais novos)
+    assert db._shard_page_cursor(cursor, "north") == (5, 0)
+    assert db._shard_page_cursor((5, "north", 2), "main") == (5, db._ID_LIMIT)
+
+
+@pytest.mark.parametrize("page_size", [1, 3, 4, 7])
+def test_paging_forward_visits_every_record_once(shards, page_size):
+    seen = []
+    page = db.read_page_across_shards(page_size)
+    while True:
+        seen.extend(_cursor(record) for record in page["records"])
+        if not page["has_more"]:
+            break
+        page = db.read_page_across_shards(page_size, after=seen[-1])
+    assert seen == _expected_order()
+
+
+@pytest.mark.parametrize("page_size", [1, 3, 4, 7])
+def test_paging_back_returns_the_same_pages(shards, page_size):
+    pages = [db.read_page_across_shards(page_size)["records"]]
+    while True:
+        page = db.read_page_across_shards(page_size, after=_cursor(pages[-1][-1]))
+        if not page["records"]:
+            break
+        pages.append(page["records"])
+        if not page["has_more"]:
+            break
+
+    for newer, older in zip(pages, pages[1:]):
+        previous = db.read_page_across_shards(page_size, before=_cursor(older[0]))
+        assert [_cursor(r) for r in previous["records"]] == [_cursor(r) for r in newer]
+
+
+def test_merge_product_totals_sums_names_with_the_same_search_key():
+    main = [
+        {
+            "product_name": "Milho",
+            "quantity": 10,
+            "investment": 100,
+            "revenue": 150,
+            "production_count": 1,
+        },
+        {
+            "product_name": "Soja",
+            "quantity": 5,
+            "investment": 50,
+            "revenue": None,
+            "production_count": 1,
+        },
+    ]
+    north = [
+        {
+            "product_name": " milho ",
+            "quantity": 20,
+            "investment": 200,
+            "revenue": 250,
+            "production_count": 2,
+        }
+    ]
+    totals = {
+        db.product_search_key(row["product_name"]): row
+        for row in ranking._merge_product_totals([main, north])
+    }
+    assert set(totals) == {"MILHO", "SOJA"}
+    assert totals["MILHO"]["quantity"] == 30
+    assert totals["MILHO"]["investment"] == 300
+    assert totals["MILHO"]["revenue"] == 400
+    assert totals["MILHO"]["production_count"] == 3
+    assert totals["SOJA"]["revenue"] is None
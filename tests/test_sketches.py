@@ -0,0 +1,199 @@
+"""Testes dos sketches do modo aproximado e do delta local de escritas"""
+
+import threading
+
+import pytest
+
+import db
+import sketches
+
+
+def _record(name, quantity=10):
+    return {
+        "product_name": name,
+        "quantity": quantity,
+        "cost_price": 100,
+        "sale_price": 150,
+        "production_status": "SOLD",
+    }
+
+
+class FakeCursor:
+    def __init__(self, table):
+        self.table = table
+
+    def setinputsizes(self, **sizes):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Guarda o payload de production_sketches; commit torna a escrita visível"""
+
+    def __init__(self, table):
+        self.table = table
+        self.staged = None
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        if self.staged is not None:
+            self.table["payload"] = self.staged
+
+    def rollback(self):
+        self.staged = None
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Um shard com a tabela de sketches em memória e delta local vazio"""
+    table = {"payload": "", "fail_save": False}
+    monkeypatch.setattr(db, "SHARDS", {"main": {}})
+    monkeypatch.setattr(db, "DEFAULT_SHARD", "main")
+    monkeypatch.setattr(sketches, "_pending", {})
+    monkeypatch.setattr(sketches, "FLUSH_EVERY", 10**9)
+
+    connections = []
+
+    def get_connection():
+        connections.append(FakeConnection(table))
+        return connections[-1]
+
+    def fetchone_statement(cursor, name, params=None):
+        return (cursor.table.table["payload"],)
+
+    def execute_statement(cursor, name, params=None):
+        if table["fail_save"]:
+            raise RuntimeError("falha ao gravar")
+        cursor.table.staged = params["payload"]
+
+    monkeypatch.setattr(db, "get_connection", get_connection)
+    monkeypatch.setattr(db, "fetchone_statement", fetchone_statement)
+    monkeypatch.setattr(db, "execute_statement", execute_statement)
+    with db.use_shard("main"):
+        yield table
+
+
+def _saved(table):
+    return sketches.ProductionSketches.from_json(table["payload"])
+
+
+def test_hyperloglog_estimates_distinct_values_and_merges_as_a_union():
+    first, second = sketches.HyperLogLog(), sketches.HyperLogLog()
+    for i in range(6000):
+        first.add(f"produto-{i}")
+    for i in range(3000, 9000):
+        second.add(f"produto-{i}")
+    first.merge(second)
+    # Quatro erros-padrão de folga
+    assert first.estimate() == pytest.approx(9000, rel=4 * first.relative_error)
+
+
+def test_count_min_never_underestimates_and_subtracts_removals():
+    sketch = sketches.CountMinSketch(width=64, depth=4)
+    exact = {}
+    for i in range(500):
+        key = f"p{i % 80}"
+        sketch.add(key, i % 7 + 1)
+        exact[key] = exact.get(key, 0) + i % 7 + 1
+    for key, total in exact.items():
+        assert total <= sketch.estimate(key) <= total + sketch.error_bound
+
+    sketch.add("p1", -exact["p1"])
+    assert sketch.estimate("p1") >= 0
+
+
+def test_production_sketches_round_trip_through_json():
+    original = sketches.ProductionSketches()
+    for i in range(30):
+        original.add(_record(f"p{i % 4}", i))
+    original.remove(_record("p0", 0))
+
+    restored = sketches.ProductionSketches.from_json(original.to_json())
+    assert restored.row_count == 29
+    assert restored.stale_changes == 1
+    assert restored.candidates == original.candidates
+    assert restored.sample.seen == original.sample.seen
+    assert restored.products.estimate() == original.products.estimate()
+
+
+def test_writes_from_several_threads_all_reach_the_delta(store):
+    def write(count):
+        # Threads novas começam sem o shard do contexto (como a do diário)
+        with db.use_shard("main"):
+            for _ in range(count):
+                sketches._on_write("insert", None, _record("Milho", 1))
+
+    threads = [threading.Thread(target=write, args=(500,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    pending = sketches._pending["main"]
+    assert pending.row_count == 2000
+    assert pending.quantity.total == 2000
+
+
+def test_flush_merges_the_delta_with_the_saved_sketches(store):
+    sketches._on_write("insert", None, _record("Milho"))
+    assert sketches.flush()
+    sketches._on_write("insert", None, _record("Soja"))
+    sketches._on_write("update", _record("Soja"), _record("Soja", 30))
+    assert sketches.flush()
+
+    saved = _saved(store)
+    assert saved.row_count == 2
+    assert saved.stale_changes == 1
+    assert saved.quantity.estimate("Soja") >= 30
+    assert not sketches._has_changes(
+        sketches._pending.get("main", sketches.ProductionSketches())
+    )
+
+
+def test_failed_save_keeps_the_delta_for_the_next_flush(store):
+    sketches._on_write("insert", None, _record("Milho"))
+    store["fail_save"] = True
+    assert not sketches.flush()
+    assert sketches._pending["main"].row_count == 1
+
+    store["fail_save"] = False
+    assert sketches.flush()
+    assert _saved(store).row_count == 1
+
+
+def test_rebuild_keeps_writes_made_during_the_scan(store, monkeypatch):
+    # Delta anterior à leitura: já está no banco e entra pela própria leitura
+    sketches._on_write("insert", None, _record("Milho"))
+
+    def stream():
+        yield _record("Milho")
+        sketches._on_write("insert", None, _record("Soja"))
+        yield _record("Trigo")
+
+    monkeypatch.setattr(db, "stream_agricultural_production", stream)
+    assert sketches.rebuild_sketches()
+
+    saved = _saved(store)
+    assert saved.row_count == 3
+    assert saved.quantity.estimate("Soja") >= 10
+    assert "main" not in sketches._pending or not sketches._pending["main"].row_count
+
+
+def test_failed_rebuild_restores_the_discarded_delta(store, monkeypatch):
+    sketches._on_write("insert", None, _record("Milho"))
+
+    def stream():
+        yield _record("Milho")
+        raise RuntimeError("leitura interrompida")
+
+    monkeypatch.setattr(db, "stream_agricultural_production", stream)
+    assert not sketches.rebuild_sketches()
+    assert store["payload"] == ""
+    assert sketches._pending["main"].row_count == 1
@@ -0,0 +1,142 @@
+"""Testes do agrupamento com orçamento de memória e transbordo (sem banco)"""
+
+import os
+from collections import Counter
+
+import pytest
+
+import spill_aggregate
+from spill_aggregate import (
+    SpillingAggregator,
+    aggregate,
+    merge_partitions,
+    write_partitions,
+)
+
+
+@pytest.fixture(autouse=True)
+def frequent_size_checks(monkeypatch):
+    """Confere o orçamento com frequência para os testes transbordarem rápido"""
+    monkeypatch.setattr(spill_aggregate, "SIZE_CHECK_EVERY", 50)
+
+
+def _rows(groups=300, per_group=10):
+    return [
+        {"product": f"p{index % groups}", "quantity": index % 7}
+        for index in range(groups * per_group)
+    ]
+
+
+def _aggregator(max_bytes, directory=None):
+    return SpillingAggregator(
+        key=lambda record: record["product"],
+        create=lambda key: {"quantity": 0, "count": 0},
+        update=lambda state, record: state.update(
+            quantity=state["quantity"] + record["quantity"], count=state["count"] + 1
+        ),
+        merge=lambda a, b: {
+            "quantity": a["quantity"] + b["quantity"],
+            "count": a["count"] + b["count"],
+        },
+        max_bytes=max_bytes,
+        directory=directory,
+    )
+
+
+def _expected(rows):
+    quantities, counts = Counter(), Counter()
+    for record in rows:
+        quantities[record["product"]] += record["quantity"]
+        counts[record["product"]] += 1
+    return {key: {"quantity": quantities[key], "count": counts[key]} for key in counts}
+
+
+def test_in_memory_path_keeps_first_seen_order():
+    rows = _rows(groups=20)
+    with _aggregator(max_bytes=10**9) as aggregator:
+        aggregator.add_all(rows)
+        results = list(aggregator.results())
+
+    assert aggregator.spills == 0
+    assert [key for key, _ in results] == [f"p{index}" for index in range(20)]
+    assert dict(results) == _expected(rows)
+
+
+def test_spilling_gives_the_same_groups_and_cleans_up(tmp_path):
+    rows = _rows()
+    with _aggregator(max_bytes=2_000, directory=str(tmp_path)) as aggregator:
+        aggregator.add_all(rows)
+        assert aggregator.spills > 0
+        results = list(aggregator.results())
+
+    assert len(results) == len({key for key, _ in results})
+    assert dict(results) == _expected(rows)
+    assert os.listdir(tmp_path) == []
+
+
+def test_partitions_that_never_fit_stop_at_max_depth(tmp_path):
+    rows = _rows(groups=100, per_group=3)
+    with _aggregator(max_bytes=1, directory=str(tmp_path)) as aggregator:
+        aggregator.add_all(rows)
+        assert dict(aggregator.results()) == _expected(rows)
+    assert os.listdir(tmp_path) == []
+
+
+def test_spill_files_are_removed_when_the_block_fails(tmp_path):
+    with pytest.raises(RuntimeError):
+        with _aggregator(max_bytes=500, directory=str(tmp_path)) as aggregator:
+            aggregator.add_all(_rows())
+            assert aggregator.spills > 0
+            raise RuntimeError("falha no meio da leitura")
+    assert os.listdir(tmp_path) == []
+
+
+def test_add_state_merges_partial_states():
+    with _aggregator(max_bytes=10**9) as aggregator:
+        aggregator.add_state("p1", {"quantity": 2, "count": 1})
+        aggregator.add_state("p1", {"quantity": 3, "count": 2})
+        assert dict(aggregator.results()) == {"p1": {"quantity": 5, "count": 3}}
+
+
+def test_aggregate_shortcut():
+    rows = _rows(groups=50)
+    results = aggregate(
+        rows,
+        key=lambda record: record["product"],
+        create=lambda key: 0,
+        update=lambda state, record: None,
+        merge=lambda a, b: a + b,
+        max_bytes=10**9,
+    )
+    assert sorted(key for key, _ in results) == sorted(f"p{i}" for i in range(50))
+
+
+def test_partition_of_is_deterministic_and_in_range():
+    partitions = [spill_aggregate._partition_of(("Milho", 3), 16, 0) for _ in range(3)]
+    assert len(set(partitions)) == 1
+    assert 0 <= partitions[0] < 16
+
+
+def test_write_and_merge_partitions_combine_partials(tmp_path):
+    rows = _rows(groups=120)
+    halves = (rows[: len(rows) // 2], rows[len(rows) // 2 :])
+    partials = []
+    for half in halves:
+        with _aggregator(max_bytes=10**9) as aggregator:
+            aggregator.add_all(half)
+            partials.append(
+                write_partitions(aggregator.results(), str(tmp_path), partitions=4)
+            )
+
+    merge = lambda a, b: {
+        "quantity": a["quantity"] + b["quantity"],
+        "count": a["count"] + b["count"],
+    }
+    merged = list(merge_partitions(partials, merge, max_bytes=1_000))
+
+    assert len(merged) == 120
+    assert dict(merged) == _expected(rows)
+
+
+def test_merge_partitions_without_partials_yields_nothing():
+    assert list(merge_partitions([], lambda a, b: a)) == []
@@ -0,0 +1,59 @@
+"""Testes da estimativa de acertos no cache de comandos do driver"""
+
+import pytest
+
+import db
+
+
+class FakeConnection:
+    """Sessão do pool: o driver mantém o cache de comandos por sessão"""
+
+
+@pytest.fixture(autouse=True)
+def shards(monkeypatch):
+    monkeypatch.setattr(
+        db, "SHARDS", {"main": {"stmtcachesize": 3}, "north": {"stmtcachesize": 1}}
+    )
+    monkeypatch.setattr(db, "DEFAULT_SHARD", "main")
+    monkeypatch.setattr(db, "_statement_stats", {})
+    monkeypatch.setattr(db, "_session_caches", {})
+
+
+def _run(connection, names, rounds):
+    for _ in range(rounds):
+        for name in names:
+            db._record_execution(connection, name)
+
+
+def test_statements_that_fit_the_cache_are_parsed_once():
+    with db.use_shard("main"):
+        _run(FakeConnection(), ["a", "b", "c"], 4)
+
+    report = {entry["statement"]: entry for entry in db.get_statement_cache_report()}
+    assert {entry["estimated_parses"] for entry in report.values()} == {1}
+    assert report["a"]["estimated_hit_rate"] == 75.0
+
+
+def test_each_shard_uses_the_cache_size_of_its_own_pool():
+    with db.use_shard("north"):
+        _run(FakeConnection(), ["a", "b"], 3)
+    with db.use_shard("main"):
+        _run(FakeConnection(), ["a", "b"], 3)
+
+    report = {entry["statement"]: entry for entry in db.get_statement_cache_report()}
+    # north guarda um comando: alternar dois sempre erra; main acerta após o
+    # primeiro parse
+    assert report["a"]["executions"] == 6
+    assert report["a"]["estimated_parses"] == 3 + 1
+
+
+def test_sessions_have_separate_caches_and_the_report_is_sorted():
+    with db.use_shard("main"):
+        first, second = FakeConnection(), FakeConnection()
+        _run(first, ["a"], 3)
+        _run(second, ["a", "b"], 1)
+
+    report = db.get_statement_cache_report()
+    assert [entry["statement"] for entry in report] == ["a", "b"]
+    assert report[0]["estimated_parses"] == 2
+    assert report[1]["estimated_hit_rate"] == 0
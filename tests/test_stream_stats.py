@@ -0,0 +1,175 @@
+"""Testes dos acumuladores em uma passada (sem banco)"""
+
+import random
+import statistics
+
+import pytest
+
+from stream_stats import (
+    ProductionStatistics,
+    QuantileSketch,
+    RunningCovariance,
+    RunningMoments,
+    collect_statistics,
+    merge_statistics,
+    statistics_rows,
+)
+
+
+def _record(name, cost, revenue, planting="2024-01-01", harvest="2024-03-01"):
+    return {
+        "product_name": name,
+        "quantity": 10,
+        "cost_price": cost,
+        "sale_price": revenue,
+        "planting_date": planting,
+        "harvest_date": harvest,
+        "production_status": "SOLD",
+    }
+
+
+def test_running_moments_matches_statistics_module():
+    values = [random.Random(1).uniform(0, 100) for _ in range(500)]
+    moments = RunningMoments()
+    for value in values:
+        moments.add(value)
+
+    assert moments.count == 500
+    assert moments.mean == pytest.approx(statistics.mean(values))
+    assert moments.variance == pytest.approx(statistics.variance(values))
+
+
+def test_running_moments_merge_equals_single_pass():
+    generator = random.Random(2)
+    values = [generator.gauss(50, 10) for _ in range(1000)]
+    whole, left, right = RunningMoments(), RunningMoments(), RunningMoments()
+    for value in values:
+        whole.add(value)
+    for value in values[:300]:
+        left.add(value)
+    for value in values[300:]:
+        right.add(value)
+
+    left.merge(right)
+    assert left.count == whole.count
+    assert left.mean == pytest.approx(whole.mean)
+    assert left.variance == pytest.approx(whole.variance)
+
+
+def test_running_moments_merge_with_empty_sides():
+    filled = RunningMoments()
+    for value in (1, 2, 3):
+        filled.add(value)
+
+    filled.merge(RunningMoments())
+    assert (filled.count, filled.mean) == (3, 2)
+
+    empty = RunningMoments()
+    empty.merge(filled)
+    assert (empty.count, empty.mean) == (3, 2)
+    assert empty.variance == pytest.approx(1.0)
+
+
+def test_running_moments_variance_of_single_value_is_zero():
+    moments = RunningMoments()
+    moments.add(7)
+    assert moments.variance == 0.0
+
+
+def test_running_covariance_merge_matches_pearson():
+    generator = random.Random(3)
+    xs = [generator.uniform(0, 10) for _ in range(400)]
+    ys = [2 * x + generator.gauss(0, 1) for x in xs]
+    left, right = RunningCovariance(), RunningCovariance()
+    for x, y in zip(xs[:150], ys[:150]):
+        left.add(x, y)
+    for x, y in zip(xs[150:], ys[150:]):
+        right.add(x, y)
+
+    left.merge(right)
+    assert left.covariance == pytest.approx(statistics.covariance(xs, ys))
+    assert left.correlation == pytest.approx(statistics.correlation(xs, ys))
+
+
+def test_running_covariance_constant_series_has_zero_correlation():
+    covariance = RunningCovariance()
+    for x in range(10):
+        covariance.add(x, 5)
+    assert covariance.correlation == 0.0
+
+
+def test_quantile_sketch_empty_returns_none():
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_quantile_sketch_is_exact_below_capacity():
+    sketch = QuantileSketch(k=200, seed=1)
+    for value in range(1, 101):
+        sketch.add(value)
+    assert sketch.quantile(0.5) == 50
+    assert sketch.quantile(1.0) == 100
+
+
+def test_quantile_sketch_rank_error_and_memory_are_bounded():
+    sketch = QuantileSketch(k=200, seed=4)
+    values = list(range(100_000))
+    random.Random(5).shuffle(values)
+    for value in values:
+        sketch.add(value)
+
+    stored = sum(len(items) for items in sketch.levels)
+    assert stored < 1000
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+        assert abs(sketch.quantile(q) / len(values) - q) < 0.03
+
+
+def test_quantile_sketch_merge_keeps_weight_and_accuracy():
+    left, right = QuantileSketch(k=200, seed=6), QuantileSketch(k=200, seed=7)
+    for value in range(50_000):
+        left.add(value)
+    for value in range(50_000, 100_000):
+        right.add(value)
+
+    left.merge(right)
+    total_weight = sum(len(items) * 2**level for level, items in enumerate(left.levels))
+    assert left.count == 100_000
+    assert abs(total_weight - 100_000) / 100_000 < 0.05
+    assert abs(left.quantile(0.5) / 100_000 - 0.5) < 0.03
+
+
+def test_collect_statistics_groups_by_product_with_total():
+    rows = [
+        _record("Milho", 100, 150),
+        _record("Milho", 200, 260),
+        _record("Soja", 50, 0),
+    ]
+    collected = collect_statistics(rows)
+
+    assert set(collected) == {None, "Milho", "Soja"}
+    assert collected[None].cost.count == 3
+    assert collected["Milho"].cost.mean == 150
+    # ROI só entra no sketch quando há custo e venda
+    assert collected["Soja"].roi.count == 0
+    assert collected["Milho"].roi.count == 2
+
+
+def test_merge_statistics_equals_single_collection():
+    rows = [
+        _record(name, cost, cost * 1.5)
+        for name, cost in zip(["Milho", "Soja", "Café"] * 20, range(10, 70))
+    ]
+    whole = statistics_rows(collect_statistics(rows))
+    merged = statistics_rows(
+        merge_statistics([collect_statistics(rows[:25]), collect_statistics(rows[25:])])
+    )
+
+    assert [row["product_name"] for row in merged] == ["Café", "Milho", "Soja", "TOTAL"]
+    for expected, actual in zip(whole, merged):
+        for key in ("count", "mean_cost", "stddev_cost", "cost_revenue_correlation"):
+            assert actual[key] == pytest.approx(expected[key])
+
+
+def test_production_statistics_summary_of_empty_accumulator():
+    summary = ProductionStatistics().summary()
+    assert summary["count"] == 0
+    assert summary["roi_median"] is None
@@ -0,0 +1,145 @@
+"""Testes do diário local de escritas: recuperação, compactação e envio (sem banco)"""
+
+import json
+import os
+
+import pytest
+
+import db
+import write_journal
+from write_journal import JournalFlusher, WriteJournal
+
+
+@pytest.fixture
+def journal(tmp_path):
+    opened = WriteJournal(str(tmp_path))
+    yield opened
+    opened.close()
+
+
+def _reopen(journal):
+    journal.close()
+    return WriteJournal(journal.directory)
+
+
+def test_append_numbers_entries_and_lists_them_in_order(journal):
+    for quantity in (1, 2, 3):
+        journal.append("insert", {"quantity": quantity})
+
+    entries = journal.pending()
+    assert [entry["seq"] for entry in entries] == [1, 2, 3]
+    assert [entry["params"]["quantity"] for entry in entries] == [1, 2, 3]
+    assert journal.backlog() == 3
+    assert len(journal.pending(limit=2)) == 2
+
+
+def test_append_keeps_an_explicit_idempotency_key(journal):
+    entry = journal.append("delete", {"record_id": 4}, key="chave-fixa")
+    assert journal.pending()[0]["key"] == entry["key"] == "chave-fixa"
+
+
+def test_mark_applied_survives_a_restart(journal):
+    for quantity in range(5):
+        journal.append("insert", {"quantity": quantity})
+    journal.mark_applied(journal.pending(limit=3)[-1])
+
+    reopened = _reopen(journal)
+    try:
+        assert [entry["seq"] for entry in reopened.pending()] == [4, 5]
+        assert reopened.backlog() == 2
+        assert reopened.append("insert", {"quantity": 9})["seq"] == 6
+    finally:
+        reopened.close()
+
+
+def test_recovery_drops_a_torn_last_line(journal):
+    journal.append("insert", {"quantity": 1})
+    journal.append("insert", {"quantity": 2})
+    journal.close()
+    with open(journal.path, "ab") as f:
+        f.write(b'{"seq": 3, "operation": "ins')
+
+    reopened = WriteJournal(journal.directory)
+    try:
+        assert [entry["seq"] for entry in reopened.pending()] == [1, 2]
+        # A linha incompleta foi cortada: a próxima entrada começa em linha nova
+        assert reopened.append("insert", {"quantity": 3})["seq"] == 3
+        assert [entry["seq"] for entry in reopened.pending()] == [1, 2, 3]
+    finally:
+        reopened.close()
+
+
+def test_compaction_resets_the_file_and_keeps_the_sequence(journal, monkeypatch):
+    monkeypatch.setattr(write_journal, "COMPACT_BYTES", 1)
+    for quantity in range(3):
+        journal.append("insert", {"quantity": quantity})
+    journal.mark_applied(journal.pending()[-1])
+
+    assert os.path.getsize(journal.path) == 0
+    with open(journal.applied_path, encoding="utf-8") as f:
+        assert json.load(f) == {"offset": 0, "seq": 3}
+
+    reopened = _reopen(journal)
+    try:
+        assert reopened.pending() == []
+        assert reopened.append("insert", {"quantity": 9})["seq"] == 4
+        assert [entry["seq"] for entry in reopened.pending()] == [4]
+    finally:
+        reopened.close()
+
+
+def test_no_compaction_while_entries_are_pending(journal, monkeypatch):
+    monkeypatch.setattr(write_journal, "COMPACT_BYTES", 1)
+    for quantity in range(3):
+        journal.append("insert", {"quantity": quantity})
+    journal.mark_applied(journal.pending(limit=1)[-1])
+
+    assert os.path.getsize(journal.path) > 0
+    assert [entry["seq"] for entry in journal.pending()] == [2, 3]
+
+
+def test_a_removed_journal_file_restarts_from_the_beginning(journal):
+    journal.append("insert", {"quantity": 1})
+    journal.mark_applied(journal.pending()[-1])
+    journal.close()
+    os.remove(journal.path)
+
+    reopened = WriteJournal(journal.directory)
+    try:
+        assert reopened.pending() == []
+        assert reopened.append("insert", {"quantity": 2})["seq"] == 2
+        assert [entry["seq"] for entry in reopened.pending()] == [2]
+    finally:
+        reopened.close()
+
+
+def test_flusher_sends_in_order_and_stops_at_another_shard(journal, monkeypatch):
+    monkeypatch.setattr(db, "SHARDS", {"main": {}, "north": {}})
+    monkeypatch.setattr(db, "FARM_SHARDS", {"north-farm": "north"})
+    monkeypatch.setattr(db, "DEFAULT_SHARD", "main")
+    batches = []
+
+    def apply_write_batch(entries):
+        batches.append((db.current_shard(), [entry["seq"] for entry in entries]))
+        return [{"key": entry["key"], "status": "inserted"} for entry in entries]
+
+    monkeypatch.setattr(db, "apply_write_batch", apply_write_batch)
+    for farm_id in ("default", "default", "north-farm", "default"):
+        journal.append("insert", {"farm_id": farm_id})
+
+    assert JournalFlusher(journal).drain() == 4
+    assert batches == [("main", [1, 2]), ("north", [3]), ("main", [4])]
+    assert journal.backlog() == 0
+
+
+def test_flusher_keeps_the_batch_pending_when_the_database_fails(journal, monkeypatch):
+    def apply_write_batch(entries):
+        raise ConnectionError("Database connection unavailable")
+
+    monkeypatch.setattr(db, "apply_write_batch", apply_write_batch)
+    journal.append("insert", {"quantity": 1})
+
+    with pytest.raises(ConnectionError):
+        JournalFlusher(journal).flush_once()
+    assert journal.backlog() == 1
+    assert [entry["seq"] for entry in journal.pending()] == [1]